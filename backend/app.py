@@ -1,18 +1,34 @@
-from flask import Flask, request, jsonify
-from tensorflow.keras.models import load_model
+from flask import Flask, request, jsonify, Response, stream_with_context, g, has_app_context
 from flask_cors import CORS
-import joblib
 import numpy as np
-from PIL import Image
 import mysql.connector
 from flask_bcrypt import Bcrypt
 from flask_jwt_extended import JWTManager, create_access_token, jwt_required, get_jwt_identity
-import requests
 import os
 from dotenv import load_dotenv
 from datetime import datetime, timedelta
 from ecommerce import register_ecom, db as ecom_db
+from disease_batcher import MicroBatcher
+from disease_runtime import tflite_loader
+from db_pool import ConnectionPool, PoolTimeout
+import order_history
+import checkout_engine
+import http_gateway
+import weather_cache
+import news_feed
+import image_preprocess
+import market_store
+import market_analytics
+import catalogue_cache
+import prediction_log
+from model_registry import ModelRegistry, keras_loader, MODEL_MMAP_MODE
+from crop_lookup import CropLookup, TOP_K as LOOKUP_TOP_K
+import tree_predictor
+import metrics
 import io
+import json
+import hashlib
+import time
 
 # --- Initialization & Configuration ---
 load_dotenv()
@@ -32,7 +48,9 @@ print("🔑 API Key:", API_KEY)
 app = Flask(__name__)
 
 # configure DB file (SQLite demo)
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///' + os.path.join(os.path.dirname(__file__), 'data', 'ecom.db')
+app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get(
+    "ECOM_DATABASE_URI", 'sqlite:///' + os.path.join(os.path.dirname(__file__), 'data', 'ecom.db')
+)
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 
 ecom_db.init_app(app)
@@ -55,48 +73,192 @@ FALLBACK_CLASSES = np.array([
 
 
 # --- Model Loading ---
-try:
-    # Load crop prediction model
-    crop_model = joblib.load("xgb_crop_model.pkl")
-    crop_encoder = joblib.load("crop_encoder.pkl")
-    print("✓ Crop prediction model loaded successfully")
-except Exception as e:
-    print(f"✗ Error loading crop model: {str(e)}. Setting models to None.")
-    crop_model = None
-    crop_encoder = None
-
-try:
-    # Load CNN model 
-    cnn_model = load_model("disease_cnn_model.h5")
-    class_labels = joblib.load("labels.pkl")
-    idx_to_label = {v: k for k, v in class_labels.items()}
-    print("✅ Disease CNN model loaded successfully")
-except Exception as e:
-    print(f"✗ Error loading CNN model: {e}. Setting models to None.")
-    cnn_model = None
-    class_labels = {}
-    idx_to_label = {}
+# Models are loaded lazily on first use (and hot-reloaded when the file changes),
+# so workers that never serve predictions never import TensorFlow.
+CROP_FEATURES = ["N", "P", "K", "temperature", "humidity", "ph", "rainfall"]
+CROP_BATCH_CHUNK_ROWS = int(os.environ.get("CROP_BATCH_CHUNK_ROWS", 5000))
+
+def build_crop_label_table(model, encoder):
+    """Index -> crop name array, so decoding a whole batch is one fancy-index."""
+    if encoder is not None and hasattr(encoder, "classes_"):
+        return np.asarray(encoder.classes_).astype(str)
+    n_classes = len(getattr(model, "classes_", FALLBACK_CLASSES))
+    if n_classes == len(FALLBACK_CLASSES):
+        return FALLBACK_CLASSES
+    return np.array([f"Crop_{i}" for i in range(n_classes)])
+
+def _crop_part(key):
+    """Model or encoder from a train_crop_model.py bundle (a dict), or a legacy pickle as-is."""
+    def part(value):
+        if not isinstance(value, dict):
+            return value
+        if key == "model" and list(value.get("features", CROP_FEATURES)) != CROP_FEATURES:
+            print(f"⚠️ Crop model bundle {value.get('version')} expects features {value['features']}")
+        return value[key]
+    return part
+
+models = ModelRegistry()
+# Model + encoder bundle written by train_crop_model.py (one versioned file); the
+# separate legacy pickles are served while no bundle exists. The choice is made on
+# every get(), so a bundle written after startup is picked up without a restart.
+CROP_MODEL_BUNDLE = os.environ.get("CROP_MODEL_BUNDLE", "crop_model_bundle.joblib")
+CROP_MODEL_ENTRY = "crop_source"
+models.register("crop_bundle", CROP_MODEL_BUNDLE, mmap_mode=MODEL_MMAP_MODE)
+models.register("crop_model_file", "xgb_crop_model.pkl", mmap_mode=MODEL_MMAP_MODE)
+models.register("crop_encoder_file", "crop_encoder.pkl")
+models.register_alias("crop_source", ["crop_bundle", "crop_model_file"])
+models.register_alias("crop_encoder_source", ["crop_bundle", "crop_encoder_file"])
+models.register_derived("crop_model", ["crop_source"], _crop_part("model"))
+models.register_derived("crop_encoder", ["crop_encoder_source"], _crop_part("encoder"))
+# "keras" (disease_cnn_model.h5) or "tflite" (exported by train_disease_model.py; see bench_disease_runtime.py)
+DISEASE_RUNTIME = os.environ.get("DISEASE_RUNTIME", "keras")
+if DISEASE_RUNTIME == "tflite":
+    models.register("cnn_model", os.environ.get("DISEASE_TFLITE_MODEL", "disease_cnn_model.tflite"),
+                    loader=tflite_loader)
+else:
+    models.register("cnn_model", "disease_cnn_model.h5", loader=keras_loader)
+models.register("class_labels", "labels.pkl")
+models.register_derived("crop_label_table", ["crop_model", "crop_encoder"], build_crop_label_table)
+models.register_derived("idx_to_label", ["class_labels"], lambda labels: {v: k for k, v in (labels or {}).items()})
+
+# Precomputed top-5 table + neighbour index (built by `python crop_lookup.py`).
+# Only used while it matches the crop model file it was built from.
+models.register("crop_lookup_table", "crop_lookup.npz", loader=CropLookup.load)
+
+def _checked_crop_lookup(table, crop_model):
+    if table is None or crop_model is None:
+        return None
+    if not table.matches(models.path(CROP_MODEL_ENTRY)):
+        print("⚠️ crop_lookup.npz was built from a different crop model; rebuild it with crop_lookup.py")
+        return None
+    return table
+
+models.register_derived("crop_lookup", ["crop_lookup_table", CROP_MODEL_ENTRY], _checked_crop_lookup)
+
+# "model" serves crop_model.predict_proba as-is; "compiled" flattens its trees into
+# NumPy arrays (tree_predictor.py, checked by bench_tree_predictor.py) and serves
+# those for calls of up to CROP_COMPILED_MAX_ROWS rows, falling back to the model
+# for bigger batches or if it can't be compiled.
+CROP_PREDICTOR = os.environ.get("CROP_PREDICTOR", "model")
+CROP_COMPILED_MAX_ROWS = int(os.environ.get("CROP_COMPILED_MAX_ROWS", 16))
+
+def _crop_predictor(crop_model):
+    if crop_model is None or CROP_PREDICTOR != "compiled":
+        return crop_model
+    try:
+        compiled = tree_predictor.compile_model(crop_model)
+    except Exception as e:
+        # TreeCompileError for unsupported models, or the model itself rejecting the reference row
+        print(f"⚠️ Serving the crop model uncompiled: {type(e).__name__}: {e}")
+        return crop_model
+    print(f"✓ Crop model compiled: {len(compiled.roots)} trees, {compiled.n_nodes} nodes")
+    return tree_predictor.SmallBatchPredictor(compiled, crop_model, CROP_COMPILED_MAX_ROWS)
+
+models.register_derived("crop_predictor", ["crop_model"], _crop_predictor)
+
+def _crop_model_version():
+    """Model version recorded in the prediction log: the bundle's version, else file@load counter."""
+    if models.resolve(CROP_MODEL_ENTRY) == "crop_bundle":
+        bundle = models.get("crop_bundle")
+        if bundle is not None:
+            return bundle.get("version")
+    source = models.resolve(CROP_MODEL_ENTRY)
+    return f"{os.path.basename(models.path(source))}@{models.version(source)}"
+
+if os.environ.get("MODEL_WARMUP", "0") == "1":
+    models.warm_up()
+
+# --- Disease CNN micro-batching ---
+# Concurrent /detect-disease uploads are coalesced into one forward pass.
+DISEASE_BATCH_MAX_SIZE = int(os.environ.get("DISEASE_BATCH_MAX_SIZE", 16))
+DISEASE_BATCH_MAX_WAIT_MS = float(os.environ.get("DISEASE_BATCH_MAX_WAIT_MS", 10))
+DISEASE_BATCH_TIMEOUT_S = float(os.environ.get("DISEASE_BATCH_TIMEOUT_S", 30))
+
+disease_batcher = MicroBatcher(
+    lambda batch: models.get("cnn_model").predict(batch, verbose=0),
+    max_batch_size=DISEASE_BATCH_MAX_SIZE,
+    max_wait_ms=DISEASE_BATCH_MAX_WAIT_MS
+)
+
+# --- Disease results: top-k + cache keyed by image content ---
+# Re-uploads of the same photo (flaky networks) skip the forward pass entirely.
+DISEASE_TOP_K = int(os.environ.get("DISEASE_TOP_K", 3))
+# Softmax temperature fitted offline on a validation set (1.0 = model's raw confidences)
+DISEASE_SOFTMAX_TEMPERATURE = float(os.environ.get("DISEASE_SOFTMAX_TEMPERATURE", 1.0))
+disease_results = catalogue_cache.LRUTTLCache(
+    "disease_cache",
+    max_entries=int(os.environ.get("DISEASE_CACHE_MAX_ENTRIES", 10000)),
+    ttl=float(os.environ.get("DISEASE_CACHE_TTL_S", 24 * 3600))
+)
+metrics.gauge("disease_cache.hit_rate", fn=lambda: round(
+    disease_results.hits.value / max(1, disease_results.hits.value + disease_results.misses.value), 4
+))
+
+def calibrate(probs, temperature=DISEASE_SOFTMAX_TEMPERATURE):
+    """Temperature-scale a softmax output (recovering logits from the log-probabilities)."""
+    if temperature == 1.0:
+        return probs
+    logits = np.log(np.clip(probs, 1e-12, None)) / temperature
+    logits -= logits.max()
+    scaled = np.exp(logits)
+    return scaled / scaled.sum()
 
 # --- Database Connection ---
-def get_db():
+# Connections come from a bounded pool; every connection checked out during a
+# request is handed back in teardown, so error paths can't leak them.
+def _mysql_connect():
     return mysql.connector.connect(
-        host='localhost',
-        user='root',
-        password='omesh',  # Replace with your actual password
-        database='agri_app'
+        host=os.environ.get("MYSQL_HOST", "localhost"),
+        user=os.environ.get("MYSQL_USER", "root"),
+        password=os.environ.get("MYSQL_PASSWORD", "omesh"),  # Replace with your actual password
+        database=os.environ.get("MYSQL_DB", "agri_app"),
+        consume_results=True
     )
 
+db_pool = ConnectionPool(
+    _mysql_connect,
+    size=int(os.environ.get("DB_POOL_SIZE", 10)),
+    timeout=float(os.environ.get("DB_POOL_TIMEOUT_S", 10)),
+    ping_idle_s=float(os.environ.get("DB_POOL_PING_IDLE_S", 30))
+)
+
+def get_db():
+    conn = db_pool.connection()
+    if has_app_context():
+        g.setdefault("_db_conns", []).append(conn)
+    return conn
+
+@app.teardown_appcontext
+def release_db(exc):
+    for conn in g.pop("_db_conns", []):
+        conn.close()
+
+@app.errorhandler(PoolTimeout)
+def db_pool_exhausted(e):
+    return jsonify({"error": "Database busy, please retry"}), 503
+
 # ----------------------------------------------------
 # --- E-commerce: Products ---
 # ----------------------------------------------------
 @app.route("/products", methods=["GET"])
 def get_products():
-    conn = get_db()
-    c = conn.cursor(dictionary=True)
-    c.execute("SELECT p.*, u.username as seller_username FROM products p JOIN users u ON p.seller_id = u.id")
-    products = c.fetchall()
-    conn.close()
-    return jsonify(products)
+    """All products, or one page with ?page=&per_page=. Served from the catalogue cache with an ETag."""
+    page = request.args.get("page", type=int)
+    per_page = min(request.args.get("per_page", 50, type=int), 500)
+
+    def build():
+        conn = get_db()
+        c = conn.cursor(dictionary=True)
+        sql = "SELECT p.*, u.username as seller_username FROM products p JOIN users u ON p.seller_id = u.id"
+        if page:
+            c.execute(sql + " ORDER BY p.id LIMIT %s OFFSET %s", (per_page, (max(page, 1) - 1) * per_page))
+        else:
+            c.execute(sql)
+        products = c.fetchall()
+        conn.close()
+        return products
+
+    return catalogue_cache.cached_json(("mysql_products", page, per_page if page else None), build)
 
 @app.route("/products", methods=["POST"])
 @jwt_required()
@@ -122,6 +284,7 @@ def add_product():
               (name, type_, price, description, image, seller_id))
     conn.commit()
     conn.close()
+    catalogue_cache.invalidate_listings("mysql_products")
     return jsonify({"msg": "Product added"}), 201
 
 @app.route("/products/<int:product_id>", methods=["DELETE"])
@@ -157,6 +320,7 @@ def delete_product(product_id):
     c.execute("DELETE FROM products WHERE id = %s", (product_id,))
     conn.commit()
     conn.close()
+    catalogue_cache.invalidate_listings("mysql_products")
     return jsonify({"msg": "Product deleted"})
 
 # ----------------------------------------------------
@@ -181,31 +345,21 @@ def place_order():
         conn.close()
         return jsonify({"msg": "Order must contain items"}), 400
         
-    total = 0
-    
-    for item in items:
-        product_id = item.get("product_id")
-        quantity = item.get("quantity", 0)
-        if product_id and quantity > 0:
-            c.execute("SELECT price FROM products WHERE id = %s", (product_id,))
-            price_row = c.fetchone()
-            if price_row:
-                total += price_row[0] * quantity
-                
+    try:
+        lines = checkout_engine.parse_lines(items, "quantity")
+    except checkout_engine.CheckoutError as e:
+        conn.close()
+        return jsonify({"msg": e.code}), 400
+
+    # Price all lines with one product query
+    priced, total = checkout_engine.price_order_mysql(conn, lines)
+
     # Insert order
     c.execute("INSERT INTO orders (buyer_id, total, status) VALUES (%s, %s, %s)", (buyer_id, total, "Placed"))
     order_id = c.lastrowid
     
     # Insert order items
-    for item in items:
-        product_id = item.get("product_id")
-        quantity = item.get("quantity", 0)
-        if product_id and quantity > 0:
-            c.execute("SELECT price FROM products WHERE id = %s", (product_id,))
-            price_row = c.fetchone()
-            if price_row:
-                c.execute("INSERT INTO order_items (order_id, product_id, quantity, price) VALUES (%s, %s, %s, %s)",
-                          (order_id, product_id, quantity, price_row[0]))
+    checkout_engine.insert_order_items_mysql(conn, order_id, priced)
 
     conn.commit()
     conn.close()
@@ -223,22 +377,16 @@ def get_orders():
         conn.close()
         return jsonify({"orders": []})
     user_id = user_row["id"]
-    
-    c.execute("SELECT * FROM orders WHERE buyer_id = %s", (user_id,))
-    orders = c.fetchall()
-    
-    result = []
-    for order in orders:
-        c.execute("SELECT oi.id, oi.quantity, oi.price, p.name as product_name FROM order_items oi JOIN products p ON oi.product_id = p.id WHERE oi.order_id = %s", (order["id"],))
-        items = c.fetchall()
-        result.append({
+
+    def serialize(order):
+        return {
             "id": order["id"],
             "status": order["status"],
             "total": order["total"],
-            "items": items
-        })
-    conn.close()
-    return jsonify({"orders": result})
+            "items": order["items"]
+        }
+
+    return _order_history_response(conn, user_id, serialize)
 
 # Add this after your existing /orders routes (around line 200)
 
@@ -289,20 +437,17 @@ def checkout():
     if not shipping or not shipping.get("fullName"):
         conn.close()
         return jsonify({"error": "Shipping details required"}), 400
-    
-    # Calculate total
-    total = 0
-    for item in items:
-        product_id = item.get("product_id")
-        quantity = item.get("qty", 0)
-        
-        if product_id and quantity > 0:
-            c.execute("SELECT price FROM products WHERE id = %s", (product_id,))
-            price_row = c.fetchone()
-            if price_row:
-                total += price_row["price"] * quantity
+
+    try:
+        lines = checkout_engine.parse_lines(items, "qty")
+    except checkout_engine.CheckoutError as e:
+        conn.close()
+        return jsonify({"error": e.code}), 400
     
     try:
+        # Calculate total (one product query for the whole cart)
+        priced, total = checkout_engine.price_order_mysql(conn, lines)
+
         # Insert order with shipping details
         c.execute("""
             INSERT INTO orders 
@@ -324,19 +469,7 @@ def checkout():
         order_id = c.lastrowid
         
         # Insert order items
-        for item in items:
-            product_id = item.get("product_id")
-            quantity = item.get("qty", 0)
-            
-            if product_id and quantity > 0:
-                c.execute("SELECT price FROM products WHERE id = %s", (product_id,))
-                price_row = c.fetchone()
-                if price_row:
-                    c.execute("""
-                        INSERT INTO order_items 
-                        (order_id, product_id, quantity, price) 
-                        VALUES (%s, %s, %s, %s)
-                    """, (order_id, product_id, quantity, price_row["price"]))
+        checkout_engine.insert_order_items_mysql(conn, order_id, priced)
         
         conn.commit()
         
@@ -382,22 +515,8 @@ def get_all_orders():
     
     user_id = user_row["id"]
     
-    # Get all orders for this buyer
-    c.execute("SELECT * FROM orders WHERE buyer_id = %s ORDER BY created_at DESC", (user_id,))
-    orders = c.fetchall()
-    
-    result = []
-    for order in orders:
-        # Get items for this order
-        c.execute("""
-            SELECT oi.id, oi.quantity, oi.price, p.name as product_name, p.id as product_id
-            FROM order_items oi 
-            JOIN products p ON oi.product_id = p.id 
-            WHERE oi.order_id = %s
-        """, (order["id"],))
-        items = c.fetchall()
-        
-        result.append({
+    def serialize(order):
+        return {
             "id": order["id"],
             "status": order["status"],
             "total": order["total"],
@@ -412,43 +531,73 @@ def get_all_orders():
                 "pincode": order.get("shipping_pincode")
             },
             "payment_method": order.get("payment_method"),
-            "items": items
-        })
-    
-    conn.close()
-    return jsonify({"orders": result}), 200
+            "items": order["items"]
+        }
+
+    return _order_history_response(conn, user_id, serialize)
+
+def _order_history_response(conn, user_id, serialize):
+    """
+    Shared body of the order-listing routes. Query params:
+      limit  - page size (keyset pagination on created_at, id); omitted = full history
+      cursor - next_cursor from the previous page
+      stream - 1 to stream the full history as NDJSON, one order per line
+    """
+    if request.args.get("stream") == "1":
+        def generate():
+            pages = order_history.iter_pages(
+                lambda limit, cursor: order_history.load_orders_mysql(conn, user_id, limit, cursor)
+            )
+            for order in pages:
+                yield json.dumps(serialize(order), default=str) + "\n"
+        return Response(stream_with_context(generate()), mimetype="application/x-ndjson")
+
+    limit = order_history.page_size(request.args.get("limit", type=int))
+    try:
+        orders, next_cursor = order_history.load_orders_mysql(conn, user_id, limit, request.args.get("cursor"))
+    except order_history.InvalidCursor:
+        return jsonify({"error": "invalid_cursor"}), 400
+    finally:
+        conn.close()
+    body = {"orders": [serialize(o) for o in orders]}
+    if limit:
+        body["next_cursor"] = next_cursor
+    return jsonify(body), 200
 
 # ----------------------------------------------------
 # --- News ---
 # ----------------------------------------------------
 @app.route("/news", methods=["GET"])
 def get_news():
-    url = "https://newsapi.org/v2/top-headlines"
-    params = {
-        "country": "in",
-        "q": "agriculture",
-        "apiKey": "adb519ca1f444d55a6fd04db744865a9" 
-    }
-    try:
-        resp = requests.get(url, params=params)
-        data = resp.json()
-        articles = [
-            {
-                "title": art.get("title"),
-                "description": art.get("description"),
-                "link": art.get("url")
-            }
-            for art in data.get("articles", [])
-        ]
-        return jsonify({"news": articles})
-    except Exception as e:
-        return jsonify({"news": [], "error": str(e)}), 500
+    """
+    Headlines from the background-refreshed news store (never calls upstream).
+    Query params: q (all words must appear in title/description), page + per_page.
+    Served with ETag / Last-Modified so the home screen gets 304s between refreshes.
+    """
+    q = request.args.get("q", "").strip()
+    page = request.args.get("page", type=int)
+    per_page = None
+    if page is not None:
+        page = max(page, 1)
+        per_page = min(max(request.args.get("per_page", 20, type=int), 1), news_feed.NEWS_MAX_PER_PAGE)
+    articles, total, version, modified_at = news_feed.search(q, page or 1, per_page)
+
+    def build():
+        body = {"news": articles, "total": total,
+                "updated_at": modified_at.isoformat() if modified_at else None}
+        if page:
+            body.update(page=page, per_page=per_page)
+        return body
+
+    return catalogue_cache.cached_json(("news", version, q.lower(), page, per_page), build,
+                                       last_modified=modified_at)
 
 # ----------------------------------------------------
 # --- Crop Prediction (FIXED) ---
 # ----------------------------------------------------
 @app.route('/api/predict-crop', methods=['POST'])
 def predict_crop():
+    started = time.perf_counter()
     try:
         data = request.get_json()
         if not data:
@@ -465,47 +614,30 @@ def predict_crop():
             float(data["ph"]), float(data["rainfall"])
         ]])
 
+        crop_model = models.get("crop_predictor")
         if crop_model is None:
             return jsonify({'error': 'Crop model not loaded'}), 500
 
-        preds = crop_model.predict(X)
-        probs = crop_model.predict_proba(X)[0]
-
-        # Use crop_encoder to decode indices to crop names
-        if crop_encoder is not None:
-            try:
-                # preds[0] is numeric index; decode it to crop name
-                best_crop = crop_encoder.inverse_transform([int(preds[0])])[0]
-                print(f"✅ Decoded crop: {best_crop}")
-            except Exception as e:
-                print(f"⚠️ Encoder decode error: {e}")
-                best_crop = f"Crop_{int(preds[0])}"
-        else:
-            best_crop = f"Crop_{int(preds[0])}"
+        label_table = models.get("crop_label_table")
+        idx, probs, _ = _crop_top_k(crop_model, X, 5)
+        names = label_table[idx[0]].tolist()
+        confidences = np.round(probs[0].astype(np.float64) * 100, 2).tolist()
 
-        best_confidence = round(float(np.max(probs)) * 100, 2)
-        
         # Top-5 recommendations
-        top5 = []
-        top_indices = np.argsort(probs)[-5:][::-1]
-        for idx in top_indices:
-            try:
-                if crop_encoder is not None:
-                    crop_name = crop_encoder.inverse_transform([int(idx)])[0]
-                else:
-                    crop_name = f"Crop_{int(idx)}"
-                top5.append({
-                    "crop": crop_name,
-                    "confidence": round(float(probs[idx]) * 100, 2)
-                })
-            except Exception as e:
-                print(f"⚠️ Error decoding crop {idx}: {e}")
+        top5 = [{"crop": name, "confidence": conf} for name, conf in zip(names, confidences)]
+
+        prediction_log.record(
+            "crop", dict(zip(CROP_FEATURES, X[0].tolist())), {"recommendations": top5},
+            model_version=_crop_model_version(), latency_ms=(time.perf_counter() - started) * 1000
+        )
 
+        lookup = models.get("crop_lookup")
         return jsonify({
             "success": True,
-            "suggested_crop": best_crop,
-            "confidence": best_confidence,
+            "suggested_crop": names[0],
+            "confidence": confidences[0],
             "recommendations": top5,
+            "similar_fields": lookup.similar_fields(X[0]) if lookup is not None else [],
             "water_needs": "Moderate",
             "pest_warning": "No immediate warning"
         }), 200
@@ -513,37 +645,186 @@ def predict_crop():
     except Exception as e:
         print(f"🔥 Error: {str(e)}")
         return jsonify({'error': str(e)}), 500
+
+def top_k_indices(probs, k):
+    """Row-wise top-k class indices and probabilities, highest first."""
+    k = max(1, min(k, probs.shape[1]))
+    idx = np.argpartition(probs, -k, axis=1)[:, -k:]
+    order = np.argsort(np.take_along_axis(probs, idx, axis=1), axis=1)[:, ::-1]
+    idx = np.take_along_axis(idx, order, axis=1)
+    return idx, np.take_along_axis(probs, idx, axis=1)
+
+def _crop_top_k(crop_model, X, top_k):
+    """Top-k class indices/probabilities per row: precomputed table first, crop_model only for misses."""
+    lookup = models.get("crop_lookup")
+    if lookup is None or top_k > LOOKUP_TOP_K:
+        idx, probs = top_k_indices(crop_model.predict_proba(X), top_k)
+        return idx, probs, np.zeros(len(X), dtype=bool)
+
+    hit, idx, probs = lookup.lookup(X)
+    idx, probs = idx[:, :top_k].astype(np.int64), probs[:, :top_k]
+    if not hit.all():
+        miss = ~hit
+        miss_idx, miss_probs = top_k_indices(crop_model.predict_proba(X[miss]), LOOKUP_TOP_K)
+        lookup.remember(X[miss], miss_idx, miss_probs)
+        idx[miss], probs[miss] = miss_idx[:, :top_k], miss_probs[:, :top_k]
+    return idx, probs, hit
+
+def _row_to_features(row):
+    if isinstance(row, dict):
+        return [float(row[k]) for k in CROP_FEATURES]
+    if len(row) != len(CROP_FEATURES):
+        raise ValueError(f"Expected {len(CROP_FEATURES)} values, got {len(row)}")
+    return [float(v) for v in row]
+
+def _iter_batch_rows(rows=None):
+    """Yield input rows from an already-validated JSON rows list, or an NDJSON body read line by line."""
+    if rows is not None:
+        yield from rows
+        return
+    for line in iter(request.stream.readline, b""):
+        line = line.strip()
+        if line:
+            try:
+                yield json.loads(line)
+            except ValueError:
+                yield None
+
+def _predict_crop_chunk(crop_model, label_table, chunk, start, top_k):
+    """Run one predict_proba over a chunk of rows and yield one result dict per row."""
+    features, positions = [], []
+    for offset, row in enumerate(chunk):
+        try:
+            features.append(_row_to_features(row))
+            positions.append(offset)
+        except (KeyError, TypeError, ValueError) as e:
+            yield start + offset, {"index": start + offset, "error": f"Invalid row: {e}"}
+
+    if not features:
+        return
+
+    started = time.perf_counter()
+    X = np.asarray(features, dtype=np.float32)
+    idx, top_probs, _ = _crop_top_k(crop_model, X, top_k)
+    names = label_table[idx].tolist()
+    confidences = np.round(top_probs.astype(np.float64) * 100, 2).tolist()
+    results = [
+        {
+            "index": start + offset,
+            "suggested_crop": names[r][0],
+            "confidence": confidences[r][0],
+            "recommendations": [
+                {"crop": name, "confidence": conf}
+                for name, conf in zip(names[r], confidences[r])
+            ]
+        }
+        for r, offset in enumerate(positions)
+    ]
+    # One entry per row; latency is the chunk's, per row
+    prediction_log.record_many(
+        "crop_batch",
+        [(dict(zip(CROP_FEATURES, f)), {"recommendations": res["recommendations"]}) for f, res in zip(features, results)],
+        model_version=_crop_model_version(), latency_ms=(time.perf_counter() - started) * 1000 / len(results)
+    )
+
+    for offset, result in zip(positions, results):
+        yield start + offset, result
+
+@app.route('/api/predict-crop/batch', methods=['POST'])
+def predict_crop_batch():
+    """
+    Batch crop prediction for field-agent soil-test uploads.
+    Body: {"rows": [{"N": 90, "P": 42, ...}, [90, 42, 43, 20.8, 82.0, 6.5, 202.9], ...]}
+    or an application/x-ndjson body with one row per line.
+    Results are streamed back as NDJSON, one line per input row, in input order.
+    """
+    crop_model = models.get("crop_predictor")
+    if crop_model is None:
+        return jsonify({'error': 'Crop model not loaded'}), 500
+
+    label_table = models.get("crop_label_table")
+    # Clamped here, not per chunk: a bad k can't be reported once the stream has started
+    top_k = max(1, min(request.args.get("top_k", 5, type=int), len(label_table)))
+
+    rows = None
+    if request.mimetype != "application/x-ndjson":
+        # Checked up front: once the NDJSON response starts, an error can't become a 400
+        data = request.get_json(silent=True)
+        rows = data.get("rows", []) if isinstance(data, dict) else None
+        if not isinstance(rows, list):
+            return jsonify({"error": 'Body must be a JSON object with a "rows" list'}), 400
+
+    def generate():
+        chunk, start = [], 0
+        for row in _iter_batch_rows(rows):
+            chunk.append(row)
+            if len(chunk) >= CROP_BATCH_CHUNK_ROWS:
+                for _, result in sorted(_predict_crop_chunk(crop_model, label_table, chunk, start, top_k), key=lambda r: r[0]):
+                    yield json.dumps(result) + "\n"
+                start += len(chunk)
+                chunk = []
+        if chunk:
+            for _, result in sorted(_predict_crop_chunk(crop_model, label_table, chunk, start, top_k), key=lambda r: r[0]):
+                yield json.dumps(result) + "\n"
+
+    return Response(stream_with_context(generate()), mimetype="application/x-ndjson")
+
 # ----------------------------------------------------
 # --- Disease Detection ---
 # ----------------------------------------------------
 @app.route("/detect-disease", methods=["POST"])
 @jwt_required()
 def detect_disease():
+    started = time.perf_counter()
+    try:
+        # Reject oversized bodies before the multipart form is even parsed
+        image_preprocess.check_upload_size(request.content_length)
+    except image_preprocess.ImageTooLarge as e:
+        return jsonify({"error": str(e)}), 413
+
     file = request.files.get("image")
     if not file:
         return jsonify({"error": "No image uploaded"}), 400
 
     try:
-        # Load + preprocess image
-        img = Image.open(file.stream).convert("RGB")
-        img = img.resize((224, 224)) 
-        img = np.array(img) / 255.0
-        img = np.expand_dims(img, axis=0)
+        # Load + preprocess image (reduced-scale decode straight into float32)
+        img = image_preprocess.load_image(file.stream)
 
-        if cnn_model is None or not idx_to_label:
+        idx_to_label = models.get("idx_to_label")
+        if models.get("cnn_model") is None or not idx_to_label:
              return jsonify({"error": "Disease model not loaded or labels missing"}), 500
 
-        # Predict
-        prediction = cnn_model.predict(img)
-        predicted_class = np.argmax(prediction)
-        
-        result = idx_to_label.get(predicted_class, "Unknown Disease")
+        # Same normalized pixels + same model version -> same answer
+        key = (hashlib.blake2b(img.data, digest_size=16).digest(), models.version("cnn_model"))
+        probs = disease_results.get(key)
+        cached = probs is not None
+        if probs is None:
+            # Predict (batched with other in-flight uploads)
+            probs = calibrate(np.asarray(disease_batcher.submit(img, timeout=DISEASE_BATCH_TIMEOUT_S)))
+            disease_results.set(key, probs)
+
+        idx, conf = top_k_indices(probs[np.newaxis], request.args.get("top_k", DISEASE_TOP_K, type=int))
+        predictions = [
+            {"disease": idx_to_label.get(int(i), "Unknown Disease"), "confidence": round(float(c), 4)}
+            for i, c in zip(idx[0], conf[0])
+        ]
+        prediction_log.record(
+            "disease", {"image_hash": key[0], "filename": file.filename, "cached": cached},
+            {"predictions": predictions},
+            model_version=f"{os.path.basename(models.path('cnn_model'))}@{key[1]}",
+            latency_ms=(time.perf_counter() - started) * 1000
+        )
 
         return jsonify({
-            "disease": result,
-            "confidence": float(np.max(prediction))
+            "disease": predictions[0]["disease"],
+            "confidence": float(conf[0][0]),
+            "predictions": predictions
         })
 
+    except image_preprocess.ImageTooLarge as e:
+        return jsonify({"error": str(e)}), 413
+    except image_preprocess.InvalidImage as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         return jsonify({"error": f"Processing failed: {str(e)}"}), 500
         
@@ -610,21 +891,18 @@ def weather_forecast():
         return jsonify({"error": "City is required"}), 400
         
     try:
-        # Step 1: Geocoding (City Name -> Lat/Lon)
-        geo_url = f"http://api.openweathermap.org/geo/1.0/direct?q={city}&limit=1&appid={API_KEY}"
-        geo_res = requests.get(geo_url).json()
+        # Step 1: Geocoding (City Name -> Lat/Lon), memoized per city
+        coords = weather_cache.geocode(city, API_KEY)
 
-        if not geo_res or len(geo_res) == 0:
+        if not coords:
             return jsonify({"error": "City not found"}), 404
 
-        lat = geo_res[0]["lat"]
-        lon = geo_res[0]["lon"]
-
-        # Step 2: 5-day / 3-hour forecast (16 entries = ~48 hours)
-        forecast_url = f"https://api.openweathermap.org/data/2.5/forecast?lat={lat}&lon={lon}&units=metric&appid={API_KEY}"
-        forecast_res = requests.get(forecast_url).json()
+        lat, lon = coords
 
-        if "list" not in forecast_res:
+        # Step 2: 5-day / 3-hour forecast (16 entries = ~48 hours), cached with TTL + stale-while-revalidate
+        try:
+            forecast_res = weather_cache.forecast(lat, lon, API_KEY)
+        except weather_cache.WeatherUnavailable:
             return jsonify({"error": "Forecast not available"}), 500
 
         forecast = [
@@ -657,6 +935,16 @@ def weather():
     except Exception as e:
         return jsonify({"error": f"Failed to fetch weather data: {str(e)}"}), 500
 
+def _period_start(period):
+    today = datetime.today().date()
+    if period == "week":
+        return today - timedelta(days=7)
+    elif period == "month":
+        return today - timedelta(days=30)
+    elif period == "year":
+        return today - timedelta(days=365)
+    return datetime(2020, 1, 1).date()
+
 @app.route("/market-price", methods=["GET"])
 def market_price():
     crop = request.args.get("crop", "Wheat")
@@ -664,51 +952,69 @@ def market_price():
     period = request.args.get("period", "week")
     
     # Calculate date filter
-    today = datetime.today()
-    if period == "week":
-        start_date = (today - timedelta(days=7)).strftime("%d/%m/%Y")
-    elif period == "month":
-        start_date = (today - timedelta(days=30)).strftime("%d/%m/%Y")
-    elif period == "year":
-        start_date = (today - timedelta(days=365)).strftime("%d/%m/%Y")
-    else:
-        start_date = "01/01/2020" 
+    start_date = _period_start(period)
 
-    url = f"https://api.data.gov.in/resource/9ef84268-d588-465a-a308-a864a43d0070?api-key={MARKET_API_KEY}&format=json&filters[commodity]={crop}&filters[state]={state}&limit=1000&offset=0"
-    
     try:
-        res = requests.get(url)
-        res.raise_for_status() 
-        data = res.json()
-        
-        prices = []
-        filter_date = datetime.strptime(start_date, "%d/%m/%Y")
-        
-        for item in data.get("records", []):
-            arrival_date_str = item.get("arrival_date")
-            if arrival_date_str:
-                try:
-                    arrival_date = datetime.strptime(arrival_date_str, "%d/%m/%Y")
-
-                    if arrival_date >= filter_date:
-                        prices.append({
-                            "market": item["market"],
-                            "modal_price": float(item.get("modal_price", 0)),
-                            "min_price": float(item.get("min_price", 0)),
-                            "max_price": float(item.get("max_price", 0)),
-                            "date": arrival_date_str
-                        })
-                except ValueError:
-                    continue # Skip records with badly formatted dates
-        
-        # Sort by date
-        prices.sort(key=lambda x: datetime.strptime(x["date"], "%d/%m/%Y"), reverse=True)
+        crop, state = market_store.normalize_pair(crop, state)
+    except market_store.UnknownPair as e:
+        return jsonify({"error": str(e)}), 400
+
+    try:
+        # Served from the local store; only a never-seen (or long idle) crop/state pair hits data.gov.in
+        market_store.ensure_pair(crop, state, MARKET_API_KEY)
+        prices = market_store.query_prices(crop, state, start_date)
         return jsonify({"prices": prices})
 
-    except requests.exceptions.RequestException as re:
+    except http_gateway.UpstreamError as re:
         return jsonify({"error": f"API request failed: {str(re)}"}), 500
     except Exception as e:
         return jsonify({"error": f"Internal error fetching market price: {str(e)}"}), 500
 
+@app.route("/market-price/analytics", methods=["GET"])
+def market_price_analytics():
+    """
+    Per-market / per-state aggregates, daily modal series with rolling 7/30-day
+    averages and percentiles for a crop over a period (state=All for every synced state).
+    """
+    crop = request.args.get("crop", "Wheat")
+    state = request.args.get("state", "Maharashtra")
+    period = request.args.get("period", "month")
+
+    try:
+        if state == market_analytics.ALL_STATES:
+            crop = market_store.normalize_commodity(crop)
+        else:
+            crop, state = market_store.normalize_pair(crop, state)
+    except market_store.UnknownPair as e:
+        return jsonify({"error": str(e)}), 400
+
+    try:
+        if state != market_analytics.ALL_STATES:
+            market_store.ensure_pair(crop, state, MARKET_API_KEY)
+        result = market_analytics.analytics(crop, state, period, _period_start(period))
+        return jsonify({"crop": crop, "state": state, "period": period, **result})
+
+    except http_gateway.UpstreamError as re:
+        return jsonify({"error": f"API request failed: {str(re)}"}), 500
+    except Exception as e:
+        return jsonify({"error": f"Internal error computing market analytics: {str(e)}"}), 500
+
+if MARKET_API_KEY:
+    market_store.start_sync_thread(MARKET_API_KEY)
+news_feed.start_refresh_thread()
+
+# ----------------------------------------------------
+# --- Metrics ---
+# ----------------------------------------------------
+@app.route("/metrics", methods=["GET"])
+def get_metrics():
+    """In-process metrics (batch sizes, queue depth, latency histograms...)."""
+    return jsonify(metrics.snapshot(request.args.get("prefix")))
+
+@app.route("/api/models", methods=["GET"])
+def models_status():
+    """Load state of every registered model (version, load time, last error)."""
+    return jsonify(models.status())
+
 if __name__ == "__main__":
     app.run(debug=True, port=5000)
\ No newline at end of file
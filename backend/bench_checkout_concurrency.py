@@ -0,0 +1,143 @@
+# backend/bench_checkout_concurrency.py
+# Concurrent checkout throughput on a scratch ecom.db, with SQLite defaults
+# ("before", ECOM_SQLITE_TUNING=0) and with sqlite_tuning's connection pragmas
+# ("after"). The model indexes exist in both runs (create_all builds them on a
+# fresh file), so the difference is journal mode / locking. Every writer / reader is its own process running the real
+# blueprint through Flask's test client, like separate gunicorn workers
+# sharing one database file:
+#  - writers POST /api/checkout in a loop (1-3 random products per cart)
+#  - readers page buyer order history (GET /api/orders?buyer_id=..&limit=20)
+# Reports checkouts/s, latency percentiles, lock errors and reads/s per mode.
+#
+#   python bench_checkout_concurrency.py --writers 4 --readers 2 --duration 10
+import argparse
+import multiprocessing
+import os
+import random
+import shutil
+import tempfile
+import time
+
+import numpy as np
+
+
+def _make_app(db_path, tuned):
+    # Read at import time by sqlite_tuning / recommendations, so set before importing ecommerce
+    os.environ["ECOM_SQLITE_TUNING"] = "1" if tuned else "0"
+    os.environ["RECS_REFRESH_INTERVAL_S"] = "0"
+    from flask import Flask
+    import ecommerce
+
+    app = Flask("bench")
+    app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite:///" + db_path
+    ecommerce.register_ecom(app)
+    return app, ecommerce
+
+
+def seed(db_path, tuned, n_products, n_orders, n_buyers):
+    app, ecom = _make_app(db_path, tuned)
+    import product_search
+
+    rng = random.Random(0)
+    with app.app_context():
+        ecom.db.session.execute(ecom.Product.__table__.insert(), [
+            {"id": f"bench-{i}", "title": f"Bench product {i}", "price": 100.0 + i, "stock": 10 ** 9}
+            for i in range(n_products)
+        ])
+        ecom.db.session.commit()
+        # Bulk insert bypasses the search hooks; rebuild now rather than in every worker
+        product_search.init_search(ecom.db, ecom.Product)
+        client = app.test_client()
+        for _ in range(n_orders):
+            client.post("/api/checkout", json={
+                "buyer_id": f"buyer-{rng.randrange(n_buyers)}",
+                "items": [{"product_id": f"bench-{rng.randrange(n_products)}", "qty": 1}],
+            })
+
+
+def worker(role, db_path, tuned, duration, n_products, n_buyers, seed_, start, results):
+    app, _ = _make_app(db_path, tuned)
+    client = app.test_client()
+    rng = random.Random(seed_)
+    start.wait()  # all processes imported and connected; measure together
+    latencies, errors = [], 0
+    deadline = time.perf_counter() + duration
+    while time.perf_counter() < deadline:
+        buyer = f"buyer-{rng.randrange(n_buyers)}"
+        started = time.perf_counter()
+        try:
+            if role == "writer":
+                cart = [{"product_id": f"bench-{rng.randrange(n_products)}", "qty": rng.randint(1, 3)}
+                        for _ in range(rng.randint(1, 3))]
+                ok = client.post("/api/checkout", json={"buyer_id": buyer, "items": cart}).status_code == 201
+            else:
+                ok = client.get(f"/api/orders?buyer_id={buyer}&limit=20").status_code == 200
+        except Exception:
+            # "database is locked" propagates out of the view
+            ok = False
+        if ok:
+            latencies.append((time.perf_counter() - started) * 1000)
+        else:
+            errors += 1
+    results.put((role, latencies, errors))
+
+
+def run_mode(tuned, args):
+    folder = tempfile.mkdtemp(prefix="ecom-bench-")
+    db_path = os.path.join(folder, "ecom.db")
+    ctx = multiprocessing.get_context("spawn")
+    try:
+        setup = ctx.Process(target=seed, args=(db_path, tuned, args.products, args.orders, args.buyers))
+        setup.start()
+        setup.join()
+
+        roles = ["writer"] * args.writers + ["reader"] * args.readers
+        results, start = ctx.Queue(), ctx.Barrier(len(roles))
+        procs = [
+            ctx.Process(target=worker, args=(role, db_path, tuned, args.duration, args.products, args.buyers,
+                                             i, start, results))
+            for i, role in enumerate(roles)
+        ]
+        for p in procs:
+            p.start()
+        collected = [results.get() for _ in procs]
+        for p in procs:
+            p.join()
+    finally:
+        shutil.rmtree(folder, ignore_errors=True)
+
+    writes = [ms for role, lat, _ in collected if role == "writer" for ms in lat]
+    reads = sum(len(lat) for role, lat, _ in collected if role == "reader")
+    p50, p95, p99 = np.percentile(writes, [50, 95, 99]) if writes else (0, 0, 0)
+    return {
+        "mode": "after (tuned)" if tuned else "before (defaults)",
+        "checkouts/s": f"{len(writes) / args.duration:.1f}",
+        "p50/p95/p99 ms": f"{p50:.1f}/{p95:.1f}/{p99:.1f}",
+        "failed checkouts": str(sum(err for role, _, err in collected if role == "writer")),
+        "reads/s": f"{reads / args.duration:.1f}",
+        "failed reads": str(sum(err for role, _, err in collected if role == "reader")),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Checkout throughput on SQLite, before/after tuning")
+    parser.add_argument("--writers", type=int, default=4)
+    parser.add_argument("--readers", type=int, default=2)
+    parser.add_argument("--duration", type=float, default=10, help="Seconds per mode")
+    parser.add_argument("--products", type=int, default=500)
+    parser.add_argument("--orders", type=int, default=2000, help="Orders seeded before the run")
+    parser.add_argument("--buyers", type=int, default=200)
+    args = parser.parse_args()
+
+    print(f"{args.writers} writer + {args.readers} reader processes, {args.duration:.0f}s per mode, "
+          f"{args.orders} seeded orders")
+    rows = [run_mode(False, args), run_mode(True, args)]
+    cols = list(rows[0])
+    widths = [max(len(c), *(len(r[c]) for r in rows)) for c in cols]
+    print("  ".join(f"{c:>{w}}" for c, w in zip(cols, widths)))
+    for r in rows:
+        print("  ".join(f"{r[c]:>{w}}" for c, w in zip(cols, widths)))
+
+
+if __name__ == "__main__":
+    main()
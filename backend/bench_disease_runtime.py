@@ -0,0 +1,112 @@
+# backend/bench_disease_runtime.py
+# Accuracy / latency comparison of the disease model runtimes (Keras .h5,
+# TFLite float, TFLite int8) to pick DISEASE_RUNTIME per deployment.
+# With --dataset (class-per-folder, as used for training) it reports top-1
+# accuracy against the folder labels; without it, agreement with Keras on
+# random inputs only. Latency is measured per batch size, after warm-up.
+#
+#   python bench_disease_runtime.py --dataset D:\dataset --samples 300 --report runtime_report.md
+import argparse
+import os
+import time
+
+import joblib
+import numpy as np
+
+from disease_runtime import TFLiteModel, sample_images
+from image_preprocess import load_image
+
+
+def load_runtimes(args):
+    runtimes = {}
+    if os.path.exists(args.keras):
+        from model_registry import keras_loader
+        runtimes["keras"] = keras_loader(args.keras)
+    for name, path in (("tflite", args.tflite), ("tflite_int8", args.tflite_int8)):
+        if os.path.exists(path):
+            runtimes[name] = TFLiteModel(path)
+    return runtimes
+
+
+def load_inputs(args):
+    if not args.dataset:
+        rng = np.random.default_rng(0)
+        return rng.random((args.samples, 224, 224, 3), dtype=np.float32), None
+    class_indices = joblib.load(args.labels)
+    picked = sample_images(args.dataset, args.samples, seed=1)
+    x = np.empty((len(picked), 224, 224, 3), dtype=np.float32)
+    for i, (path, _) in enumerate(picked):
+        with open(path, "rb") as f:
+            load_image(f, out=x[i])
+    y = np.array([class_indices[c] for _, c in picked])
+    return x, y
+
+
+def predict_all(model, x, batch_size=32):
+    return np.concatenate([model.predict(x[i:i + batch_size], verbose=0) for i in range(0, len(x), batch_size)])
+
+
+def latency(model, x, batch_size, runs):
+    batch = x[:batch_size]
+    model.predict(batch, verbose=0)  # warm-up (and interpreter resize)
+    timings = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        model.predict(batch, verbose=0)
+        timings.append((time.perf_counter() - started) * 1000)
+    return np.percentile(timings, [50, 95])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare disease model runtimes")
+    parser.add_argument("--keras", default="disease_cnn_model.h5")
+    parser.add_argument("--tflite", default="disease_cnn_model.tflite")
+    parser.add_argument("--tflite-int8", default="disease_cnn_model_int8.tflite")
+    parser.add_argument("--labels", default="labels.pkl")
+    parser.add_argument("--dataset", help="Class-per-folder image directory for accuracy")
+    parser.add_argument("--samples", type=int, default=200)
+    parser.add_argument("--batch-sizes", default="1,16")
+    parser.add_argument("--runs", type=int, default=30)
+    parser.add_argument("--report", help="Also write the table as Markdown to this file")
+    args = parser.parse_args()
+
+    runtimes = load_runtimes(args)
+    if not runtimes:
+        raise SystemExit("No model files found")
+    x, y = load_inputs(args)
+    batch_sizes = [int(b) for b in args.batch_sizes.split(",")]
+    predictions = {name: predict_all(m, x) for name, m in runtimes.items()}
+    reference = predictions.get("keras")
+
+    header = ["runtime", "size MB", "accuracy", "agree w/ keras", "max |Δp|"]
+    header += [f"b{b} p50/p95 ms" for b in batch_sizes]
+    rows = []
+    for name, model in runtimes.items():
+        path = {"keras": args.keras, "tflite": args.tflite, "tflite_int8": args.tflite_int8}[name]
+        probs = predictions[name]
+        row = [name, f"{os.path.getsize(path) / 1e6:.1f}"]
+        row.append(f"{(probs.argmax(1) == y).mean():.3f}" if y is not None else "-")
+        if reference is not None:
+            row.append(f"{(probs.argmax(1) == reference.argmax(1)).mean():.3f}")
+            row.append(f"{np.abs(probs - reference).max():.4f}")
+        else:
+            row += ["-", "-"]
+        for b in batch_sizes:
+            p50, p95 = latency(model, x, b, args.runs)
+            row.append(f"{p50:.1f}/{p95:.1f}")
+        rows.append(row)
+
+    lines = ["| " + " | ".join(header) + " |", "|" + "---|" * len(header)]
+    lines += ["| " + " | ".join(r) + " |" for r in rows]
+    table = "\n".join(lines)
+    print(f"{len(x)} {'labelled images' if y is not None else 'random inputs'}\n")
+    print(table)
+    if args.report:
+        with open(args.report, "w", encoding="utf-8") as f:
+            f.write(f"# Disease model runtimes\n\n{len(x)} "
+                    f"{'labelled images from ' + args.dataset if y is not None else 'random inputs'}\n\n{table}\n")
+        print(f"\n✅ Report written to {args.report}")
+
+
+if __name__ == "__main__":
+    main()
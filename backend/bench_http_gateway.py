@@ -0,0 +1,73 @@
+# backend/bench_http_gateway.py
+# Offline benchmark of the outbound HTTP gateway against fake_upstream.py:
+# for a few upstream scenarios (healthy, slow, flaky, hanging, down) fire N
+# concurrent requests from a thread pool, as Flask workers would, and report
+# latency percentiles, failures and how many calls the circuit breaker cut short.
+#
+#   python bench_http_gateway.py --requests 500 --concurrency 32
+import argparse
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+import fake_upstream
+import http_gateway
+
+SCENARIOS = {
+    "healthy": dict(latency_ms=30, jitter_ms=10),
+    "slow": dict(latency_ms=400, jitter_ms=200),
+    "flaky": dict(latency_ms=30, jitter_ms=10, error_rate=0.2),
+    "hanging": dict(latency_ms=30, hang_rate=0.05),
+    "down": dict(latency_ms=5, error_rate=1.0),
+}
+
+
+def run_scenario(name, options, n_requests, concurrency, timeout_s):
+    behaviour = fake_upstream.Behaviour(**options)
+    base_url = fake_upstream.start_in_thread(behaviour)
+    # Fresh gateway per scenario so breaker state doesn't leak between them
+    gateway = http_gateway.HttpGateway(timeout_s=timeout_s, per_host_limit=concurrency)
+    url = f"{base_url}/data/2.5/weather"
+
+    def one(i):
+        started = time.perf_counter()
+        try:
+            gateway.get_json(url, params={"q": f"city{i % 50}"}, raise_for_status=True)
+            outcome = "ok"
+        except http_gateway.CircuitOpen:
+            outcome = "circuit_open"
+        except http_gateway.UpstreamError:
+            outcome = "error"
+        return outcome, (time.perf_counter() - started) * 1000
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(one, range(n_requests)))
+    wall_s = time.perf_counter() - started
+    gateway.close()
+
+    latencies = np.array([ms for _, ms in results])
+    outcomes = [o for o, _ in results]
+    p50, p95, p99 = np.percentile(latencies, [50, 95, 99])
+    print(f"{name:<8} {n_requests / wall_s:>8.1f} {p50:>8.1f} {p95:>8.1f} {p99:>8.1f} "
+          f"{outcomes.count('ok'):>6} {outcomes.count('error'):>6} {outcomes.count('circuit_open'):>6} "
+          f"{behaviour.requests:>9}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark http_gateway against a fake upstream")
+    parser.add_argument("--requests", type=int, default=300)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--timeout-s", type=float, default=2.0)
+    parser.add_argument("--scenario", choices=sorted(SCENARIOS), action="append")
+    args = parser.parse_args()
+
+    print(f"{'scenario':<8} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} "
+          f"{'ok':>6} {'error':>6} {'open':>6} {'upstream':>9}")
+    for name in args.scenario or SCENARIOS:
+        run_scenario(name, SCENARIOS[name], args.requests, args.concurrency, args.timeout_s)
+
+
+if __name__ == "__main__":
+    main()
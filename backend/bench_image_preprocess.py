@@ -0,0 +1,108 @@
+# backend/bench_image_preprocess.py
+# Latency and peak RSS of /detect-disease preprocessing: the original
+# full-resolution decode + float64 division vs image_preprocess.load_image.
+# Each path runs in its own subprocess so peak RSS isn't shared between them.
+#
+#   python bench_image_preprocess.py                 # synthetic 12 MP JPEG
+#   python bench_image_preprocess.py --image leaf.jpg --runs 50
+import argparse
+import io
+import json
+import resource
+import subprocess
+import sys
+import time
+
+import numpy as np
+from PIL import Image
+
+import image_preprocess
+
+
+def legacy(stream):
+    img = Image.open(stream).convert("RGB")
+    img = img.resize((224, 224))
+    img = np.array(img) / 255.0
+    return np.expand_dims(img, axis=0)
+
+
+def streaming(stream):
+    return image_preprocess.load_image(stream)[np.newaxis]
+
+
+PATHS = {"legacy": legacy, "streaming": streaming}
+
+
+def synthetic_jpeg(width=4000, height=3000):
+    # Smooth gradients + noise so the JPEG is photo-sized, not trivially compressible
+    rng = np.random.default_rng(0)
+    y, x = np.mgrid[0:height, 0:width]
+    rgb = np.stack([(x * 255 // width), (y * 255 // height), ((x + y) * 255 // (width + height))], axis=-1)
+    rgb = (rgb + rng.integers(0, 40, rgb.shape)).clip(0, 255).astype(np.uint8)
+    buf = io.BytesIO()
+    Image.fromarray(rgb).save(buf, "JPEG", quality=90)
+    return buf.getvalue()
+
+
+def _max_rss_mb():
+    # VmHWM is per address space; ru_maxrss can carry the parent's peak across fork/exec
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024  # KiB on Linux
+
+
+def child(path, image_path, runs):
+    with open(image_path, "rb") as f:
+        data = f.read()
+    fn = PATHS[path]
+    baseline = _max_rss_mb()
+    timings = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        fn(io.BytesIO(data))
+        timings.append((time.perf_counter() - started) * 1000)
+    print(json.dumps({
+        "path": path, "p50_ms": float(np.percentile(timings, 50)), "p95_ms": float(np.percentile(timings, 95)),
+        "peak_rss_delta_mb": _max_rss_mb() - baseline,
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark disease image preprocessing")
+    parser.add_argument("--image", help="JPEG/PNG to use (default: synthetic 4000x3000 JPEG)")
+    parser.add_argument("--runs", type=int, default=20)
+    parser.add_argument("--child", choices=sorted(PATHS), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        return child(args.child, args.image, args.runs)
+
+    image_path = args.image
+    if image_path is None:
+        image_path = "/tmp/bench_image_preprocess.jpg"
+        with open(image_path, "wb") as f:
+            f.write(synthetic_jpeg())
+    with Image.open(image_path) as img:
+        print(f"Image: {image_path} {img.width}x{img.height} {img.format}")
+
+    data = open(image_path, "rb").read()
+    diff = np.abs(legacy(io.BytesIO(data)) - streaming(io.BytesIO(data))).max()
+    print(f"Max abs difference between paths: {diff:.4f}")
+
+    print(f"{'path':<10} {'p50 ms':>8} {'p95 ms':>8} {'peak RSS +MB':>13}")
+    for path in PATHS:
+        out = subprocess.run(
+            [sys.executable, __file__, "--child", path, "--image", image_path, "--runs", str(args.runs)],
+            check=True, capture_output=True, text=True
+        ).stdout
+        r = json.loads(out.strip().splitlines()[-1])
+        print(f"{path:<10} {r['p50_ms']:>8.1f} {r['p95_ms']:>8.1f} {r['peak_rss_delta_mb']:>13.1f}")
+
+
+if __name__ == "__main__":
+    main()
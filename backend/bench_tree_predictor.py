@@ -0,0 +1,86 @@
+# backend/bench_tree_predictor.py
+# Correctness check + latency benchmark for CROP_PREDICTOR=compiled.
+# Compiles the crop model app.py would serve (the bundle if present, else
+# xgb_crop_model.pkl), compares predict_proba with the original model on every
+# row of crop_dataset.csv, then times both for 1 row and larger batches.
+# Exits non-zero if probabilities or the top-1 crop disagree.
+#
+#   python bench_tree_predictor.py --batch-sizes 1,64,1000,100000
+import argparse
+import os
+import sys
+import time
+
+import joblib
+import numpy as np
+import pandas as pd
+
+from tree_predictor import compile_model
+
+FEATURES = ["N", "P", "K", "temperature", "humidity", "ph", "rainfall"]
+
+
+def load_model(path):
+    obj = joblib.load(path)
+    return obj["model"] if isinstance(obj, dict) else obj
+
+
+def latency_ms(fn, runs):
+    fn()  # warm-up
+    timings = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - started) * 1000)
+    return np.percentile(timings, [50, 95])
+
+
+def main():
+    default_model = "crop_model_bundle.joblib" if os.path.exists("crop_model_bundle.joblib") else "xgb_crop_model.pkl"
+    parser = argparse.ArgumentParser(description="Check and benchmark the compiled crop tree predictor")
+    parser.add_argument("--model", default=default_model)
+    parser.add_argument("--data", default="crop_dataset.csv")
+    parser.add_argument("--batch-sizes", default="1,16,64,256,1000,10000,100000")
+    parser.add_argument("--runs", type=int, default=50, help="Timed runs for 1-row calls (fewer for big batches)")
+    parser.add_argument("--tolerance", type=float, default=1e-5, help="Max allowed |Δp|")
+    args = parser.parse_args()
+
+    model = load_model(args.model)
+    X = pd.read_csv(args.data).dropna()[FEATURES].to_numpy(dtype=np.float64)
+
+    started = time.perf_counter()
+    compiled = compile_model(model)
+    print(f"✓ Compiled {type(model).__name__} from {args.model}: {len(compiled.roots)} trees, "
+          f"{compiled.n_nodes} nodes, depth {compiled.max_depth} in {(time.perf_counter() - started) * 1000:.0f} ms")
+
+    # --- Correctness: every dataset row ---
+    expected = model.predict_proba(X)
+    got = compiled.predict_proba(X)
+    max_diff = float(np.abs(expected - got).max())
+    top1 = float((expected.argmax(1) == got.argmax(1)).mean())
+    top5 = float((np.argsort(-expected, axis=1)[:, :5] == np.argsort(-got, axis=1)[:, :5]).all(axis=1).mean())
+    print(f"{len(X)} rows: max |Δp| {max_diff:.2e}, top-1 agreement {top1:.4f}, top-5 order agreement {top5:.4f}")
+    ok = max_diff <= args.tolerance and top1 == 1.0
+
+    # --- Latency ---
+    print(f"\n{'rows':>8}  {'model p50/p95 ms':>18}  {'compiled p50/p95 ms':>20}  {'speedup':>7}")
+    faster_up_to = 0
+    for size in (int(b) for b in args.batch_sizes.split(",")):
+        batch = np.resize(X, (size, X.shape[1]))
+        runs = max(3, args.runs * 100 // max(100, size))
+        m50, m95 = latency_ms(lambda: model.predict_proba(batch), runs)
+        c50, c95 = latency_ms(lambda: compiled.predict_proba(batch), runs)
+        print(f"{size:>8}  {f'{m50:.3f}/{m95:.3f}':>18}  {f'{c50:.3f}/{c95:.3f}':>20}  {m50 / c50:>6.1f}x")
+        if c50 < m50 and size > faster_up_to:
+            faster_up_to = size
+    print(f"\nCompiled is faster up to {faster_up_to} rows of the sizes measured; app.py serves calls "
+          f"up to CROP_COMPILED_MAX_ROWS rows compiled and larger ones through the model")
+
+    if not ok:
+        print(f"\n✗ Compiled predictor disagrees with the model (tolerance {args.tolerance})")
+        sys.exit(1)
+    print("\n✅ Compiled predictor matches the model")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+# backend/catalogue_cache.py
+# Read cache for product catalogue payloads.
+#  - product_payloads: per-product dicts with variants/images already decoded,
+#    so list pages don't json.loads every row on every request
+#  - responses: fully serialized JSON bodies + ETag for /products and
+#    /api/products/<id>, so repeat reads skip the queries and mobile clients
+#    sending If-None-Match get a 304
+# Entries are LRU-evicted, expire after a TTL, and are invalidated on product
+# writes and checkout stock changes in this process (the TTL bounds how long
+# other workers can serve a stale copy).
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from flask import Response, current_app, request
+
+import metrics
+
+CATALOGUE_CACHE_TTL_S = float(os.environ.get("CATALOGUE_CACHE_TTL_S", 60))
+CATALOGUE_CACHE_MAX_ENTRIES = int(os.environ.get("CATALOGUE_CACHE_MAX_ENTRIES", 20000))
+
+
+class LRUTTLCache:
+    def __init__(self, name, max_entries=CATALOGUE_CACHE_MAX_ENTRIES, ttl=CATALOGUE_CACHE_TTL_S):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._data = OrderedDict()  # key -> (value, expires_at)
+        self._lock = threading.Lock()
+        self.hits = metrics.counter(f"{name}.hits")
+        self.misses = metrics.counter(f"{name}.misses")
+        metrics.gauge(f"{name}.entries", fn=lambda: len(self._data))
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None and entry[1] > time.monotonic():
+                self._data.move_to_end(key)
+                self.hits.inc()
+                return entry[0]
+            if entry is not None:
+                del self._data[key]
+        self.misses.inc()
+        return None
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + self.ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def get_or_build(self, key, build):
+        value = self.get(key)
+        if value is None:
+            value = build()
+            if value is not None:
+                self.set(key, value)
+        return value
+
+    def invalidate(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def invalidate_where(self, predicate):
+        with self._lock:
+            for key in [k for k in self._data if predicate(k)]:
+                del self._data[key]
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+product_payloads = LRUTTLCache("catalogue_cache.payloads")
+responses = LRUTTLCache("catalogue_cache.responses")
+not_modified = metrics.counter("catalogue_cache.not_modified")
+
+
+def serialize_product(p):
+    """Blueprint Product -> list payload, decoding variants/images once per cache lifetime."""
+    def build():
+        return {
+            "id": p.id, "title": p.title, "description": p.description,
+            "price": p.price, "stock": p.stock, "variants": json.loads(p.variants or "{}"),
+            "images": json.loads(p.images or "[]"), "category_id": p.category_id
+        }
+    return product_payloads.get_or_build(p.id, build)
+
+
+def encode(payload):
+    """(body bytes, etag) for a JSON payload, encoded exactly as jsonify would."""
+    body = current_app.json.dumps(payload).encode()
+    return body, hashlib.sha1(body).hexdigest()
+
+
+def cached_json(key, build, status=200, last_modified=None):
+    """
+    Serve build() from the response cache, with an ETag and a 304 when the client
+    already has it. build() returns a JSON-serializable payload to cache, or a
+    Flask response / (response, status) tuple (e.g. a 404) that is returned uncached.
+    """
+    entry = responses.get(key)
+    if entry is None:
+        payload = build()
+        if isinstance(payload, (Response, tuple)):
+            return payload
+        entry = encode(payload)
+        responses.set(key, entry)
+    return json_response(*entry, status=status, last_modified=last_modified)
+
+
+def json_response(body, etag, status=200, last_modified=None):
+    resp = Response(body, status=status, mimetype="application/json")
+    resp.set_etag(etag)
+    if last_modified is not None:
+        resp.last_modified = last_modified
+    resp.cache_control.no_cache = True
+    resp.make_conditional(request)
+    if resp.status_code == 304:
+        not_modified.inc()
+    return resp
+
+
+def invalidate_products(product_ids):
+    """Drop cached payloads/detail pages for these products (called on writes and stock changes)."""
+    ids = set(product_ids)
+    for pid in ids:
+        product_payloads.invalidate(pid)
+        responses.invalidate(("product", pid))
+
+
+def invalidate_listings(namespace):
+    responses.invalidate_where(lambda key: key[0] == namespace)
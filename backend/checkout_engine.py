@@ -0,0 +1,189 @@
+# backend/checkout_engine.py
+# Set-based checkout: all cart products are fetched with one IN (...) query,
+# the order is priced once, order items are bulk inserted, and stock is taken
+# with a single conditional UPDATE so concurrent checkouts can't oversell
+# (units held by other carts, Product.reserved, are not available; see inventory.py).
+from collections import OrderedDict
+
+IN_CHUNK = 1000
+
+
+class CheckoutError(Exception):
+    def __init__(self, code, message=None):
+        super().__init__(message or code)
+        self.code = code
+
+
+def _chunks(seq, size):
+    for i in range(0, len(seq), size):
+        yield seq[i:i + size]
+
+
+def parse_quantity(value):
+    """A positive whole quantity (2, "2" or 2.0); raises CheckoutError("invalid_quantity") otherwise."""
+    if isinstance(value, bool):
+        raise CheckoutError("invalid_quantity")
+    if isinstance(value, float):
+        # int() would silently truncate 2.7 to 2
+        if not value.is_integer():
+            raise CheckoutError("invalid_quantity")
+        value = int(value)
+    try:
+        qty = int(value)
+    except (TypeError, ValueError):
+        raise CheckoutError("invalid_quantity")
+    if qty <= 0:
+        raise CheckoutError("invalid_quantity")
+    return qty
+
+
+def parse_lines(items, qty_key="qty"):
+    """(product_id, qty) per cart item; raises CheckoutError for bad quantities or an empty cart."""
+    if not isinstance(items, list):
+        raise CheckoutError("empty_cart")
+    lines = []
+    for it in items:
+        if not isinstance(it, dict) or not it.get("product_id"):
+            raise CheckoutError("invalid_quantity")
+        lines.append((it["product_id"], parse_quantity(it.get(qty_key))))
+    if not lines:
+        raise CheckoutError("empty_cart")
+    return lines
+
+
+def requested_quantities(lines):
+    """Total quantity per product (a cart may list the same product more than once)."""
+    totals = OrderedDict()
+    for product_id, qty in lines:
+        totals[product_id] = totals.get(product_id, 0) + qty
+    return totals
+
+
+# ----------------------------------------------------
+# --- MySQL (app.py) ---
+# ----------------------------------------------------
+def fetch_prices_mysql(conn, product_ids):
+    """{product_id: price} for all ids in one round trip per IN_CHUNK ids."""
+    ids = list(dict.fromkeys(product_ids))
+    prices = {}
+    c = conn.cursor()
+    for chunk in _chunks(ids, IN_CHUNK):
+        placeholders = ", ".join(["%s"] * len(chunk))
+        c.execute(f"SELECT id, price FROM products WHERE id IN ({placeholders})", chunk)
+        for product_id, price in c.fetchall():
+            prices[product_id] = price
+    c.close()
+    return prices
+
+
+def price_order_mysql(conn, lines):
+    """Price cart lines once. Lines whose product doesn't exist are dropped. Returns (priced_lines, total)."""
+    prices = fetch_prices_mysql(conn, [pid for pid, _ in lines])
+    # Products are keyed by the DB's id type; cart ids may arrive as strings
+    by_str = {str(k): v for k, v in prices.items()}
+    priced, total = [], 0
+    for product_id, qty in lines:
+        price = prices.get(product_id, by_str.get(str(product_id)))
+        if price is None:
+            continue
+        priced.append((product_id, qty, price))
+        total += price * qty
+    return priced, total
+
+
+def insert_order_items_mysql(conn, order_id, priced_lines):
+    if not priced_lines:
+        return
+    c = conn.cursor()
+    c.executemany(
+        "INSERT INTO order_items (order_id, product_id, quantity, price) VALUES (%s, %s, %s, %s)",
+        [(order_id, product_id, qty, price) for product_id, qty, price in priced_lines]
+    )
+    c.close()
+
+
+# ----------------------------------------------------
+# --- SQLAlchemy (ecommerce.py) ---
+# ----------------------------------------------------
+def fetch_products(session, Product, product_ids):
+    """{id: Product} for all ids with one IN query per IN_CHUNK ids."""
+    ids = list(dict.fromkeys(product_ids))
+    products = {}
+    for chunk in _chunks(ids, IN_CHUNK):
+        for p in session.query(Product).filter(Product.id.in_(chunk)):
+            products[p.id] = p
+    return products
+
+
+def reserve_stock(session, Product, requested, held=None, hold=False):
+    """
+    Move stock for every product in one compare-and-swap UPDATE per IN_CHUNK ids.
+    q is the requested quantity, h what this cart already holds (held, released
+    in the same statement):
+        checkout:          SET stock = stock - q, reserved = reserved - h
+        hold=True (cart):  SET reserved = reserved + q - h
+        ..., stock_version = stock_version + 1
+        WHERE id IN (...) AND stock - reserved + h >= q
+    No row is locked or read first, so concurrent carts on a hot product never
+    retry each other; they only fail when unreserved stock really ran out.
+    If any row didn't match, the caller must roll back.
+    """
+    from sqlalchemy import case, update
+
+    held = held or {}
+    ids = list(dict.fromkeys([*requested, *held]))
+    updated = 0
+    for chunk in _chunks(ids, IN_CHUNK):
+        qty = case({pid: requested.get(pid, 0) for pid in chunk}, value=Product.id, else_=0)
+        released = case({pid: held.get(pid, 0) for pid in chunk}, value=Product.id, else_=0) if held else 0
+        if hold:
+            values = {"reserved": Product.reserved + qty - released}
+        else:
+            values = {"stock": Product.stock - qty, "reserved": Product.reserved - released}
+        result = session.execute(
+            update(Product)
+            .where(Product.id.in_(chunk), Product.stock - Product.reserved + released >= qty)
+            .values(stock_version=Product.stock_version + 1, **values)
+            .execution_options(synchronize_session=False)
+        )
+        updated += result.rowcount
+    return updated == len(ids)
+
+
+def checkout_sqlalchemy(session, Product, Order, OrderItem, buyer_id, items, payment_method, shipping_json,
+                        take_held=None):
+    """
+    Create an order for the cart atomically. Raises CheckoutError("out_of_stock") without side effects.
+    take_held(session) -> {product_id: qty} removes the cart's reservations (inventory.take_holds)
+    inside the same transaction, so held units are converted rather than taken twice.
+    Prices and titles come from the SELECT that starts checkout; the write transaction only
+    begins at the stock UPDATE (pysqlite opens it at the first DML statement), so a price edit
+    committed in between isn't seen and the order is charged the price read at the start.
+    Stock is never read-then-written, so this can't oversell.
+    """
+    lines = parse_lines(items)
+    requested = requested_quantities(lines)
+    products = fetch_products(session, Product, requested)
+    if len(products) != len(requested):
+        raise CheckoutError("out_of_stock")
+
+    try:
+        held = take_held(session) if take_held is not None else None
+        if not reserve_stock(session, Product, requested, held):
+            raise CheckoutError("out_of_stock")
+
+        order_total = sum(round(products[pid].price * qty, 2) for pid, qty in lines)
+        order = Order(buyer_id=buyer_id, total=round(order_total, 2), payment_method=payment_method,
+                      shipping=shipping_json, status="Ordered")
+        session.add(order)
+        session.flush()
+
+        session.execute(OrderItem.__table__.insert(), [
+            {"order_id": order.id, "product_id": pid, "title": products[pid].title, "qty": qty, "price": products[pid].price}
+            for pid, qty in lines
+        ])
+        session.commit()
+    except Exception:
+        session.rollback()
+        raise
+    return order
@@ -0,0 +1,238 @@
+# backend/crop_lookup.py
+# Precomputed crop-recommendation table + nearest-neighbour index.
+#
+# Soil-test inputs usually arrive rounded to lab precision, so the 7-feature
+# space is quantized (N/P/K to 1, temperature/humidity/ph to 0.1, rainfall to 1)
+# and each cell is packed into one int64 key. The table holds the model's top-5
+# for every cell around the training data in sorted, array-backed form, so a
+# lookup is one np.searchsorted. Only inputs that sit on the grid (already
+# rounded to lab precision) are answered from the table; anything finer goes to
+# crop_model, since a cell-centre answer isn't a prediction for its actual
+# values. On-grid misses fall back to crop_model and are kept in a bounded
+# in-memory overlay.
+#
+# Build (after retraining the crop model):
+#   python crop_lookup.py --samples-per-row 50 [--extra logged_inputs.csv]
+import argparse
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+import metrics
+
+CROP_FEATURES = ["N", "P", "K", "temperature", "humidity", "ph", "rainfall"]
+TOP_K = 5
+
+# Quantization grid: step, lowest and highest value per feature
+STEPS = np.array([1, 1, 1, 0.1, 0.1, 0.1, 1], dtype=np.float64)
+LOWS = np.zeros(7, dtype=np.float64)
+HIGHS = np.array([200, 200, 300, 60, 100, 14, 400], dtype=np.float64)
+
+CROP_LOOKUP_OVERLAY_SIZE = int(os.environ.get("CROP_LOOKUP_OVERLAY_SIZE", 50000))
+# Max distance from a grid point, in steps, for a float64 input to count as lab-rounded
+# (float32 inputs must instead equal the float32 nearest the grid point)
+GRID_TOLERANCE = 1e-6
+
+
+def file_sha1(path):
+    h = hashlib.sha1()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+class CropLookup:
+    def __init__(self, keys, top_idx, top_prob, train_X, train_y, model_sha1,
+                 steps=STEPS, lows=LOWS, highs=HIGHS):
+        self.keys = keys
+        self.top_idx = top_idx
+        self.top_prob = top_prob
+        self.steps = np.asarray(steps, dtype=np.float64)
+        self.lows = np.asarray(lows, dtype=np.float64)
+        self.highs = np.asarray(highs, dtype=np.float64)
+        self.bins = np.rint((self.highs - self.lows) / self.steps).astype(np.int64) + 1
+        if int(np.prod([int(b) for b in self.bins], dtype=object)) >= 2 ** 63:
+            raise ValueError("Quantization grid too fine to pack into int64 keys")
+        # Mixed-radix multipliers: key = sum(q_j * radix_j)
+        self.radix = np.concatenate([[1], np.cumprod(self.bins[:-1])]).astype(np.int64)
+        self.model_sha1 = str(model_sha1)
+
+        # Nearest-neighbour index over the training rows (z-scored)
+        self.train_X = train_X
+        self.train_y = train_y
+        self.train_mean = train_X.mean(axis=0)
+        self.train_std = train_X.std(axis=0) + 1e-9
+        self._train_z = (train_X - self.train_mean) / self.train_std
+        self._train_sq = np.einsum("ij,ij->i", self._train_z, self._train_z)
+
+        self._overlay = OrderedDict()
+        self._overlay_lock = threading.Lock()
+        self.hits = metrics.counter("crop_lookup.hits")
+        self.misses = metrics.counter("crop_lookup.misses")
+
+    # --- Persistence ---
+    @classmethod
+    def load(cls, path):
+        with np.load(path, allow_pickle=False) as z:
+            return cls(
+                z["keys"], z["top_idx"], z["top_prob"], z["train_X"], z["train_y"],
+                str(z["model_sha1"]), z["steps"], z["lows"], z["highs"]
+            )
+
+    def save(self, path):
+        np.savez_compressed(
+            path, keys=self.keys, top_idx=self.top_idx, top_prob=self.top_prob,
+            train_X=self.train_X, train_y=self.train_y, model_sha1=np.array(self.model_sha1),
+            steps=self.steps, lows=self.lows, highs=self.highs
+        )
+
+    def matches(self, model_path):
+        """True if the table was built from this exact model file."""
+        try:
+            return file_sha1(model_path) == self.model_sha1
+        except OSError:
+            return False
+
+    # --- Lookup ---
+    def quantize(self, X, on_grid=False):
+        """
+        Packed int64 cell key per row, plus a mask of rows inside the grid.
+        on_grid=True also requires each value to be a grid point (no rounding residual).
+        """
+        X = np.asarray(X)
+        scaled = (X.astype(np.float64) - self.lows) / self.steps
+        q = np.rint(scaled).astype(np.int64)
+        valid = np.all((q >= 0) & (q < self.bins), axis=1)
+        if on_grid and X.dtype == np.float32:
+            # float32(20.8) is ~7.6e-6 steps off the grid: compare in the input's own precision
+            valid &= np.all((q * self.steps + self.lows).astype(np.float32) == X, axis=1)
+        elif on_grid:
+            valid &= np.all(np.abs(scaled - q) <= GRID_TOLERANCE, axis=1)
+        keys = np.where(valid, q @ self.radix, -1)
+        return keys, valid
+
+    def lookup(self, X):
+        """Return (hit mask, top-5 class indices, top-5 probabilities) for each row of X; off-grid rows miss."""
+        keys, valid = self.quantize(X, on_grid=True)
+        n = len(keys)
+        idx = np.zeros((n, TOP_K), dtype=self.top_idx.dtype)
+        prob = np.zeros((n, TOP_K), dtype=np.float32)
+        hit = np.zeros(n, dtype=bool)
+
+        if len(self.keys):
+            pos = np.minimum(np.searchsorted(self.keys, keys), len(self.keys) - 1)
+            hit = valid & (self.keys[pos] == keys)
+            idx[hit] = self.top_idx[pos[hit]]
+            prob[hit] = self.top_prob[pos[hit]]
+
+        with self._overlay_lock:
+            for r in np.flatnonzero(valid & ~hit):
+                cached = self._overlay.get(int(keys[r]))
+                if cached is not None:
+                    self._overlay.move_to_end(int(keys[r]))
+                    idx[r], prob[r] = cached
+                    hit[r] = True
+
+        n_hits = int(hit.sum())
+        self.hits.inc(n_hits)
+        self.misses.inc(n - n_hits)
+        return hit, idx, prob
+
+    def remember(self, X, idx, prob):
+        """Keep model answers for missed on-grid rows so repeats are served from memory."""
+        keys, valid = self.quantize(X, on_grid=True)
+        with self._overlay_lock:
+            for r in np.flatnonzero(valid):
+                self._overlay[int(keys[r])] = (idx[r, :TOP_K].copy(), prob[r, :TOP_K].astype(np.float32))
+                self._overlay.move_to_end(int(keys[r]))
+            while len(self._overlay) > CROP_LOOKUP_OVERLAY_SIZE:
+                self._overlay.popitem(last=False)
+
+    # --- Similar historical fields ---
+    def nearest(self, X, k=3):
+        """Indices and z-space distances of the k most similar training rows for each row of X."""
+        Z = (np.asarray(X, dtype=np.float64) - self.train_mean) / self.train_std
+        d2 = np.einsum("ij,ij->i", Z, Z)[:, None] - 2 * Z @ self._train_z.T + self._train_sq[None, :]
+        k = max(1, min(k, len(self.train_X)))
+        nn = np.argpartition(d2, k - 1, axis=1)[:, :k]
+        nn = np.take_along_axis(nn, np.argsort(np.take_along_axis(d2, nn, axis=1), axis=1), axis=1)
+        dist = np.sqrt(np.maximum(np.take_along_axis(d2, nn, axis=1), 0))
+        return nn, dist
+
+    def similar_fields(self, x, k=3):
+        nn, dist = self.nearest(np.asarray([x]), k)
+        return [
+            {
+                **{f: round(float(v), 2) for f, v in zip(CROP_FEATURES, self.train_X[i])},
+                "crop": str(self.train_y[i]),
+                "distance": round(float(d), 3)
+            }
+            for i, d in zip(nn[0], dist[0])
+        ]
+
+
+def build(model, model_path, dataset_csv, samples_per_row=50, jitter=0.02, extra_csv=None, seed=42):
+    """Predict top-5 for every quantized cell around the training rows (and optional logged inputs)."""
+    import pandas as pd
+
+    df = pd.read_csv(dataset_csv)
+    train_X = df[CROP_FEATURES].to_numpy(dtype=np.float64)
+    train_y = df["label"].to_numpy(dtype=str)
+
+    points = [train_X]
+    if extra_csv:
+        points.append(pd.read_csv(extra_csv)[CROP_FEATURES].to_numpy(dtype=np.float64))
+    if samples_per_row > 0:
+        rng = np.random.default_rng(seed)
+        scale = (HIGHS - LOWS) * jitter
+        for _ in range(samples_per_row):
+            points.append(train_X + rng.normal(0.0, 1.0, train_X.shape) * scale)
+    points = np.vstack(points)
+
+    table = CropLookup(np.empty(0, dtype=np.int64), np.empty((0, TOP_K), dtype=np.uint16),
+                       np.empty((0, TOP_K), dtype=np.float32), train_X, train_y, file_sha1(model_path))
+    keys, valid = table.quantize(points)
+    keys, first = np.unique(keys[valid], return_index=True)
+    # Predict at the cell centre, i.e. exactly the lab-rounded input
+    q = np.rint((points[valid][first] - LOWS) / STEPS)
+    centres = (q * STEPS + LOWS).astype(np.float32)
+
+    top_idx, top_prob = [], []
+    for start in range(0, len(centres), 50000):
+        probs = model.predict_proba(centres[start:start + 50000])
+        idx = np.argsort(probs, axis=1)[:, ::-1][:, :TOP_K]
+        top_idx.append(idx.astype(np.uint16))
+        top_prob.append(np.take_along_axis(probs, idx, axis=1).astype(np.float32))
+
+    table.keys = keys
+    table.top_idx = np.vstack(top_idx)
+    table.top_prob = np.vstack(top_prob)
+    return table
+
+
+if __name__ == "__main__":
+    import joblib
+
+    here = os.path.dirname(os.path.abspath(__file__))
+    parser = argparse.ArgumentParser(description="Precompute the crop lookup table and neighbour index")
+    bundle = os.path.join(here, "crop_model_bundle.joblib")
+    parser.add_argument("--model", default=bundle if os.path.exists(bundle) else os.path.join(here, "xgb_crop_model.pkl"),
+                        help="Model pickle or train_crop_model.py bundle")
+    parser.add_argument("--dataset", default=os.path.join(here, "crop_dataset.csv"))
+    parser.add_argument("--out", default=os.path.join(here, "crop_lookup.npz"))
+    parser.add_argument("--samples-per-row", type=int, default=50)
+    parser.add_argument("--jitter", type=float, default=0.02, help="Sample spread as a fraction of each feature's range")
+    parser.add_argument("--extra", default=None, help="CSV of logged inputs to include (same feature columns)")
+    args = parser.parse_args()
+
+    model = joblib.load(args.model)
+    if isinstance(model, dict):
+        model = model["model"]
+    table = build(model, args.model, args.dataset,
+                  samples_per_row=args.samples_per_row, jitter=args.jitter, extra_csv=args.extra)
+    table.save(args.out)
+    print(f"✅ Lookup table with {len(table.keys)} cells saved to {args.out}")
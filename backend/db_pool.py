@@ -0,0 +1,149 @@
+# backend/db_pool.py
+# Bounded connection pool for DB-API connections (MySQL in app.py).
+# The pool only needs a zero-argument connect() factory, so it can be exercised
+# locally with SQLite:  ConnectionPool(lambda: sqlite3.connect(path, check_same_thread=False))
+import queue
+import threading
+import time
+
+import metrics
+
+
+class PoolTimeout(Exception):
+    pass
+
+
+class PooledConnection:
+    """Wraps a raw connection; close() hands it back to the pool instead of closing it."""
+
+    def __init__(self, pool, raw):
+        self._pool = pool
+        self._raw = raw
+        self._broken = False
+
+    def cursor(self, *args, **kwargs):
+        return self._raw.cursor(*args, **kwargs)
+
+    def commit(self):
+        self._raw.commit()
+
+    def rollback(self):
+        self._raw.rollback()
+
+    def invalidate(self):
+        """Mark the connection as unusable so it is discarded rather than reused."""
+        self._broken = True
+
+    @property
+    def closed(self):
+        return self._raw is None
+
+    def close(self):
+        if self._raw is not None:
+            raw, self._raw = self._raw, None
+            self._pool.release(raw, broken=self._broken)
+
+    def __getattr__(self, name):
+        if self._raw is None:
+            raise AttributeError(f"Connection already returned to pool ({name})")
+        return getattr(self._raw, name)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+class ConnectionPool:
+    def __init__(self, connect, size=10, timeout=10.0, ping_idle_s=30.0, name="db_pool"):
+        self._connect = connect
+        self.size = max(1, int(size))
+        self.timeout = timeout
+        self.ping_idle_s = ping_idle_s
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(self.size)
+        self._in_use = 0
+        self._lock = threading.Lock()
+
+        self.wait_ms = metrics.histogram(f"{name}.wait_ms")
+        self.checkouts = metrics.counter(f"{name}.checkouts")
+        self.timeouts = metrics.counter(f"{name}.timeouts")
+        self.created = metrics.counter(f"{name}.created")
+        self.discarded = metrics.counter(f"{name}.discarded")
+        metrics.gauge(f"{name}.in_use", fn=lambda: self._in_use)
+        metrics.gauge(f"{name}.idle", fn=self._idle.qsize)
+
+    def _healthy(self, raw):
+        try:
+            if hasattr(raw, "ping"):
+                # mysql.connector
+                raw.ping(reconnect=False)
+            else:
+                cur = raw.cursor()
+                cur.execute("SELECT 1")
+                cur.fetchall()
+                cur.close()
+            return True
+        except Exception:
+            return False
+
+    def _discard(self, raw):
+        self.discarded.inc()
+        try:
+            raw.close()
+        except Exception:
+            pass
+
+    def connection(self, timeout=None):
+        """Check out a connection, waiting up to `timeout` seconds for a free slot."""
+        started = time.perf_counter()
+        timeout = self.timeout if timeout is None else timeout
+        if not self._slots.acquire(timeout=timeout):
+            self.timeouts.inc()
+            raise PoolTimeout(f"No database connection available within {timeout}s")
+        try:
+            raw = None
+            while raw is None:
+                try:
+                    candidate, last_used = self._idle.get_nowait()
+                except queue.Empty:
+                    raw = self._connect()
+                    self.created.inc()
+                    break
+                if time.monotonic() - last_used > self.ping_idle_s and not self._healthy(candidate):
+                    self._discard(candidate)
+                    continue
+                raw = candidate
+        except Exception:
+            self._slots.release()
+            raise
+
+        with self._lock:
+            self._in_use += 1
+        self.checkouts.inc()
+        self.wait_ms.observe((time.perf_counter() - started) * 1000)
+        return PooledConnection(self, raw)
+
+    def release(self, raw, broken=False):
+        try:
+            if not broken and getattr(raw, "in_transaction", True):
+                # Never hand an open transaction to the next request
+                raw.rollback()
+        except Exception:
+            broken = True
+        if broken:
+            self._discard(raw)
+        else:
+            self._idle.put((raw, time.monotonic()))
+        with self._lock:
+            self._in_use -= 1
+        self._slots.release()
+
+    def close_all(self):
+        while True:
+            try:
+                raw, _ = self._idle.get_nowait()
+            except queue.Empty:
+                return
+            self._discard(raw)
@@ -0,0 +1,111 @@
+# backend/disease_batcher.py
+# Request coalescer for the disease CNN: concurrent uploads are collected into one
+# tensor batch (bounded by max batch size and max wait), run through a single
+# forward pass, and each caller gets its own row of the result back.
+import queue
+import threading
+import time
+
+import numpy as np
+
+import metrics
+
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128)
+QUEUE_DEPTH_BUCKETS = (0, 1, 2, 4, 8, 16, 32, 64, 128, 256)
+
+
+class _Pending:
+    __slots__ = ("x", "enqueued_at", "done", "result", "error", "cancelled")
+
+    def __init__(self, x):
+        self.x = x
+        self.enqueued_at = time.perf_counter()
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        # Set by a caller that gave up waiting; the worker skips it
+        self.cancelled = False
+
+
+class MicroBatcher:
+    def __init__(self, predict_fn, max_batch_size=16, max_wait_ms=10, name="disease_batcher"):
+        self.predict_fn = predict_fn
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000.0
+        self.name = name
+        self._queue = queue.Queue()
+        self._thread = None
+        self._start_lock = threading.Lock()
+
+        self.batch_size_hist = metrics.histogram(f"{name}.batch_size", BATCH_SIZE_BUCKETS)
+        self.queue_depth_hist = metrics.histogram(f"{name}.queue_depth", QUEUE_DEPTH_BUCKETS)
+        self.queue_wait_ms = metrics.histogram(f"{name}.queue_wait_ms")
+        self.stack_ms = metrics.histogram(f"{name}.stack_ms")
+        self.inference_ms = metrics.histogram(f"{name}.inference_ms")
+        self.total_ms = metrics.histogram(f"{name}.total_ms")
+        self.errors = metrics.counter(f"{name}.errors")
+        self.cancelled = metrics.counter(f"{name}.cancelled")
+        metrics.gauge(f"{name}.queue_depth_now", fn=self._queue.qsize)
+
+    def _ensure_worker(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._start_lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+                self._thread.start()
+
+    def submit(self, x, timeout=None):
+        """Queue one input (without batch dimension) and block until its prediction row is ready."""
+        self._ensure_worker()
+        item = _Pending(x)
+        self._queue.put(item)
+        if not item.done.wait(timeout):
+            item.cancelled = True
+            self.cancelled.inc()
+            raise TimeoutError("Timed out waiting for batched prediction")
+        self.total_ms.observe((time.perf_counter() - item.enqueued_at) * 1000)
+        if item.error is not None:
+            raise item.error
+        return item.result
+
+    def _collect(self):
+        batch = [self._queue.get()]
+        self.queue_depth_hist.observe(self._queue.qsize() + 1)
+        deadline = time.perf_counter() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            try:
+                if remaining <= 0:
+                    batch.append(self._queue.get_nowait())
+                else:
+                    batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            # Callers that timed out while queued don't get a forward pass
+            batch = [item for item in self._collect() if not item.cancelled]
+            if not batch:
+                continue
+            started = time.perf_counter()
+            for item in batch:
+                self.queue_wait_ms.observe((started - item.enqueued_at) * 1000)
+            self.batch_size_hist.observe(len(batch))
+            try:
+                X = np.stack([item.x for item in batch])
+                stacked = time.perf_counter()
+                self.stack_ms.observe((stacked - started) * 1000)
+                preds = self.predict_fn(X)
+                self.inference_ms.observe((time.perf_counter() - stacked) * 1000)
+                for i, item in enumerate(batch):
+                    item.result = preds[i]
+            except Exception as e:
+                self.errors.inc()
+                for item in batch:
+                    item.error = e
+            finally:
+                for item in batch:
+                    item.done.set()
@@ -0,0 +1,122 @@
+# backend/disease_runtime.py
+# CPU serving runtimes for the disease CNN.
+#  - export_tflite(): Keras model -> .tflite, optionally with full int8
+#    post-training quantization calibrated on sample images (float32 in/out is
+#    kept, so callers feed the same preprocessed batch either way)
+#  - TFLiteModel: a small interpreter wrapper with a Keras-like predict(), so
+#    the disease MicroBatcher works unchanged with DISEASE_RUNTIME=tflite.
+#    Uses the standalone LiteRT / tflite-runtime interpreter when installed, so
+#    serving workers don't need TensorFlow at all.
+import os
+import random
+import threading
+
+import numpy as np
+
+# Threads per interpreter invocation
+DISEASE_TFLITE_THREADS = int(os.environ.get("DISEASE_TFLITE_THREADS", os.cpu_count() or 1))
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp")
+
+
+def _interpreter_class():
+    try:
+        from ai_edge_litert.interpreter import Interpreter
+    except ImportError:
+        try:
+            from tflite_runtime.interpreter import Interpreter
+        except ImportError:
+            import tensorflow as tf
+            Interpreter = tf.lite.Interpreter
+    return Interpreter
+
+
+class TFLiteModel:
+    def __init__(self, path, num_threads=DISEASE_TFLITE_THREADS):
+        self.path = path
+        self.interpreter = _interpreter_class()(model_path=path, num_threads=num_threads)
+        self.input = self.interpreter.get_input_details()[0]
+        self.output = self.interpreter.get_output_details()[0]
+        self.batch_size = None
+        # The interpreter isn't thread-safe; the batcher calls from one thread but callers may not
+        self._lock = threading.Lock()
+
+    def _resize(self, batch_size):
+        if batch_size != self.batch_size:
+            shape = list(self.input["shape"])
+            shape[0] = batch_size
+            self.interpreter.resize_tensor_input(self.input["index"], shape)
+            self.interpreter.allocate_tensors()
+            self.input = self.interpreter.get_input_details()[0]
+            self.output = self.interpreter.get_output_details()[0]
+            self.batch_size = batch_size
+
+    def predict(self, batch, verbose=0):
+        """(N, H, W, 3) float32 in [0, 1] -> (N, classes) float32 probabilities."""
+        with self._lock:
+            self._resize(len(batch))
+            x = batch
+            if self.input["dtype"] != np.float32:
+                # Integer-input model: quantize with the tensor's own scale/zero point
+                scale, zero_point = self.input["quantization"]
+                x = np.round(batch / scale + zero_point).astype(self.input["dtype"])
+            self.interpreter.set_tensor(self.input["index"], np.ascontiguousarray(x))
+            self.interpreter.invoke()
+            y = self.interpreter.get_tensor(self.output["index"])
+            if self.output["dtype"] != np.float32:
+                scale, zero_point = self.output["quantization"]
+                y = (y.astype(np.float32) - zero_point) * scale
+            return np.array(y, dtype=np.float32)
+
+
+def tflite_loader(path):
+    return TFLiteModel(path)
+
+
+# ----------------------------------------------------
+# --- Export (training side, needs TensorFlow) ---
+# ----------------------------------------------------
+def sample_images(dataset_path, n, seed=0):
+    """Up to n (path, class_name) pairs drawn evenly at random from a class-per-folder dataset."""
+    rng = random.Random(seed)
+    classes = sorted(d for d in os.listdir(dataset_path) if os.path.isdir(os.path.join(dataset_path, d)))
+    per_class = {
+        c: sorted(f for f in os.listdir(os.path.join(dataset_path, c)) if f.lower().endswith(IMAGE_EXTENSIONS))
+        for c in classes
+    }
+    picked = []
+    for c, files in per_class.items():
+        k = min(len(files), max(1, n // max(1, len(classes))))
+        picked += [(os.path.join(dataset_path, c, f), c) for f in rng.sample(files, k)]
+    rng.shuffle(picked)
+    return picked[:n]
+
+
+def calibration_images(dataset_path, n=200, seed=0, size=None):
+    """Representative dataset for int8 calibration, preprocessed exactly as /detect-disease does."""
+    from image_preprocess import INPUT_SIZE, load_image
+
+    size = size or INPUT_SIZE
+
+    paths = [p for p, _ in sample_images(dataset_path, n, seed)]
+
+    def representative():
+        for path in paths:
+            with open(path, "rb") as f:
+                yield [load_image(f, size)[np.newaxis]]
+
+    return representative
+
+
+def export_tflite(model, path, representative=None):
+    """Write model as .tflite; with a representative dataset, quantize weights and activations to int8."""
+    import tensorflow as tf
+
+    converter = tf.lite.TFLiteConverter.from_keras_model(model)
+    if representative is not None:
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+        converter.representative_dataset = representative
+        converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+    with open(path, "wb") as f:
+        f.write(converter.convert())
+    print(f"✅ TFLite model saved as {path} ({os.path.getsize(path) / 1e6:.1f} MB"
+          f"{', int8' if representative is not None else ''})")
@@ -1,7 +1,18 @@
-from flask import Blueprint, request, jsonify, send_file
+from flask import Blueprint, request, jsonify, send_file, Response, stream_with_context
+from flask_jwt_extended import jwt_required, get_jwt_identity, verify_jwt_in_request
 from flask_sqlalchemy import SQLAlchemy
-from datetime import datetime
-import os, io, uuid, json
+from sqlalchemy import event
+from sqlalchemy.orm import Session, object_session
+from datetime import datetime, timedelta
+import os, uuid, json
+import order_history
+import checkout_engine
+import product_search
+import catalogue_cache
+import recommendations
+import sqlite_tuning
+import inventory
+import invoice_store
 
 bp = Blueprint("ecom", __name__, url_prefix="/api")
 
@@ -22,43 +33,79 @@ class Product(db.Model):
     description = db.Column(db.Text, nullable=True)
     price = db.Column(db.Float, nullable=False, default=0.0)
     stock = db.Column(db.Integer, nullable=False, default=0)
-    category_id = db.Column(db.Integer, db.ForeignKey("category.id"), nullable=True)
+    # Units held by carts (StockHold) and a counter bumped on every stock/reserved change
+    reserved = db.Column(db.Integer, nullable=False, default=0, server_default="0")
+    stock_version = db.Column(db.Integer, nullable=False, default=0, server_default="0")
+    category_id = db.Column(db.Integer, db.ForeignKey("category.id"), nullable=True, index=True)
     category = db.relationship("Category")
     variants = db.Column(db.Text, default="{}")
     images = db.Column(db.Text, default="[]")
     seller_id = db.Column(db.String(120), nullable=True)
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
 
 class Review(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    product_id = db.Column(db.String(36), db.ForeignKey("product.id"))
+    product_id = db.Column(db.String(36), db.ForeignKey("product.id"), index=True)
     rating = db.Column(db.Integer, default=5)
     title = db.Column(db.String(255))
     body = db.Column(db.Text)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
 class Order(db.Model):
+    # Buyer order history is paged newest first on (created_at, id)
+    __table_args__ = (db.Index("ix_order_buyer_id_created_at", "buyer_id", "created_at"),)
     id = db.Column(db.String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
     buyer_id = db.Column(db.String(120), nullable=False)
     total = db.Column(db.Float, nullable=False, default=0.0)
     status = db.Column(db.String(50), default="Ordered")
     payment_method = db.Column(db.String(50), default="cod")
     shipping = db.Column(db.Text, default="{}")
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
 
 class OrderItem(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    order_id = db.Column(db.String(36), db.ForeignKey("order.id"))
+    order_id = db.Column(db.String(36), db.ForeignKey("order.id"), index=True)
     product_id = db.Column(db.String(36))
     title = db.Column(db.String(255))
     qty = db.Column(db.Integer, default=1)
     price = db.Column(db.Float, default=0.0)
 
+class StockHold(db.Model):
+    # Short-lived cart reservation, counted in Product.reserved until checkout, release or expiry
+    id = db.Column(db.Integer, primary_key=True)
+    cart_id = db.Column(db.String(36), nullable=False, index=True)
+    buyer_id = db.Column(db.String(120))
+    product_id = db.Column(db.String(36), db.ForeignKey("product.id"), nullable=False)
+    qty = db.Column(db.Integer, nullable=False)
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
+
+# Cached product payloads are dropped once the change is committed: invalidating at
+# flush would let a concurrent reader re-cache the old row before the commit lands.
+@event.listens_for(Product, "after_update")
+@event.listens_for(Product, "after_delete")
+def _collect_changed_product(mapper, connection, target):
+    session = object_session(target)
+    if session is not None:
+        session.info.setdefault("changed_products", set()).add(target.id)
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_committed_products(session):
+    changed = session.info.pop("changed_products", None)
+    if changed:
+        catalogue_cache.invalidate_products(changed)
+
+@event.listens_for(Session, "after_rollback")
+def _forget_rolled_back_products(session):
+    session.info.pop("changed_products", None)
+
 def init_db(app):
     """Initialize database tables and seed sample data"""
     db.init_app(app)
     with app.app_context():
+        sqlite_tuning.configure(db.engine)
         db.create_all()
+        sqlite_tuning.ensure_columns(db.engine, db.metadata)
+        sqlite_tuning.ensure_indexes(db.engine, db.metadata)
         # Seed sample data if no products exist
         if db.session.query(Product).count() == 0:
             cat = Category(name="Fertilizers")
@@ -84,6 +131,11 @@ def init_db(app):
             )
             db.session.add_all([p1, p2])
             db.session.commit()
+        product_search.init_search(db, Product)
+        with db.engine.begin() as conn:
+            recommendations.init_tables(conn)
+    recommendations.start_refresh_thread(app, db, Order, OrderItem)
+    inventory.start_sweeper_thread(app, db, Product, StockHold)
 
 # Routes
 @bp.route("/products", methods=["GET"])
@@ -92,40 +144,48 @@ def list_products():
     page = request.args.get("page", 1, type=int)
     per_page = request.args.get("per_page", 12, type=int)
     
-    query = db.session.query(Product)
-    if q:
-        query = query.filter(Product.title.ilike(f"%{q}%"))
-    
-    total = query.count()
-    prods = query.order_by(Product.created_at.desc()).offset((page-1)*per_page).limit(per_page).all()
+    if q and product_search.enabled():
+        # Ranked FTS5 search: ids + total in one query, then one IN query for the rows
+        ids, total = product_search.search(db.session, q, page, per_page)
+        by_id = {p.id: p for p in db.session.query(Product).filter(Product.id.in_(ids))} if ids else {}
+        prods = [by_id[i] for i in ids if i in by_id]
+    else:
+        query = db.session.query(Product)
+        if q:
+            query = query.filter(Product.title.ilike(f"%{q}%"))
+
+        total = query.count()
+        prods = query.order_by(Product.created_at.desc()).offset((page-1)*per_page).limit(per_page).all()
     
-    def serialize(p):
-        return {
-            "id": p.id, "title": p.title, "description": p.description,
-            "price": p.price, "stock": p.stock, "variants": json.loads(p.variants or "{}"),
-            "images": json.loads(p.images or "[]"), "category_id": p.category_id
-        }
-    return jsonify({"products": [serialize(p) for p in prods], "total": total}), 200
+    return jsonify({"products": [catalogue_cache.serialize_product(p) for p in prods], "total": total}), 200
 
 @bp.route("/products/<product_id>", methods=["GET"])
 def get_product(product_id):
-    p = db.session.query(Product).get(product_id)
-    if not p:
-        return jsonify({"error": "Not found"}), 404
-    reviews = db.session.query(Review).filter_by(product_id=product_id).all()
-    fbt = db.session.query(Product).filter(Product.category_id==p.category_id, Product.id!=p.id).limit(3).all()
-    return jsonify({
-        "id": p.id, "title": p.title, "description": p.description, "price": p.price, "stock": p.stock,
-        "variants": json.loads(p.variants or "{}"), "images": json.loads(p.images or "[]"),
-        "reviews": [{"rating": r.rating, "title": r.title, "body": r.body} for r in reviews],
-        "frequently_bought_together": [{"id": x.id, "title": x.title, "price": x.price} for x in fbt]
-    }), 200
+    def build():
+        p = db.session.query(Product).get(product_id)
+        if not p:
+            return jsonify({"error": "Not found"}), 404
+        reviews = db.session.query(Review).filter_by(product_id=product_id).all()
+        # Co-purchase neighbours from order history; same-category picks until the product has any
+        fbt = recommendations.neighbors(db.session, Product, p.id, 3)
+        if not fbt:
+            fbt = db.session.query(Product).filter(Product.category_id==p.category_id, Product.id!=p.id).limit(3).all()
+        return {
+            "id": p.id, "title": p.title, "description": p.description, "price": p.price, "stock": p.stock,
+            "variants": json.loads(p.variants or "{}"), "images": json.loads(p.images or "[]"),
+            "reviews": [{"rating": r.rating, "title": r.title, "body": r.body} for r in reviews],
+            "frequently_bought_together": [{"id": x.id, "title": x.title, "price": x.price} for x in fbt]
+        }
+    # Cached serialized payload + ETag (If-None-Match -> 304)
+    return catalogue_cache.cached_json(("product", product_id), build)
 
 @bp.route("/search-autosuggest", methods=["GET"])
 def autosuggest():
     q = request.args.get("q", "").strip()
     if not q:
         return jsonify({"suggestions": []})
+    if product_search.enabled():
+        return jsonify({"suggestions": product_search.suggest(db.session, Product, q, 10)}), 200
     items = db.session.query(Product).filter(Product.title.ilike(f"{q}%")).limit(10).all()
     return jsonify({"suggestions": [{"id": it.id, "title": it.title} for it in items]}), 200
 
@@ -135,12 +195,18 @@ def validate_cart():
     items = data.get("items", [])
     resp_items = []
     total = 0.0
+    products = checkout_engine.fetch_products(db.session, Product, [it.get("product_id") for it in items])
+    # Units this cart already holds count as available to it
+    held = {}
+    if data.get("cart_id"):
+        for pid, qty in db.session.query(StockHold.product_id, StockHold.qty).filter_by(cart_id=data["cart_id"]):
+            held[pid] = held.get(pid, 0) + qty
     for it in items:
-        p = db.session.query(Product).get(it.get("product_id"))
+        p = products.get(it.get("product_id"))
         if not p:
             return jsonify({"error": f"Product not found"}), 404
         qty = int(it.get("qty", 1))
-        if qty > p.stock:
+        if qty > p.stock - p.reserved + held.get(p.id, 0):
             return jsonify({"error": f"Not enough stock for {p.title}"}), 400
         line = round(p.price * qty, 2)
         resp_items.append({"product_id": p.id, "qty": qty, "price": p.price, "line_total": line})
@@ -155,43 +221,119 @@ def checkout():
     payment_method = data.get("payment_method", "cod")
     shipping = data.get("shipping", {})
     
-    order_total = 0.0
-    order_items = []
-    for it in items:
-        p = db.session.query(Product).get(it["product_id"])
-        if not p or p.stock < it["qty"]:
-            return jsonify({"error": "out_of_stock"}), 400
-        p.stock -= it["qty"]
-        line = round(p.price * it["qty"], 2)
-        order_items.append({"product_id": p.id, "title": p.title, "qty": it["qty"], "price": p.price})
-        order_total += line
-    
-    order = Order(buyer_id=buyer_id, total=round(order_total, 2), payment_method=payment_method, shipping=json.dumps(shipping), status="Ordered")
-    db.session.add(order)
-    db.session.flush()
-    
-    for it in order_items:
-        oi = OrderItem(order_id=order.id, product_id=it["product_id"], title=it["title"], qty=it["qty"], price=it["price"])
-        db.session.add(oi)
-    
-    db.session.commit()
+    # Reserved cart (POST /cart/reservations): its holds are converted into the order.
+    # Claiming holds needs the JWT of the buyer who placed them; guest checkout needs none.
+    cart_id = data.get("cart_id")
+    take_held = None
+    if cart_id:
+        verify_jwt_in_request()
+        buyer_id = get_jwt_identity()
+        take_held = lambda session: inventory.take_holds(session, StockHold, cart_id, buyer_id)
+
+    try:
+        order = checkout_engine.checkout_sqlalchemy(
+            db.session, Product, Order, OrderItem, buyer_id, items, payment_method, json.dumps(shipping),
+            take_held=take_held
+        )
+    except checkout_engine.CheckoutError as e:
+        return jsonify({"error": e.code}), 400
+    # Stock changed: drop cached payloads for the purchased products
+    catalogue_cache.invalidate_products(it["product_id"] for it in items)
+    _schedule_invoice(order)
     return jsonify({"order": {"id": order.id, "total": order.total, "status": order.status}}), 201
 
+@bp.route("/cart/reservations", methods=["POST"])
+@jwt_required()
+def reserve_cart():
+    """
+    Hold stock for the signed-in buyer's cart for INVENTORY_HOLD_TTL_S seconds.
+    Body: {"cart_id": optional, "items": [{"product_id": ..., "qty": 2}]}
+    Posting again with the same cart_id replaces its holds; checkout with the cart_id
+    (same JWT) uses them.
+    """
+    data = request.get_json() or {}
+    try:
+        cart_id, expires_at = inventory.reserve(
+            db.session, Product, StockHold, data.get("cart_id"), get_jwt_identity(), data.get("items", [])
+        )
+    except checkout_engine.CheckoutError as e:
+        return jsonify({"error": e.code}), 400
+    return jsonify({"cart_id": cart_id, "expires_at": expires_at.isoformat() + "Z"}), 201
+
+@bp.route("/cart/reservations/<cart_id>", methods=["DELETE"])
+@jwt_required()
+def release_cart(cart_id):
+    released = inventory.release(db.session, Product, StockHold, cart_id, get_jwt_identity())
+    return jsonify({"released": released}), 200
+
+@bp.route("/products/<product_id>/stock", methods=["GET", "PUT"])
+def product_stock(product_id):
+    """
+    GET: live stock, reserved, available units and the row version (never cached).
+    PUT (JWT of admin or the product's seller):
+      {"stock": n, "version": v}: set stock if the row is still at version v (409 otherwise);
+      {"delta": n}: restock / write off without a version check.
+    """
+    if request.method == "GET":
+        state = inventory.stock_state(db.session, Product, product_id)
+        return (jsonify(state), 200) if state else (jsonify({"error": "Not found"}), 404)
+
+    verify_jwt_in_request()
+    username = get_jwt_identity()
+    p = db.session.query(Product).get(product_id)
+    if not p:
+        return jsonify({"error": "Not found"}), 404
+    # Same rule as deleting a product in app.py: admin or the product's seller
+    if username != "admin" and (p.seller_id is None or p.seller_id != username):
+        return jsonify({"error": "forbidden"}), 403
+
+    data = request.get_json() or {}
+    try:
+        if "delta" in data:
+            state = inventory.adjust_stock(db.session, Product, product_id, int(data["delta"]))
+        elif "stock" in data and "version" in data:
+            state = inventory.set_stock(db.session, Product, product_id, int(data["stock"]), int(data["version"]))
+        else:
+            return jsonify({"error": "Send {stock, version} or {delta}"}), 400
+    except (TypeError, ValueError):
+        return jsonify({"error": "stock, version and delta must be integers"}), 400
+    except checkout_engine.CheckoutError as e:
+        return jsonify({"error": e.code}), {"not_found": 404, "version_conflict": 409}.get(e.code, 400)
+    catalogue_cache.invalidate_products([product_id])
+    return jsonify(state), 200
+
 @bp.route("/orders", methods=["GET"])
 def list_orders():
+    """
+    Orders (optionally for one buyer), newest first, with items loaded in one set-based query.
+    Query params: limit + cursor for keyset pagination, stream=1 for NDJSON of the full history.
+    """
     buyer_id = request.args.get("buyer_id")
-    query = db.session.query(Order)
-    if buyer_id:
-        query = query.filter_by(buyer_id=buyer_id)
-    orders = query.order_by(Order.created_at.desc()).all()
-    out = []
-    for o in orders:
-        items = db.session.query(OrderItem).filter_by(order_id=o.id).all()
-        out.append({
+
+    def load_page(limit, cursor):
+        return order_history.load_orders_sqlalchemy(db.session, Order, OrderItem, buyer_id, limit, cursor)
+
+    def serialize(o, items):
+        return {
             "id": o.id, "buyer_id": o.buyer_id, "total": o.total, "status": o.status,
-            "created_at": o.created_at.isoformat(), "items": [{"title": it.title, "qty": it.qty, "price": it.price} for it in items]
-        })
-    return jsonify({"orders": out}), 200
+            "created_at": o.created_at.isoformat() if o.created_at else None, "items": [{"title": it.title, "qty": it.qty, "price": it.price} for it in items]
+        }
+
+    if request.args.get("stream") == "1":
+        def generate():
+            for o, items in order_history.iter_pages(load_page):
+                yield json.dumps(serialize(o, items)) + "\n"
+        return Response(stream_with_context(generate()), mimetype="application/x-ndjson")
+
+    limit = order_history.page_size(request.args.get("limit", type=int))
+    try:
+        orders, next_cursor = load_page(limit, request.args.get("cursor"))
+    except order_history.InvalidCursor:
+        return jsonify({"error": "invalid_cursor"}), 400
+    body = {"orders": [serialize(o, items) for o, items in orders]}
+    if limit:
+        body["next_cursor"] = next_cursor
+    return jsonify(body), 200
 
 @bp.route("/orders/<order_id>/status", methods=["PUT"])
 def update_order_status(order_id):
@@ -202,42 +344,64 @@ def update_order_status(order_id):
         return jsonify({"error": "order_not_found"}), 404
     o.status = status
     db.session.commit()
+    _schedule_invoice(o)
     return jsonify({"order_id": o.id, "status": o.status}), 200
 
+def _invoice_payload(o):
+    return invoice_store.payload(o, db.session.query(OrderItem).filter_by(order_id=o.id).all())
+
+def _schedule_invoice(o):
+    """Render the order's current invoice in the background so the download is a file read."""
+    if not invoice_store.AVAILABLE:
+        return
+    try:
+        invoice_store.schedule(_invoice_payload(o))
+    except Exception as e:
+        print(f"⚠️ Invoice render not scheduled for order {o.id}: {e}")
+
 @bp.route("/invoice/<order_id>", methods=["GET"])
 def invoice(order_id):
-    try:
-        from reportlab.lib.pagesizes import A4
-        from reportlab.pdfgen import canvas
-    except ImportError:
+    """
+    The order's invoice PDF, from the on-disk cache (rendered at checkout / status change).
+    The ETag is the invoice's content digest, so If-None-Match gets a 304 until the order changes.
+    """
+    if not invoice_store.AVAILABLE:
         return jsonify({"error": "reportlab not installed"}), 500
-    
+
     o = db.session.query(Order).get(order_id)
     if not o:
         return jsonify({"error": "not_found"}), 404
-    items = db.session.query(OrderItem).filter_by(order_id=o.id).all()
-    buffer = io.BytesIO()
-    c = canvas.Canvas(buffer, pagesize=A4)
-    c.setFont("Helvetica-Bold", 16)
-    c.drawString(40, 800, f"Invoice - Order {o.id}")
-    c.setFont("Helvetica", 11)
-    c.drawString(40, 780, f"Buyer: {o.buyer_id}")
-    y = 740
-    c.drawString(40, y, "Item")
-    c.drawString(360, y, "Qty")
-    c.drawString(420, y, "Price")
-    for it in items:
-        y -= 20
-        c.drawString(40, y, it.title[:50])
-        c.drawString(360, y, str(it.qty))
-        c.drawString(420, y, f"₹{it.price}")
-    y -= 30
-    c.drawString(360, y, "Total:")
-    c.drawString(420, y, f"₹{o.total}")
-    c.showPage()
-    c.save()
-    buffer.seek(0)
-    return send_file(buffer, as_attachment=True, download_name=f"invoice_{o.id}.pdf", mimetype="application/pdf")
+    try:
+        path, digest = invoice_store.ensure(_invoice_payload(o))
+    except Exception as e:
+        print(f"✗ Invoice for order {o.id} failed: {e}")
+        return jsonify({"error": "invoice_unavailable"}), 503
+    return send_file(path, as_attachment=True, download_name=f"invoice_{o.id}.pdf", mimetype="application/pdf",
+                     conditional=True, etag=digest, max_age=0)
+
+@bp.route("/invoices/export", methods=["GET"])
+def export_invoices():
+    """
+    ZIP of invoice PDFs for orders created in [from, to] (YYYY-MM-DD, both inclusive), streamed
+    as it is built: orders are paged from the DB and missing PDFs render ahead in the worker pool.
+    """
+    if not invoice_store.AVAILABLE:
+        return jsonify({"error": "reportlab not installed"}), 500
+    try:
+        since = datetime.strptime(request.args["from"], "%Y-%m-%d")
+        until = datetime.strptime(request.args["to"], "%Y-%m-%d") + timedelta(days=1)
+    except (KeyError, ValueError):
+        return jsonify({"error": "from and to are required as YYYY-MM-DD"}), 400
+    if until <= since:
+        return jsonify({"error": "to is before from"}), 400
+
+    def load_page(limit, cursor):
+        return order_history.load_orders_sqlalchemy(db.session, Order, OrderItem, None, limit, cursor, since, until)
+
+    payloads = (invoice_store.payload(o, items) for o, items in order_history.iter_pages(load_page))
+    filename = f"invoices_{request.args['from']}_{request.args['to']}.zip"
+    return Response(stream_with_context(invoice_store.stream_zip(payloads)), mimetype="application/zip",
+                    headers={"Content-Disposition": f"attachment; filename={filename}"})
 
 # ...existing code...
 def register_ecom(app):
@@ -249,7 +413,10 @@ def register_ecom(app):
     # just create tables and seed if needed. Otherwise init_db will init and create.
     if app.extensions.get("sqlalchemy"):
         with app.app_context():
+            sqlite_tuning.configure(db.engine)
             db.create_all()
+            sqlite_tuning.ensure_columns(db.engine, db.metadata)
+            sqlite_tuning.ensure_indexes(db.engine, db.metadata)
             # seed if no products
             try:
                 if db.session.query(Product).count() == 0:
@@ -279,6 +446,11 @@ def register_ecom(app):
             except Exception:
                 # avoid crashing startup on seed errors
                 db.session.rollback()
+            product_search.init_search(db, Product)
+            with db.engine.begin() as conn:
+                recommendations.init_tables(conn)
+        recommendations.start_refresh_thread(app, db, Order, OrderItem)
+        inventory.start_sweeper_thread(app, db, Product, StockHold)
     else:
         # init_db will call db.init_app(app) then create_all + seed
         init_db(app)
@@ -0,0 +1,127 @@
+# backend/fake_upstream.py
+# Local stand-in for NewsAPI, OpenWeatherMap and data.gov.in so outbound-HTTP
+# latency and failure behaviour can be exercised offline. Every response is
+# delayed by --latency-ms (+/- --jitter-ms); --error-rate of requests get a
+# 503 and --hang-rate never answer within any sane timeout.
+#
+#   python fake_upstream.py --port 8099 --latency-ms 200 --error-rate 0.1
+#   NEWS_API_URL=http://127.0.0.1:8099/v2/top-headlines \
+#   OPENWEATHER_BASE_URL=http://127.0.0.1:8099 \
+#   MARKET_API_URL=http://127.0.0.1:8099/resource/market python app.py
+import argparse
+import asyncio
+import random
+import threading
+from datetime import date, timedelta
+
+from aiohttp import web
+
+
+class Behaviour:
+    def __init__(self, latency_ms=50, jitter_ms=0, error_rate=0.0, hang_rate=0.0, hang_s=60):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.hang_rate = hang_rate
+        self.hang_s = hang_s
+        self.requests = 0
+
+
+def _news(request):
+    return {"status": "ok", "articles": [
+        {"title": f"Agriculture headline {i}", "description": "Fake article", "url": f"https://example.com/{i}"}
+        for i in range(10)
+    ]}
+
+
+def _geocode(request):
+    return [{"name": request.query.get("q", ""), "lat": 18.52, "lon": 73.86}]
+
+
+def _forecast(request):
+    return {"list": [
+        {"dt_txt": f"2024-01-01 {h:02d}:00:00", "main": {"temp": 25.0, "humidity": 60},
+         "weather": [{"description": "clear sky"}]}
+        for h in range(0, 24, 3)
+    ] * 5}
+
+
+def _current(request):
+    return {"main": {"temp": 25.0, "humidity": 60}}
+
+
+def _market(request):
+    offset = int(request.query.get("offset", 0))
+    limit = int(request.query.get("limit", 100))
+    # 90 days of one market, newest first
+    records = [
+        {"state": request.query.get("filters[state]"), "district": "Pune", "market": "Pune",
+         "commodity": request.query.get("filters[commodity]"), "variety": "Other",
+         "arrival_date": (date.today() - timedelta(days=d)).strftime("%d/%m/%Y"),
+         "min_price": "2000", "max_price": "2400", "modal_price": "2200"}
+        for d in range(90)
+    ]
+    return {"records": records[offset:offset + limit]}
+
+
+ROUTES = {
+    "/v2/top-headlines": _news,
+    "/geo/1.0/direct": _geocode,
+    "/data/2.5/forecast": _forecast,
+    "/data/2.5/weather": _current,
+}
+
+
+def make_app(behaviour):
+    async def handle(request):
+        behaviour.requests += 1
+        roll = random.random()
+        if roll < behaviour.hang_rate:
+            await asyncio.sleep(behaviour.hang_s)
+        delay = behaviour.latency_ms + random.uniform(-behaviour.jitter_ms, behaviour.jitter_ms)
+        await asyncio.sleep(max(0.0, delay) / 1000)
+        if roll < behaviour.hang_rate + behaviour.error_rate:
+            return web.json_response({"message": "upstream unavailable"}, status=503)
+        handler = ROUTES.get(request.path)
+        if handler is None and request.path.startswith("/resource/"):
+            handler = _market
+        if handler is None:
+            return web.json_response({"message": "not found"}, status=404)
+        return web.json_response(handler(request))
+
+    app = web.Application()
+    app.router.add_get("/{tail:.*}", handle)
+    return app
+
+
+def start_in_thread(behaviour, port=0):
+    """Serve in a daemon thread; returns the base URL (port 0 picks a free one)."""
+    ready = threading.Event()
+    box = {}
+
+    def run():
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        runner = web.AppRunner(make_app(behaviour), access_log=None)
+        loop.run_until_complete(runner.setup())
+        site = web.TCPSite(runner, "127.0.0.1", port)
+        loop.run_until_complete(site.start())
+        box["port"] = runner.addresses[0][1]
+        ready.set()
+        loop.run_forever()
+
+    threading.Thread(target=run, name="fake-upstream", daemon=True).start()
+    ready.wait()
+    return f"http://127.0.0.1:{box['port']}"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fake news/weather/market upstream")
+    parser.add_argument("--port", type=int, default=8099)
+    parser.add_argument("--latency-ms", type=float, default=50)
+    parser.add_argument("--jitter-ms", type=float, default=0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--hang-rate", type=float, default=0.0)
+    args = parser.parse_args()
+    behaviour = Behaviour(args.latency_ms, args.jitter_ms, args.error_rate, args.hang_rate)
+    web.run_app(make_app(behaviour), host="127.0.0.1", port=args.port)
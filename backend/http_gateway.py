@@ -0,0 +1,236 @@
+# backend/http_gateway.py
+# One asyncio-based client for all outbound HTTP (news, weather, market).
+# An aiohttp session with a pooled connector lives on an event loop in a
+# daemon thread, so Flask worker threads only wait on a future with a hard
+# deadline rather than tying up their own sockets.
+#  - per-host concurrency limits (a slow upstream can't take every slot)
+#  - connect/total timeouts on every call
+#  - retries with exponential backoff + full jitter on timeouts, connection
+#    errors, 429 and 5xx
+#  - a circuit breaker per host: after repeated failures calls fail fast
+#    until a cooldown passes, then one trial call decides whether to close it
+#
+# Sync callers:   http_gateway.get_json(url, params=...)
+# Async callers:  await http_gateway.gateway.fetch_json(url, params=...)
+import asyncio
+import atexit
+import concurrent.futures
+import os
+import random
+import threading
+import time
+from urllib.parse import urlsplit
+
+import aiohttp
+
+import metrics
+
+HTTP_TIMEOUT_S = float(os.environ.get("HTTP_TIMEOUT_S", 10))
+HTTP_CONNECT_TIMEOUT_S = float(os.environ.get("HTTP_CONNECT_TIMEOUT_S", 3))
+HTTP_POOL_SIZE = int(os.environ.get("HTTP_POOL_SIZE", 100))
+HTTP_PER_HOST_LIMIT = int(os.environ.get("HTTP_PER_HOST_LIMIT", 16))
+HTTP_RETRIES = int(os.environ.get("HTTP_RETRIES", 2))
+HTTP_BACKOFF_BASE_S = float(os.environ.get("HTTP_BACKOFF_BASE_S", 0.2))
+HTTP_BACKOFF_MAX_S = float(os.environ.get("HTTP_BACKOFF_MAX_S", 2))
+# Consecutive failures that open a host's breaker, and how long it stays open
+HTTP_BREAKER_FAILURES = int(os.environ.get("HTTP_BREAKER_FAILURES", 5))
+HTTP_BREAKER_COOLDOWN_S = float(os.environ.get("HTTP_BREAKER_COOLDOWN_S", 30))
+
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+
+
+class UpstreamError(Exception):
+    def __init__(self, message, status=None):
+        super().__init__(message)
+        self.status = status
+
+
+class CircuitOpen(UpstreamError):
+    pass
+
+
+class CircuitBreaker:
+    """closed -> open after N consecutive failures -> half-open after cooldown (one trial call)."""
+
+    def __init__(self, host, failures=HTTP_BREAKER_FAILURES, cooldown_s=HTTP_BREAKER_COOLDOWN_S):
+        self.host = host
+        self.failures = failures
+        self.cooldown_s = cooldown_s
+        self.consecutive = 0
+        self.opened_at = None
+        self.trial_running = False
+        self.opens = metrics.counter(f"http_gateway.{host}.breaker_opens")
+        metrics.gauge(f"http_gateway.{host}.breaker_open", fn=lambda: int(self.opened_at is not None))
+
+    def before_call(self):
+        """Raise CircuitOpen or let the call through; True when this call is the half-open trial."""
+        # Only touched from the gateway loop thread, so no lock needed
+        if self.opened_at is None:
+            return False
+        if time.monotonic() - self.opened_at < self.cooldown_s or self.trial_running:
+            raise CircuitOpen(f"Circuit open for {self.host}")
+        self.trial_running = True
+        return True
+
+    def end_trial(self):
+        # A trial that ended without a result (cancelled by the caller's deadline)
+        # must not leave the breaker waiting for it forever
+        self.trial_running = False
+
+    def record_success(self):
+        self.consecutive = 0
+        self.opened_at = None
+        self.trial_running = False
+
+    def record_failure(self):
+        self.consecutive += 1
+        if self.trial_running or self.consecutive >= self.failures:
+            if self.opened_at is None or self.trial_running:
+                self.opens.inc()
+            self.opened_at = time.monotonic()
+        self.trial_running = False
+
+
+class _Host:
+    def __init__(self, host, limit):
+        self.semaphore = asyncio.Semaphore(limit)
+        self.breaker = CircuitBreaker(host)
+        self.latency_ms = metrics.histogram(f"http_gateway.{host}.latency_ms")
+        self.errors = metrics.counter(f"http_gateway.{host}.errors")
+        self.retries = metrics.counter(f"http_gateway.{host}.retries")
+
+
+class HttpGateway:
+    def __init__(self, pool_size=HTTP_POOL_SIZE, per_host_limit=HTTP_PER_HOST_LIMIT,
+                 timeout_s=HTTP_TIMEOUT_S, connect_timeout_s=HTTP_CONNECT_TIMEOUT_S, retries=HTTP_RETRIES):
+        self.pool_size = pool_size
+        self.per_host_limit = per_host_limit
+        self.timeout_s = timeout_s
+        self.connect_timeout_s = connect_timeout_s
+        self.retries = retries
+        self._hosts = {}
+        self._loop = None
+        self._session = None
+        self._started = threading.Lock()
+
+    # --- Event loop thread ---
+    def _ensure_loop(self):
+        if self._loop is not None:
+            return self._loop
+        with self._started:
+            if self._loop is None:
+                loop = asyncio.new_event_loop()
+                ready = threading.Event()
+
+                def run():
+                    asyncio.set_event_loop(loop)
+                    loop.call_soon(ready.set)
+                    loop.run_forever()
+
+                threading.Thread(target=run, name="http-gateway", daemon=True).start()
+                ready.wait()
+                self._loop = loop
+        return self._loop
+
+    def _host(self, host):
+        state = self._hosts.get(host)
+        if state is None:
+            state = self._hosts[host] = _Host(host, self.per_host_limit)
+        return state
+
+    def _client(self):
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.pool_size, limit_per_host=self.per_host_limit,
+                                               ttl_dns_cache=300),
+                timeout=aiohttp.ClientTimeout(total=self.timeout_s, sock_connect=self.connect_timeout_s),
+                raise_for_status=False,
+            )
+        return self._session
+
+    # --- Async API ---
+    async def fetch_json(self, url, params=None, timeout=None, raise_for_status=False, retries=None):
+        """
+        GET url and decode the JSON body. Timeouts, connection errors, 429 and 5xx
+        are retried; 4xx bodies are returned as-is (upstream error payloads) unless
+        raise_for_status. Raises UpstreamError / CircuitOpen when out of options.
+        """
+        host = urlsplit(url).hostname or url
+        if params:
+            # Same as requests: None-valued params are left out
+            params = {k: v for k, v in params.items() if v is not None}
+        state = self._host(host)
+        retries = self.retries if retries is None else retries
+        # Per-call override; passing timeout=None to aiohttp would disable the session default
+        extra = {"timeout": aiohttp.ClientTimeout(total=timeout, sock_connect=self.connect_timeout_s)} if timeout else {}
+
+        for attempt in range(retries + 1):
+            async with state.semaphore:
+                # Checked once a slot is free, so a trial isn't spent waiting in the queue
+                trial = state.breaker.before_call()
+                started = time.perf_counter()
+                error = None
+                try:
+                    try:
+                        async with self._client().get(url, params=params, **extra) as res:
+                            if res.status in RETRY_STATUSES:
+                                error = UpstreamError(f"{host} returned {res.status}", res.status)
+                            else:
+                                body = await res.json(content_type=None)
+                                state.breaker.record_success()
+                                if raise_for_status and res.status >= 400:
+                                    raise UpstreamError(f"{host} returned {res.status}", res.status)
+                                return body
+                    except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as e:
+                        error = UpstreamError(f"{host}: {type(e).__name__}: {e}")
+                    state.errors.inc()
+                    state.breaker.record_failure()
+                finally:
+                    state.latency_ms.observe((time.perf_counter() - started) * 1000)
+                    if trial:
+                        # No-op after record_success/record_failure; matters on CancelledError
+                        state.breaker.end_trial()
+
+            if attempt == retries:
+                raise error
+            state.retries.inc()
+            await asyncio.sleep(random.uniform(0, min(HTTP_BACKOFF_MAX_S, HTTP_BACKOFF_BASE_S * 2 ** attempt)))
+
+    async def fetch_many(self, requests, **kwargs):
+        """Fan out [(url, params), ...] concurrently; exceptions are returned in place of results."""
+        return await asyncio.gather(*(self.fetch_json(url, params, **kwargs) for url, params in requests),
+                                    return_exceptions=True)
+
+    # --- Sync bridge for Flask handlers / background threads ---
+    def run(self, coro, deadline=None):
+        future = asyncio.run_coroutine_threadsafe(coro, self._ensure_loop())
+        try:
+            return future.result(deadline or self._deadline(None, None))
+        except concurrent.futures.TimeoutError:
+            future.cancel()
+            raise UpstreamError("Gateway deadline exceeded")
+
+    def _deadline(self, timeout, retries):
+        # Worst case: every attempt times out, plus the capped backoffs between them
+        attempts = (self.retries if retries is None else retries) + 1
+        return ((timeout or self.timeout_s) + HTTP_BACKOFF_MAX_S) * attempts
+
+    def get_json(self, url, params=None, timeout=None, raise_for_status=False, retries=None):
+        return self.run(self.fetch_json(url, params, timeout, raise_for_status, retries),
+                        self._deadline(timeout, retries))
+
+    def get_many(self, requests, **kwargs):
+        return self.run(self.fetch_many(requests, **kwargs),
+                        self._deadline(kwargs.get("timeout"), kwargs.get("retries")))
+
+    def close(self):
+        if self._loop is not None and self._session is not None and not self._session.closed:
+            self.run(self._session.close(), 5)
+
+
+gateway = HttpGateway()
+atexit.register(gateway.close)
+
+
+def get_json(url, params=None, timeout=None, raise_for_status=False, retries=None):
+    return gateway.get_json(url, params, timeout, raise_for_status, retries)
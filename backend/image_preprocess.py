@@ -0,0 +1,75 @@
+# backend/image_preprocess.py
+# Memory-bounded preprocessing for /detect-disease uploads.
+#  - size limits are checked before anything is decoded: the request body
+#    length, then the pixel count from the image header
+#  - JPEGs are decoded straight at a reduced scale with draft() (libjpeg DCT
+#    scaling), so a 12 MP phone photo never exists in memory at full resolution;
+#    other formats go through reduce() before the final resample
+#  - the result is written once into a float32 buffer (no float64 temporaries)
+import os
+
+import numpy as np
+from PIL import Image
+
+# Upload body limit for image endpoints (bytes)
+DISEASE_MAX_UPLOAD_BYTES = int(os.environ.get("DISEASE_MAX_UPLOAD_BYTES", 10 * 1024 * 1024))
+# Reject images whose header claims more pixels than this (decompression bombs)
+DISEASE_MAX_PIXELS = int(os.environ.get("DISEASE_MAX_PIXELS", 50_000_000))
+INPUT_SIZE = (224, 224)
+
+
+class ImageTooLarge(Exception):
+    pass
+
+
+class InvalidImage(Exception):
+    pass
+
+
+def check_upload_size(content_length, limit=DISEASE_MAX_UPLOAD_BYTES):
+    """Call before touching request.files, so an oversized body is never parsed."""
+    if content_length is not None and content_length > limit:
+        raise ImageTooLarge(f"Upload exceeds the {limit} byte limit")
+
+
+def _stream_size(stream):
+    pos = stream.tell()
+    stream.seek(0, os.SEEK_END)
+    size = stream.tell()
+    stream.seek(pos)
+    return size
+
+
+def load_image(stream, size=INPUT_SIZE, out=None, max_bytes=DISEASE_MAX_UPLOAD_BYTES,
+               max_pixels=DISEASE_MAX_PIXELS):
+    """
+    Decode an uploaded image into a (H, W, 3) float32 array scaled to [0, 1].
+    Pass `out` to fill an existing float32 buffer (e.g. one slot of a batch).
+    """
+    if stream.seekable() and _stream_size(stream) > max_bytes:
+        raise ImageTooLarge(f"Upload exceeds the {max_bytes} byte limit")
+    try:
+        img = Image.open(stream)  # lazy: only the header has been read
+    except Exception:
+        raise InvalidImage("Uploaded file is not a supported image")
+    if img.width * img.height > max_pixels:
+        raise ImageTooLarge(f"Image is {img.width}x{img.height}, over the {max_pixels} pixel limit")
+
+    try:
+        with img:
+            # JPEG: decode at the smallest 1/2, 1/4 or 1/8 scale that still covers `size`
+            img.draft("RGB", size)
+            if img.mode != "RGB":
+                img = img.convert("RGB")
+            # reducing_gap: cheap integer reduce() first for whatever draft() couldn't shrink
+            img = img.resize(size, Image.BICUBIC, reducing_gap=3.0)
+            pixels = np.asarray(img)
+    except (OSError, SyntaxError, ValueError):
+        # Truncated/corrupt data only surfaces here, once pixels are decoded
+        # (UnidentifiedImageError is an OSError; some plugins raise SyntaxError)
+        raise InvalidImage("Uploaded image is truncated or corrupt")
+
+    if out is None:
+        out = np.empty(pixels.shape, dtype=np.float32)
+    np.divide(pixels, np.float32(255.0), out=out)
+    return out
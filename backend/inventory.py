@@ -0,0 +1,182 @@
+# backend/inventory.py
+# Cart reservations on top of versioned stock rows.
+#  - Product.stock is on-hand units, Product.reserved the units held by carts,
+#    Product.stock_version a counter bumped by every change to either
+#  - reserve(): a cart holds units for INVENTORY_HOLD_TTL_S (one StockHold row
+#    per product) and Product.reserved grows in the same transaction, via the
+#    same compare-and-swap UPDATE checkout uses (checkout_engine.reserve_stock).
+#    Re-reserving a cart replaces its previous holds atomically.
+#  - checkout with a cart_id deletes the cart's holds and converts them into a
+#    stock decrement in one statement, so held units can't be sold twice
+#  - set_stock(): absolute stock edits are CAS on stock_version (409 when
+#    someone else changed the row since it was read); adjust_stock() is a
+#    commutative delta for restocks that never conflicts
+#  - a sweeper thread releases expired holds every INVENTORY_SWEEP_INTERVAL_S
+# Nothing locks or reads-then-writes a product row, so hot SKUs (urea in
+# sowing season) see one short UPDATE per cart action and no retry storms.
+import os
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+
+from sqlalchemy import delete, update
+
+import metrics
+from checkout_engine import CheckoutError, parse_lines, requested_quantities, reserve_stock
+
+INVENTORY_HOLD_TTL_S = float(os.environ.get("INVENTORY_HOLD_TTL_S", 600))
+# Seconds between expired-hold sweeps in the app process (0 disables the thread)
+INVENTORY_SWEEP_INTERVAL_S = float(os.environ.get("INVENTORY_SWEEP_INTERVAL_S", 30))
+
+reservations = metrics.counter("inventory.reservations")
+out_of_stock = metrics.counter("inventory.out_of_stock")
+version_conflicts = metrics.counter("inventory.version_conflicts")
+expired_units = metrics.counter("inventory.expired_units_released")
+
+
+def _delete_holds(session, StockHold, *criteria):
+    """Delete matching holds; {product_id: units} of exactly the rows this statement removed."""
+    rows = session.execute(
+        delete(StockHold).where(*criteria).returning(StockHold.product_id, StockHold.qty)
+    ).all()
+    totals = {}
+    for product_id, qty in rows:
+        totals[product_id] = totals.get(product_id, 0) + qty
+    return totals
+
+
+def take_holds(session, StockHold, cart_id, buyer_id=None):
+    """
+    Remove a cart's holds (expired or not) inside the caller's transaction; with buyer_id,
+    only holds that buyer placed, so a cart id alone can't claim someone else's units.
+    """
+    criteria = [StockHold.cart_id == cart_id]
+    if buyer_id is not None:
+        criteria.append(StockHold.buyer_id == buyer_id)
+    return _delete_holds(session, StockHold, *criteria)
+
+
+def reserve(session, Product, StockHold, cart_id, buyer_id, items, ttl_s=INVENTORY_HOLD_TTL_S):
+    """
+    Hold the cart's items until now + ttl_s, replacing whatever the cart held.
+    Raises CheckoutError("out_of_stock") with nothing changed. Returns (cart_id, expires_at).
+    """
+    requested = requested_quantities(parse_lines(items))
+    cart_id = cart_id or str(uuid.uuid4())
+    expires_at = datetime.utcnow() + timedelta(seconds=ttl_s)
+    try:
+        held = take_holds(session, StockHold, cart_id, buyer_id)
+        if not reserve_stock(session, Product, requested, held, hold=True):
+            out_of_stock.inc()
+            raise CheckoutError("out_of_stock")
+        session.execute(StockHold.__table__.insert(), [
+            {"cart_id": cart_id, "buyer_id": buyer_id, "product_id": pid, "qty": qty, "expires_at": expires_at}
+            for pid, qty in requested.items()
+        ])
+        session.commit()
+    except Exception:
+        session.rollback()
+        raise
+    reservations.inc()
+    return cart_id, expires_at
+
+
+def release(session, Product, StockHold, cart_id, buyer_id=None):
+    """Drop a cart's holds (with buyer_id, only that buyer's); returns the number of units released."""
+    return _release(session, Product, lambda s: take_holds(s, StockHold, cart_id, buyer_id))
+
+
+def sweep_expired(session, Product, StockHold, now=None):
+    """Release every hold past its expiry; returns the number of units released."""
+    now = now or datetime.utcnow()
+    released = _release(session, Product, lambda s: _delete_holds(s, StockHold, StockHold.expires_at <= now))
+    expired_units.inc(released)
+    return released
+
+
+def _release(session, Product, take):
+    try:
+        held = take(session)
+        if held:
+            reserve_stock(session, Product, {}, held, hold=True)
+        session.commit()
+    except Exception:
+        session.rollback()
+        raise
+    return sum(held.values())
+
+
+# --- Stock edits ---
+def stock_state(session, Product, product_id):
+    row = session.query(Product.stock, Product.reserved, Product.stock_version).filter(Product.id == product_id).first()
+    if row is None:
+        return None
+    stock, reserved, version = row
+    return {"product_id": product_id, "stock": stock, "reserved": reserved,
+            "available": stock - reserved, "version": version}
+
+
+def _update_stock(session, Product, product_id, new_stock, *criteria):
+    """One conditional UPDATE (never below reserved units); returns (applied, state after)."""
+    try:
+        result = session.execute(
+            update(Product)
+            .where(Product.id == product_id, new_stock >= Product.reserved, *criteria)
+            .values(stock=new_stock, stock_version=Product.stock_version + 1)
+            .execution_options(synchronize_session=False)
+        )
+        session.commit()
+    except Exception:
+        session.rollback()
+        raise
+    state = stock_state(session, Product, product_id)
+    if state is None:
+        raise CheckoutError("not_found")
+    return result.rowcount == 1, state
+
+
+def set_stock(session, Product, product_id, stock, expected_version):
+    """
+    Absolute stock edit, compare-and-swap on stock_version. Raises CheckoutError with
+    "version_conflict" (re-read and retry), "below_reserved" or "not_found".
+    """
+    applied, state = _update_stock(session, Product, product_id, stock, Product.stock_version == expected_version)
+    if not applied:
+        if state["version"] != expected_version:
+            version_conflicts.inc()
+            raise CheckoutError("version_conflict")
+        raise CheckoutError("below_reserved")
+    return state
+
+
+def adjust_stock(session, Product, product_id, delta):
+    """Restock (+) or write off (-) units without a version check, so it never conflicts."""
+    applied, state = _update_stock(session, Product, product_id, Product.stock + delta)
+    if not applied:
+        raise CheckoutError("below_reserved")
+    return state
+
+
+# --- Sweeper ---
+_sweeper_thread = None
+
+
+def start_sweeper_thread(app, db, Product, StockHold, interval_s=INVENTORY_SWEEP_INTERVAL_S):
+    global _sweeper_thread
+    if interval_s <= 0 or (_sweeper_thread is not None and _sweeper_thread.is_alive()):
+        return
+
+    def run():
+        while True:
+            try:
+                with app.app_context():
+                    released = sweep_expired(db.session, Product, StockHold)
+                if released:
+                    print(f"✓ Released {released} units from expired cart holds")
+            except Exception as e:
+                print(f"⚠️ Expired hold sweep failed: {e}")
+            time.sleep(interval_s)
+
+    _sweeper_thread = threading.Thread(target=run, name="inventory-sweeper", daemon=True)
+    _sweeper_thread.start()
@@ -0,0 +1,260 @@
+# backend/invoice_store.py
+# Invoice PDFs rendered off the request path and kept on disk.
+#  - an invoice's content (order, buyer, status, items, totals, template
+#    version) is hashed; the PDF lives at INVOICE_DIR/ab/<sha256>.pdf, so the
+#    digest is both the cache key and the ETag, and any order change (status
+#    update, ...) simply points at a new file
+#  - schedule() renders in a small thread pool right after checkout and status
+#    changes; concurrent requests for the same digest share one render. (A
+#    one-page invoice takes a few ms, so a process pool, which under spawn would
+#    re-import app.py and its models in every worker, isn't worth it.)
+#  - ensure() is the download path: cached file if present, otherwise wait for
+#    (or start) its render
+#  - PDFs are rendered with reportlab's invariant mode, so identical content
+#    always produces identical bytes
+#  - INVOICE_DIR/by-order/<order id> names the order's latest PDF; rendering a
+#    new version deletes the one it supersedes, so the directory doesn't grow
+#    with every status change
+import atexit
+import hashlib
+import importlib.util
+import io
+import json
+import os
+import threading
+import time
+import zipfile
+from concurrent.futures import Future, ThreadPoolExecutor
+
+import metrics
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+INVOICE_DIR = os.environ.get("INVOICE_DIR", os.path.join(HERE, "data", "invoices"))
+# Render threads; 0 renders inline in the calling thread
+INVOICE_WORKERS = int(os.environ.get("INVOICE_WORKERS", min(4, os.cpu_count() or 1)))
+INVOICE_RENDER_TIMEOUT_S = float(os.environ.get("INVOICE_RENDER_TIMEOUT_S", 30))
+# Bump when the layout changes so every invoice is re-rendered
+TEMPLATE_VERSION = 2
+ZIP_CHUNK = 256 * 1024
+AVAILABLE = importlib.util.find_spec("reportlab") is not None
+
+rendered = metrics.counter("invoices.rendered")
+cache_hits = metrics.counter("invoices.cache_hits")
+render_errors = metrics.counter("invoices.render_errors")
+render_ms = metrics.histogram("invoices.render_ms")
+
+_pool = None
+_pool_lock = threading.Lock()
+_inflight = {}  # digest -> Future
+
+
+def payload(order, items):
+    """Everything printed on the invoice, as plain JSON-able values."""
+    return {
+        "order_id": order.id,
+        "buyer_id": order.buyer_id,
+        "status": order.status,
+        "payment_method": order.payment_method,
+        "created_at": order.created_at.strftime("%Y-%m-%d %H:%M") if order.created_at else "",
+        "total": order.total,
+        "items": [{"title": it.title or "", "qty": it.qty, "price": it.price} for it in items],
+    }
+
+
+def digest(data):
+    raw = json.dumps([TEMPLATE_VERSION, data], sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+
+def path_for(key, directory=INVOICE_DIR):
+    return os.path.join(directory, key[:2], f"{key}.pdf")
+
+
+def _pointer_path(order_id, directory):
+    return os.path.join(directory, "by-order", os.path.basename(str(order_id)))
+
+
+def _write_atomic(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(data)
+    os.replace(tmp, path)  # readers never see a partial file
+
+
+def _supersede(order_id, key, directory):
+    """Point the order at its new PDF and delete the one it replaces."""
+    pointer = _pointer_path(order_id, directory)
+    try:
+        with open(pointer) as f:
+            previous = f.read().strip()
+    except FileNotFoundError:
+        previous = None
+    _write_atomic(pointer, key.encode())
+    if previous and previous != key:
+        try:
+            os.remove(path_for(previous, directory))
+        except FileNotFoundError:
+            pass
+
+
+# --- Rendering (runs in the pool) ---
+def render_pdf(data):
+    from reportlab.lib.pagesizes import A4
+    from reportlab.pdfgen import canvas
+
+    buffer = io.BytesIO()
+    c = canvas.Canvas(buffer, pagesize=A4, invariant=1)
+    c.setFont("Helvetica-Bold", 16)
+    c.drawString(40, 800, f"Invoice - Order {data['order_id']}")
+    c.setFont("Helvetica", 11)
+    c.drawString(40, 780, f"Buyer: {data['buyer_id']}")
+    c.drawString(40, 764, f"Date: {data['created_at']}   Status: {data['status']}   Payment: {data['payment_method']}")
+    y = 730
+    c.drawString(40, y, "Item")
+    c.drawString(360, y, "Qty")
+    c.drawString(420, y, "Price")
+    for it in data["items"]:
+        y -= 20
+        if y < 60:
+            c.showPage()
+            c.setFont("Helvetica", 11)
+            y = 800
+        c.drawString(40, y, it["title"][:50])
+        c.drawString(360, y, str(it["qty"]))
+        c.drawString(420, y, f"₹{it['price']}")
+    y -= 30
+    c.drawString(360, y, "Total:")
+    c.drawString(420, y, f"₹{data['total']}")
+    c.showPage()
+    c.save()
+    return buffer.getvalue()
+
+
+def _render_to_disk(data, key, directory):
+    started = time.perf_counter()
+    _write_atomic(path_for(key, directory), render_pdf(data))
+    _supersede(data["order_id"], key, directory)
+    return (time.perf_counter() - started) * 1000
+
+
+# --- Scheduling ---
+def _get_pool():
+    """Thread pool, created on first use; caller holds _pool_lock."""
+    global _pool
+    if _pool is None:
+        _pool = ThreadPoolExecutor(max_workers=INVOICE_WORKERS, thread_name_prefix="invoice-render")
+    return _pool
+
+
+def _finished(key, future):
+    with _pool_lock:
+        _inflight.pop(key, None)
+    try:
+        render_ms.observe(future.result())
+        rendered.inc()
+    except Exception as e:
+        render_errors.inc()
+        print(f"✗ Invoice render failed ({key[:12]}): {e}")
+
+
+def schedule(data):
+    """Start rendering data's invoice unless it's on disk or already rendering. Returns (key, future or None)."""
+    key = digest(data)
+    if os.path.exists(path_for(key)):
+        return key, None
+    with _pool_lock:
+        future = _inflight.get(key)
+        if future is not None:
+            return key, future
+        if INVOICE_WORKERS > 0:
+            future = _get_pool().submit(_render_to_disk, data, key, INVOICE_DIR)
+        else:
+            future = Future()
+        _inflight[key] = future
+    if INVOICE_WORKERS <= 0:
+        try:
+            future.set_result(_render_to_disk(data, key, INVOICE_DIR))
+        except Exception as e:
+            future.set_exception(e)
+    future.add_done_callback(lambda f: _finished(key, f))
+    return key, future
+
+
+def ensure(data, timeout=INVOICE_RENDER_TIMEOUT_S):
+    """Path + digest of data's PDF, rendering it first if needed. Raises the render's exception."""
+    key, future = schedule(data)
+    if future is None:
+        cache_hits.inc()
+    else:
+        future.result(timeout)
+    return path_for(key), key
+
+
+def shutdown():
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+
+
+atexit.register(shutdown)
+
+
+# --- Bulk export ---
+class _Sink:
+    """Write-only, non-seekable file object for zipfile; the generator drains it between entries."""
+
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, b):
+        self.chunks.append(bytes(b))
+        return len(b)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        out, self.chunks = b"".join(self.chunks), []
+        return out
+
+
+def stream_zip(payloads, window=32):
+    """
+    Yield a ZIP of invoice PDFs for an iterable of payloads without holding it in memory.
+    Up to `window` invoices ahead are scheduled at once so missing PDFs render in parallel.
+    PDFs are already compressed, so entries are stored rather than deflated.
+    An invoice that fails to render is left out and listed in an ERRORS.txt entry, so one
+    bad order can't truncate the archive mid-response.
+    """
+    sink = _Sink()
+    pending = []
+    failed = []
+
+    def emit(data, key, future):
+        try:
+            if future is not None:
+                future.result(INVOICE_RENDER_TIMEOUT_S)
+            src = open(path_for(key), "rb")
+        except Exception as e:
+            failed.append(f"{data['order_id']}: {type(e).__name__}: {e}")
+            print(f"✗ Invoice export skipped order {data['order_id']}: {e}")
+            return
+        with src, zf.open(f"invoice_{data['order_id']}.pdf", "w") as dst:
+            while True:
+                chunk = src.read(ZIP_CHUNK)
+                if not chunk:
+                    break
+                dst.write(chunk)
+
+    with zipfile.ZipFile(sink, "w", zipfile.ZIP_STORED) as zf:
+        for data in payloads:
+            pending.append((data, *schedule(data)))
+            if len(pending) >= window:
+                emit(*pending.pop(0))
+                yield sink.drain()
+        for entry in pending:
+            emit(*entry)
+            yield sink.drain()
+        if failed:
+            zf.writestr("ERRORS.txt", "Invoices that could not be rendered:\n" + "\n".join(failed) + "\n")
+    yield sink.drain()
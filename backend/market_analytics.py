@@ -0,0 +1,116 @@
+# backend/market_analytics.py
+# Precomputed market-price analytics over the local market store: per-market
+# and per-state modal/min/max aggregates, a daily modal-price series with
+# rolling 7/30-day averages, and percentiles. Everything is vectorized with
+# pandas; results are cached per (crop, state, period) until the pair is re-synced.
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import pandas as pd
+
+import market_store
+import metrics
+
+MARKET_ANALYTICS_TTL_S = float(os.environ.get("MARKET_ANALYTICS_TTL_S", 900))
+MARKET_ANALYTICS_CACHE_SIZE = int(os.environ.get("MARKET_ANALYTICS_CACHE_SIZE", 512))
+PERCENTILES = (0.1, 0.25, 0.5, 0.75, 0.9)
+ALL_STATES = "All"
+
+_cache = OrderedDict()  # (crop, state, period) -> (result, computed_at, sync_version)
+_lock = threading.Lock()
+hits = metrics.counter("market_analytics.hits")
+misses = metrics.counter("market_analytics.misses")
+compute_ms = metrics.histogram("market_analytics.compute_ms")
+
+
+def load_frame(commodity, state, since):
+    conn = market_store.connect()
+    try:
+        sql = """
+            SELECT state, market, arrival_date, min_price, max_price, modal_price
+            FROM market_prices WHERE commodity = ? AND arrival_date >= ?
+        """
+        params = [commodity, since.isoformat()]
+        if state != ALL_STATES:
+            sql += " AND state = ?"
+            params.append(state)
+        df = pd.read_sql_query(sql, conn, params=params)
+    finally:
+        conn.close()
+    df["arrival_date"] = pd.to_datetime(df["arrival_date"], format="%Y-%m-%d")
+    return df
+
+
+def sync_version(commodity, state):
+    conn = market_store.connect()
+    try:
+        sql = "SELECT MAX(synced_at) FROM market_sync WHERE commodity = ?"
+        params = [commodity]
+        if state != ALL_STATES:
+            sql += " AND state = ?"
+            params.append(state)
+        return conn.execute(sql, params).fetchone()[0]
+    finally:
+        conn.close()
+
+
+def _aggregate(df, by):
+    agg = df.groupby(by).agg(
+        modal_mean=("modal_price", "mean"),
+        modal_median=("modal_price", "median"),
+        min_price=("min_price", "min"),
+        max_price=("max_price", "max"),
+        records=("modal_price", "size"),
+        latest_date=("arrival_date", "max"),
+    ).reset_index()
+    agg["latest_date"] = agg["latest_date"].dt.strftime("%d/%m/%Y")
+    return agg.round(2).to_dict(orient="records")
+
+
+def compute(df):
+    if df.empty:
+        return {"records": 0, "per_market": [], "per_state": [], "daily": [], "percentiles": {}}
+
+    # One modal/min/max point per day, on a continuous calendar so rolling windows are in days
+    daily = df.groupby("arrival_date").agg(
+        modal=("modal_price", "mean"), min=("min_price", "min"), max=("max_price", "max")
+    )
+    daily = daily.reindex(pd.date_range(daily.index.min(), daily.index.max(), freq="D"))
+    daily["rolling_7d"] = daily["modal"].rolling("7D", min_periods=1).mean()
+    daily["rolling_30d"] = daily["modal"].rolling("30D", min_periods=1).mean()
+    daily = daily.round(2).reset_index(names="date")
+    daily["date"] = daily["date"].dt.strftime("%d/%m/%Y")
+    daily = daily.astype(object).where(daily.notna(), None)
+
+    quantiles = df["modal_price"].quantile(list(PERCENTILES))
+    return {
+        "records": int(len(df)),
+        "per_market": _aggregate(df, "market"),
+        "per_state": _aggregate(df, "state"),
+        "daily": daily.to_dict(orient="records"),
+        "percentiles": {f"p{int(q * 100)}": round(float(v), 2) for q, v in quantiles.items()}
+    }
+
+
+def analytics(commodity, state, period, since):
+    key = (commodity, state, period)
+    version = sync_version(commodity, state)
+    with _lock:
+        entry = _cache.get(key)
+        if entry is not None and entry[2] == version and time.monotonic() - entry[1] < MARKET_ANALYTICS_TTL_S:
+            _cache.move_to_end(key)
+            hits.inc()
+            return entry[0]
+    misses.inc()
+
+    started = time.perf_counter()
+    result = compute(load_frame(commodity, state, since))
+    compute_ms.observe((time.perf_counter() - started) * 1000)
+
+    with _lock:
+        _cache[key] = (result, time.monotonic(), version)
+        while len(_cache) > MARKET_ANALYTICS_CACHE_SIZE:
+            _cache.popitem(last=False)
+    return result
@@ -0,0 +1,430 @@
+# backend/market_store.py
+# Local store for data.gov.in mandi prices. A background job pulls
+# commodity/state records into SQLite with arrival_date parsed once (ISO text,
+# indexed), so /market-price answers week/month/year windows from an index
+# instead of downloading 1000 records per request.
+#
+# Sync is incremental: records come newest-first and paging stops once a page
+# reaches the newest arrival_date already stored for that pair. A sync run on
+# request fetches at most MARKET_REQUEST_PAGES pages; if that cuts it short,
+# the pair's remaining history is backfilled by a background thread.
+#
+# Request input is matched case-insensitively against known commodities and
+# states (normalize_pair), so typos can't create pairs. A pair is synced in
+# the background only while it keeps being requested (MARKET_PAIR_IDLE_S);
+# an idle pair is synced again on its next request.
+#
+# One-off / cron sync:  python market_store.py Wheat:Maharashtra Rice:Punjab
+import os
+import sqlite3
+import sys
+import threading
+import time
+from datetime import datetime
+
+import http_gateway
+import metrics
+
+MARKET_DB_PATH = os.environ.get(
+    "MARKET_DB_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "market.db")
+)
+MARKET_API_URL = os.environ.get(
+    "MARKET_API_URL", "https://api.data.gov.in/resource/9ef84268-d588-465a-a308-a864a43d0070"
+)
+MARKET_PAGE_SIZE = int(os.environ.get("MARKET_PAGE_SIZE", 1000))
+MARKET_MAX_PAGES = int(os.environ.get("MARKET_MAX_PAGES", 50))
+# Pages fetched inside a request that finds its pair unsynced; the rest is backfilled in the background
+MARKET_REQUEST_PAGES = int(os.environ.get("MARKET_REQUEST_PAGES", 1))
+MARKET_TIMEOUT_S = float(os.environ.get("MARKET_TIMEOUT_S", 15))
+# Seconds between background syncs of every tracked pair (0 disables the thread)
+MARKET_SYNC_INTERVAL_S = float(os.environ.get("MARKET_SYNC_INTERVAL_S", 6 * 3600))
+# Pairs synced from startup, e.g. "Wheat:Maharashtra,Onion:Maharashtra"
+MARKET_SYNC_PAIRS = os.environ.get("MARKET_SYNC_PAIRS", "Wheat:Maharashtra")
+# Pairs not requested for this long drop out of the background sync
+MARKET_PAIR_IDLE_S = float(os.environ.get("MARKET_PAIR_IDLE_S", 14 * 86400))
+# Extra commodity names accepted from requests, comma separated (data.gov.in spelling)
+MARKET_COMMODITIES = os.environ.get("MARKET_COMMODITIES", "")
+
+# data.gov.in spellings
+STATES = (
+    "Andaman and Nicobar", "Andhra Pradesh", "Arunachal Pradesh", "Assam", "Bihar", "Chandigarh",
+    "Chattisgarh", "Dadra and Nagar Haveli", "Daman and Diu", "Goa", "Gujarat", "Haryana",
+    "Himachal Pradesh", "Jammu and Kashmir", "Jharkhand", "Karnataka", "Kerala", "Ladakh", "Lakshadweep",
+    "Madhya Pradesh", "Maharashtra", "Manipur", "Meghalaya", "Mizoram", "Nagaland", "NCT of Delhi",
+    "Odisha", "Pondicherry", "Punjab", "Rajasthan", "Sikkim", "Tamil Nadu", "Telangana", "Tripura",
+    "Uttar Pradesh", "Uttrakhand", "West Bengal",
+)
+STATE_ALIASES = {
+    "chhattisgarh": "Chattisgarh", "delhi": "NCT of Delhi", "orissa": "Odisha", "puducherry": "Pondicherry",
+    "uttarakhand": "Uttrakhand", "andaman and nicobar islands": "Andaman and Nicobar",
+}
+COMMODITIES = (
+    "Arhar (Tur/Red Gram)(Whole)", "Bajra(Pearl Millet/Cumbu)", "Banana", "Barley (Jau)", "Bengal Gram(Gram)(Whole)",
+    "Bhindi(Ladies Finger)", "Bitter gourd", "Bottle gourd", "Brinjal", "Cabbage", "Carrot", "Castor Seed",
+    "Cauliflower", "Coconut", "Coriander(Leaves)", "Cotton", "Cucumbar(Kheera)", "Garlic", "Ginger(Green)",
+    "Grapes", "Green Chilli", "Green Gram (Moong)(Whole)", "Groundnut", "Guar", "Jowar(Sorghum)", "Jute",
+    "Lemon", "Lentil (Masur)(Whole)", "Maize", "Mango", "Mustard", "Onion", "Orange", "Paddy(Dhan)(Common)",
+    "Papaya", "Peas Wet", "Pomegranate", "Potato", "Pumpkin", "Ragi (Finger Millet)", "Rice", "Soyabean",
+    "Spinach", "Sugarcane", "Sunflower", "Tomato", "Turmeric", "Wheat",
+)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS market_prices (
+    commodity TEXT NOT NULL,
+    state TEXT NOT NULL,
+    district TEXT,
+    market TEXT NOT NULL,
+    variety TEXT NOT NULL DEFAULT '',
+    arrival_date TEXT NOT NULL,
+    min_price REAL,
+    max_price REAL,
+    modal_price REAL,
+    PRIMARY KEY (commodity, state, market, variety, arrival_date)
+);
+CREATE INDEX IF NOT EXISTS idx_market_prices_pair_date
+    ON market_prices (commodity, state, arrival_date);
+CREATE TABLE IF NOT EXISTS market_sync (
+    commodity TEXT NOT NULL,
+    state TEXT NOT NULL,
+    newest_date TEXT,
+    synced_at REAL,
+    requested_at REAL,
+    backfill_offset INTEGER,
+    backfill_until TEXT,
+    PRIMARY KEY (commodity, state)
+);
+"""
+# Columns added to market_sync after it first shipped
+_SYNC_COLUMNS = {"requested_at": "REAL", "backfill_offset": "INTEGER", "backfill_until": "TEXT"}
+# Seconds between requested_at writes for the same pair
+_TOUCH_INTERVAL_S = 300
+
+
+class UnknownPair(ValueError):
+    pass
+
+_init_lock = threading.Lock()
+_initialized = False
+_sync_locks = {}
+_sync_locks_guard = threading.Lock()
+_touched = {}  # (commodity, state) -> last requested_at written
+_backfilling = set()  # pairs with a background backfill thread running
+_backfilling_lock = threading.Lock()
+synced_records = metrics.counter("market_store.synced_records")
+sync_errors = metrics.counter("market_store.sync_errors")
+sync_ms = metrics.histogram("market_store.sync_ms", (100, 500, 1000, 5000, 10000, 30000, 60000, 300000))
+
+
+def connect():
+    global _initialized
+    conn = sqlite3.connect(MARKET_DB_PATH, timeout=10)
+    conn.row_factory = sqlite3.Row
+    if not _initialized:
+        with _init_lock:
+            if not _initialized:
+                os.makedirs(os.path.dirname(MARKET_DB_PATH), exist_ok=True)
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.executescript(SCHEMA)
+                columns = {r["name"] for r in conn.execute("PRAGMA table_info(market_sync)")}
+                for name, kind in _SYNC_COLUMNS.items():
+                    if name not in columns:
+                        conn.execute(f"ALTER TABLE market_sync ADD COLUMN {name} {kind}")
+                conn.commit()
+                _initialized = True
+    return conn
+
+
+def parse_date(value):
+    """'dd/mm/YYYY' -> 'YYYY-MM-DD' (sortable, indexable); None if malformed."""
+    try:
+        return datetime.strptime(value, "%d/%m/%Y").date().isoformat()
+    except (TypeError, ValueError):
+        return None
+
+
+def _float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def upsert_records(conn, commodity, state, records):
+    rows = []
+    for item in records:
+        arrival = parse_date(item.get("arrival_date"))
+        if not arrival or not item.get("market"):
+            continue  # Skip records with badly formatted dates
+        rows.append((
+            commodity, state, item.get("district"), item["market"], item.get("variety") or "", arrival,
+            _float(item.get("min_price")), _float(item.get("max_price")), _float(item.get("modal_price"))
+        ))
+    conn.executemany("""
+        INSERT OR REPLACE INTO market_prices
+        (commodity, state, district, market, variety, arrival_date, min_price, max_price, modal_price)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+    """, rows)
+    return rows
+
+
+def _pair_lock(commodity, state):
+    with _sync_locks_guard:
+        return _sync_locks.setdefault((commodity, state), threading.Lock())
+
+
+def _fetch_page(commodity, state, api_key, offset):
+    res = http_gateway.get_json(MARKET_API_URL, params={
+        "api-key": api_key, "format": "json",
+        "filters[commodity]": commodity, "filters[state]": state,
+        "sort[arrival_date]": "desc",
+        "limit": MARKET_PAGE_SIZE, "offset": offset
+    }, timeout=MARKET_TIMEOUT_S, raise_for_status=True)
+    return res.get("records", [])
+
+
+def sync_pair(commodity, state, api_key, max_pages=MARKET_MAX_PAGES):
+    """
+    Pull records newer than what's stored for (commodity, state), then continue any pending
+    backfill, fetching at most max_pages pages in all. If the new records don't fit, the
+    rest is left as a backfill (offset + the date it runs down to) for the next sync.
+    Returns the number of rows written.
+    """
+    with _pair_lock(commodity, state):
+        started = time.perf_counter()
+        conn = connect()
+        try:
+            row = conn.execute("""
+                SELECT newest_date, backfill_offset, backfill_until FROM market_sync
+                WHERE commodity = ? AND state = ?
+            """, (commodity, state)).fetchone()
+            newest = row["newest_date"] if row else None
+            backfill, until = (row["backfill_offset"], row["backfill_until"]) if row else (None, None)
+            written, newest_seen, pages = 0, newest, 0
+
+            def fetch(offset):
+                nonlocal written, newest_seen, pages
+                records = _fetch_page(commodity, state, api_key, offset)
+                pages += 1
+                rows = upsert_records(conn, commodity, state, records)
+                written += len(rows)
+                dates = [r[5] for r in rows]
+                if dates:
+                    newest_seen = max(newest_seen or dates[0], max(dates))
+                return records, dates
+
+            offset, caught_up = 0, False
+            while pages < max_pages:
+                records, dates = fetch(offset)
+                offset += MARKET_PAGE_SIZE
+                # Same-day records may still arrive late, so re-read the newest stored day
+                if len(records) < MARKET_PAGE_SIZE or (newest and dates and min(dates) < newest):
+                    caught_up = True
+                    break
+            if not caught_up and backfill is None:
+                backfill, until = offset, newest
+
+            while backfill is not None and pages < max_pages:
+                records, dates = fetch(backfill)
+                backfill += MARKET_PAGE_SIZE
+                if (len(records) < MARKET_PAGE_SIZE or backfill >= MARKET_MAX_PAGES * MARKET_PAGE_SIZE
+                        or (until and dates and min(dates) < until)):
+                    backfill, until = None, None
+
+            conn.execute("""
+                INSERT INTO market_sync (commodity, state, newest_date, synced_at, backfill_offset, backfill_until)
+                VALUES (?, ?, ?, ?, ?, ?)
+                ON CONFLICT(commodity, state) DO UPDATE SET
+                    newest_date = excluded.newest_date, synced_at = excluded.synced_at,
+                    backfill_offset = excluded.backfill_offset, backfill_until = excluded.backfill_until
+            """, (commodity, state, newest_seen, time.time(), backfill, until))
+            conn.commit()
+            synced_records.inc(written)
+            return written
+        except Exception:
+            sync_errors.inc()
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+            sync_ms.observe((time.perf_counter() - started) * 1000)
+
+
+def _backfill_in_background(commodity, state, api_key):
+    """Finish a pair's history off the request path (one thread per pair)."""
+    with _backfilling_lock:
+        if (commodity, state) in _backfilling:
+            return
+        _backfilling.add((commodity, state))
+
+    def run():
+        try:
+            n = sync_pair(commodity, state, api_key)
+            print(f"✓ Market backfill {commodity}/{state}: {n} records")
+        except Exception as e:
+            print(f"✗ Market backfill failed for {commodity}/{state}: {e}")
+        finally:
+            with _backfilling_lock:
+                _backfilling.discard((commodity, state))
+
+    threading.Thread(target=run, name="market-backfill", daemon=True).start()
+
+
+def _squash(value):
+    return " ".join(str(value or "").split()).casefold()
+
+
+def _known_commodities():
+    names = list(COMMODITIES) + [c.strip() for c in MARKET_COMMODITIES.split(",") if c.strip()]
+    names += [c for c, _ in _configured_pairs()]
+    return {_squash(c): c for c in names}
+
+
+def normalize_commodity(commodity):
+    """Canonical commodity spelling; raises UnknownPair for names outside the known list."""
+    canonical = _known_commodities().get(_squash(commodity))
+    if canonical is None:
+        raise UnknownPair(f"Unknown commodity: {commodity}")
+    return canonical
+
+
+def normalize_pair(commodity, state):
+    """Canonical (commodity, state) spelling; raises UnknownPair for names outside the known lists."""
+    states = {_squash(s): s for s in STATES}
+    canonical_state = states.get(_squash(state)) or STATE_ALIASES.get(_squash(state))
+    if canonical_state is None:
+        raise UnknownPair(f"Unknown state: {state}")
+    return normalize_commodity(commodity), canonical_state
+
+
+def is_tracked(commodity, state):
+    conn = connect()
+    try:
+        return conn.execute(
+            "SELECT 1 FROM market_sync WHERE commodity = ? AND state = ?", (commodity, state)
+        ).fetchone() is not None
+    finally:
+        conn.close()
+
+
+def _touch(conn, commodity, state, now):
+    """Record that the pair was requested (at most once per _TOUCH_INTERVAL_S) to keep it in the sync."""
+    if now - _touched.get((commodity, state), 0) < _TOUCH_INTERVAL_S:
+        return
+    conn.execute("UPDATE market_sync SET requested_at = ? WHERE commodity = ? AND state = ?", (now, commodity, state))
+    conn.commit()
+    _touched[(commodity, state)] = now
+
+
+def ensure_pair(commodity, state, api_key):
+    """
+    Sync a pair on request when it has never been synced (or dropped out of the background
+    sync while idle); after that the background job keeps it fresh while it's being requested.
+    Only MARKET_REQUEST_PAGES pages are fetched here; older records are backfilled in a
+    background thread. Pass names through normalize_pair first.
+    """
+    now = time.time()
+    conn = connect()
+    try:
+        row = conn.execute(
+            "SELECT synced_at FROM market_sync WHERE commodity = ? AND state = ?", (commodity, state)
+        ).fetchone()
+        # Older than two sync intervals: it dropped out of the background sync while idle
+        stale = row is None or row["synced_at"] is None or (
+            MARKET_SYNC_INTERVAL_S > 0 and now - row["synced_at"] > 2 * MARKET_SYNC_INTERVAL_S
+        )
+        if stale:
+            # Newest page(s) only; a long history would keep the request waiting on upstream
+            sync_pair(commodity, state, api_key, max_pages=MARKET_REQUEST_PAGES)
+            _touched.pop((commodity, state), None)
+            pending = conn.execute(
+                "SELECT backfill_offset FROM market_sync WHERE commodity = ? AND state = ?", (commodity, state)
+            ).fetchone()
+            if pending and pending["backfill_offset"] is not None:
+                _backfill_in_background(commodity, state, api_key)
+        _touch(conn, commodity, state, now)
+    finally:
+        conn.close()
+
+
+def query_prices(commodity, state, since):
+    """Prices on/after `since` (a date), newest first, in the /market-price response shape."""
+    conn = connect()
+    try:
+        rows = conn.execute("""
+            SELECT market, modal_price, min_price, max_price, arrival_date
+            FROM market_prices
+            WHERE commodity = ? AND state = ? AND arrival_date >= ?
+            ORDER BY arrival_date DESC
+        """, (commodity, state, since.isoformat())).fetchall()
+    finally:
+        conn.close()
+    return [
+        {
+            "market": r["market"],
+            "modal_price": r["modal_price"],
+            "min_price": r["min_price"],
+            "max_price": r["max_price"],
+            # Back to the upstream dd/mm/YYYY format the frontend expects
+            "date": f"{r['arrival_date'][8:10]}/{r['arrival_date'][5:7]}/{r['arrival_date'][0:4]}"
+        }
+        for r in rows
+    ]
+
+
+def tracked_pairs():
+    """Pairs requested within MARKET_PAIR_IDLE_S."""
+    conn = connect()
+    try:
+        return [(r["commodity"], r["state"]) for r in conn.execute(
+            "SELECT commodity, state FROM market_sync WHERE requested_at >= ?", (time.time() - MARKET_PAIR_IDLE_S,)
+        )]
+    finally:
+        conn.close()
+
+
+def _configured_pairs():
+    pairs = []
+    for part in MARKET_SYNC_PAIRS.split(","):
+        if ":" in part:
+            commodity, state = part.split(":", 1)
+            pairs.append((commodity.strip(), state.strip()))
+    return pairs
+
+
+def sync_all(api_key):
+    for commodity, state in dict.fromkeys(_configured_pairs() + tracked_pairs()):
+        try:
+            n = sync_pair(commodity, state, api_key)
+            print(f"✓ Market sync {commodity}/{state}: {n} records")
+        except Exception as e:
+            print(f"✗ Market sync failed for {commodity}/{state}: {e}")
+
+
+_sync_thread = None
+
+
+def start_sync_thread(api_key, interval_s=MARKET_SYNC_INTERVAL_S):
+    """Background ingestion loop; a no-op if disabled or already running."""
+    global _sync_thread
+    if interval_s <= 0 or (_sync_thread is not None and _sync_thread.is_alive()):
+        return
+
+    def run():
+        while True:
+            sync_all(api_key)
+            time.sleep(interval_s)
+
+    _sync_thread = threading.Thread(target=run, name="market-sync", daemon=True)
+    _sync_thread.start()
+
+
+if __name__ == "__main__":
+    from dotenv import load_dotenv
+    load_dotenv()
+    key = os.environ.get("MARKET_API_KEY")
+    pairs = [a.split(":", 1) for a in sys.argv[1:] if ":" in a]
+    if pairs:
+        for commodity, state in pairs:
+            print(f"{commodity}/{state}: {sync_pair(commodity, state, key)} records")
+    else:
+        sync_all(key)
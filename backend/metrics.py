@@ -0,0 +1,130 @@
+# backend/metrics.py
+# Tiny in-process metrics registry (counters, gauges, histograms).
+# Everything registered here is exposed as JSON by the /metrics route in app.py.
+import bisect
+import threading
+
+# Default latency buckets in milliseconds
+LATENCY_BUCKETS_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000)
+
+_lock = threading.Lock()
+_registry = {}
+
+
+class Counter:
+    def __init__(self, name):
+        self.name = name
+        self._value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self._lock:
+            self._value += amount
+
+    @property
+    def value(self):
+        return self._value
+
+    def snapshot(self):
+        return {"type": "counter", "value": self._value}
+
+
+class Gauge:
+    """A settable value, or a callback evaluated at snapshot time."""
+
+    def __init__(self, name, fn=None):
+        self.name = name
+        self._value = 0
+        self._fn = fn
+
+    def set(self, value):
+        self._value = value
+
+    @property
+    def value(self):
+        return self._fn() if self._fn is not None else self._value
+
+    def snapshot(self):
+        return {"type": "gauge", "value": self.value}
+
+
+class Histogram:
+    """Fixed-bucket histogram; snapshot also reports bucket-estimated percentiles."""
+
+    def __init__(self, name, buckets=LATENCY_BUCKETS_MS):
+        self.name = name
+        self.buckets = tuple(sorted(buckets))
+        self._counts = [0] * (len(self.buckets) + 1)  # last slot is +Inf
+        self._count = 0
+        self._sum = 0.0
+        self._max = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self._counts[i] += 1
+            self._count += 1
+            self._sum += value
+            if value > self._max:
+                self._max = value
+
+    def percentile(self, q):
+        """Upper bound of the bucket holding the q-th percentile (q in 0..100)."""
+        with self._lock:
+            if self._count == 0:
+                return 0.0
+            target = self._count * q / 100.0
+            seen = 0
+            for i, c in enumerate(self._counts):
+                seen += c
+                if seen >= target:
+                    return float(self.buckets[i]) if i < len(self.buckets) else self._max
+            return self._max
+
+    def snapshot(self):
+        with self._lock:
+            counts = list(self._counts)
+            count, total, peak = self._count, self._sum, self._max
+        return {
+            "type": "histogram",
+            "count": count,
+            "sum": round(total, 3),
+            "mean": round(total / count, 3) if count else 0.0,
+            "max": round(peak, 3),
+            "p50": self.percentile(50),
+            "p95": self.percentile(95),
+            "p99": self.percentile(99),
+            "buckets": {
+                **{str(b): c for b, c in zip(self.buckets, counts)},
+                "+Inf": counts[-1]
+            }
+        }
+
+
+def _get_or_create(name, factory):
+    with _lock:
+        metric = _registry.get(name)
+        if metric is None:
+            metric = factory()
+            _registry[name] = metric
+        return metric
+
+
+def counter(name):
+    return _get_or_create(name, lambda: Counter(name))
+
+
+def gauge(name, fn=None):
+    return _get_or_create(name, lambda: Gauge(name, fn))
+
+
+def histogram(name, buckets=LATENCY_BUCKETS_MS):
+    return _get_or_create(name, lambda: Histogram(name, buckets))
+
+
+def snapshot(prefix=None):
+    """JSON-serializable view of every registered metric (optionally filtered by name prefix)."""
+    with _lock:
+        items = sorted(_registry.items())
+    return {name: m.snapshot() for name, m in items if prefix is None or name.startswith(prefix)}
@@ -0,0 +1,218 @@
+# backend/model_registry.py
+# Lazy, cached model registry. Models are loaded the first time they are used
+# (so workers that only serve /products or /login never import TensorFlow),
+# joblib artifacts can be memory-mapped so forked workers share pages, and a
+# model is hot-reloaded when its file's mtime changes. An alias serves the
+# first of several registered files that exists, decided on every get(), so a
+# file that appears after startup takes over without a restart.
+import os
+import threading
+import time
+
+import metrics
+
+MODEL_DIR = os.environ.get("MODEL_DIR", os.path.dirname(os.path.abspath(__file__)))
+# Seconds between mtime checks for an already-loaded model (0 = check on every get)
+MODEL_RELOAD_CHECK_S = float(os.environ.get("MODEL_RELOAD_CHECK_S", 5))
+# joblib mmap mode for numpy arrays inside pickles ("r", "c" or empty to disable)
+MODEL_MMAP_MODE = os.environ.get("MODEL_MMAP_MODE", "r") or None
+# Seconds before retrying a file that failed to load (doubles per failure, up to 10 min);
+# a new mtime is retried straight away
+MODEL_RETRY_BACKOFF_S = float(os.environ.get("MODEL_RETRY_BACKOFF_S", 30))
+MODEL_RETRY_MAX_S = 600
+
+
+def joblib_loader(mmap_mode=None):
+    def load(path):
+        import joblib
+        return joblib.load(path, mmap_mode=mmap_mode)
+    return load
+
+
+def keras_loader(path):
+    # Imported here so TensorFlow is only pulled in by workers that need it
+    from tensorflow.keras.models import load_model
+    return load_model(path)
+
+
+class _Entry:
+    def __init__(self, name, path, loader):
+        self.name = name
+        self.path = path
+        self.loader = loader
+        self.value = None
+        self.error = None
+        self.mtime = None
+        self.version = 0
+        self.loaded_at = None
+        self.load_ms = None
+        self.checked_at = None
+        self.failures = 0
+        self.failed_mtime = None
+        self.retry_at = None
+        self.lock = threading.Lock()
+
+
+class _Derived:
+    def __init__(self, name, deps, fn):
+        self.name = name
+        self.deps = deps
+        self.fn = fn
+        self.value = None
+        self.dep_versions = None
+        self.lock = threading.Lock()
+
+
+class _Alias:
+    def __init__(self, name, candidates):
+        self.name = name
+        self.candidates = candidates
+
+
+class ModelRegistry:
+    def __init__(self, base_dir=MODEL_DIR, reload_check_s=MODEL_RELOAD_CHECK_S):
+        self.base_dir = base_dir
+        self.reload_check_s = reload_check_s
+        self._entries = {}
+        self._derived = {}
+        self._aliases = {}
+        self.loads = metrics.counter("models.loads")
+        self.load_errors = metrics.counter("models.load_errors")
+
+    def register(self, name, filename, loader=None, mmap_mode=None):
+        """Register a model file. Nothing is read from disk until get(name)."""
+        path = filename if os.path.isabs(filename) else os.path.join(self.base_dir, filename)
+        self._entries[name] = _Entry(name, path, loader or joblib_loader(mmap_mode))
+
+    def register_alias(self, name, candidates):
+        """Serve the first of these registered models whose file exists (checked on every get)."""
+        self._aliases[name] = _Alias(name, list(candidates))
+
+    def resolve(self, name):
+        """The registered model an alias currently points at (name itself for anything else)."""
+        alias = self._aliases.get(name)
+        if alias is None:
+            return name
+        for candidate in alias.candidates:
+            if self._mtime(self._entries[candidate].path) is not None:
+                return candidate
+        return alias.candidates[-1]
+
+    def path(self, name):
+        return self._entries[self.resolve(name)].path
+
+    def register_derived(self, name, deps, fn):
+        """Register a value computed from other models, rebuilt whenever one of them reloads."""
+        self._derived[name] = _Derived(name, list(deps), fn)
+
+    @staticmethod
+    def _mtime(path):
+        try:
+            return os.stat(path).st_mtime_ns
+        except OSError:
+            return None
+
+    def _load(self, entry, mtime):
+        started = time.perf_counter()
+        try:
+            value = entry.loader(entry.path)
+        except Exception as e:
+            # Keep serving the previous version if a reload fails. entry.mtime is left alone
+            # so a transient error (file mid-copy, NFS hiccup) is retried after a backoff.
+            entry.error = str(e)
+            entry.failures += 1
+            entry.failed_mtime = mtime
+            backoff = min(MODEL_RETRY_BACKOFF_S * 2 ** (entry.failures - 1), MODEL_RETRY_MAX_S)
+            entry.retry_at = time.monotonic() + backoff
+            self.load_errors.inc()
+            print(f"✗ Error loading model '{entry.name}' from {entry.path}: {e} (retrying in {backoff:.0f}s)")
+            return
+        entry.value = value
+        entry.error = None
+        entry.failures = 0
+        entry.failed_mtime = entry.retry_at = None
+        entry.mtime = mtime
+        entry.version += 1
+        entry.loaded_at = time.time()
+        entry.load_ms = round((time.perf_counter() - started) * 1000, 1)
+        self.loads.inc()
+        print(f"✓ Loaded model '{entry.name}' (v{entry.version}) in {entry.load_ms} ms")
+
+    def _refresh(self, entry, force=False):
+        now = time.monotonic()
+        if not force and entry.checked_at is not None and now - entry.checked_at < self.reload_check_s:
+            return
+        with entry.lock:
+            if not force and entry.checked_at is not None and now - entry.checked_at < self.reload_check_s:
+                return
+            entry.checked_at = now
+            mtime = self._mtime(entry.path)
+            if force or entry.mtime != mtime or (entry.version == 0 and entry.error is None):
+                if not force and mtime is not None and mtime == entry.failed_mtime and now < entry.retry_at:
+                    return
+                if mtime is None:
+                    if entry.error is None or entry.mtime is not None:
+                        entry.error = f"File not found: {entry.path}"
+                        print(f"✗ Model file for '{entry.name}' not found: {entry.path}")
+                    entry.mtime = None
+                    return
+                self._load(entry, mtime)
+
+    def _version(self, name):
+        if name in self._aliases:
+            target = self.resolve(name)
+            # Switching target counts as a new version, so derived values rebuild
+            return target, self._version(target)
+        if name in self._entries:
+            return self._entries[name].version
+        derived = self._derived[name]
+        return tuple(self._version(d) for d in derived.deps)
+
+    def version(self, name):
+        """Load counter for a model (a tuple for derived values); changes on every (re)load."""
+        return self._version(name)
+
+    def get(self, name):
+        """Return the loaded model (or derived value), loading/reloading as needed. None if unavailable."""
+        name = self.resolve(name)
+        entry = self._entries.get(name)
+        if entry is not None:
+            self._refresh(entry)
+            return entry.value
+
+        derived = self._derived[name]
+        values = [self.get(d) for d in derived.deps]
+        versions = tuple(self._version(d) for d in derived.deps)
+        if derived.dep_versions != versions:
+            with derived.lock:
+                if derived.dep_versions != versions:
+                    derived.value = derived.fn(*values)
+                    derived.dep_versions = versions
+        return derived.value
+
+    def reload(self, name):
+        """Force a reload from disk regardless of mtime."""
+        self._refresh(self._entries[name], force=True)
+        return self._entries[name].value
+
+    def warm_up(self, names=None):
+        """Eagerly load models (e.g. in a gunicorn --preload master before forking workers)."""
+        if names is None:
+            # Alias candidates load through their alias, so a fallback that isn't served stays unloaded
+            candidates = {c for alias in self._aliases.values() for c in alias.candidates}
+            names = [n for n in self._entries if n not in candidates] + list(self._aliases) + list(self._derived)
+        for name in names:
+            self.get(name)
+
+    def status(self):
+        return {
+            name: {
+                "path": e.path,
+                "loaded": e.version > 0,
+                "version": e.version,
+                "loaded_at": e.loaded_at,
+                "load_ms": e.load_ms,
+                "error": e.error
+            }
+            for name, e in self._entries.items()
+        }
@@ -0,0 +1,164 @@
+# backend/news_feed.py
+# Agriculture headlines for the home screen, served from a local store.
+# A background thread polls NewsAPI every NEWS_REFRESH_INTERVAL_S and keeps the
+# normalized article list in memory and in data/news.json (so a restart comes
+# up warm). /news never calls upstream: a failed or over-quota refresh just
+# leaves the previous articles in place.
+import hashlib
+import json
+import os
+import threading
+import time
+from datetime import datetime, timezone
+
+import http_gateway
+import metrics
+
+NEWS_API_URL = os.environ.get("NEWS_API_URL", "https://newsapi.org/v2/top-headlines")
+NEWS_API_KEY = os.environ.get("NEWS_API_KEY", "adb519ca1f444d55a6fd04db744865a9")
+NEWS_COUNTRY = os.environ.get("NEWS_COUNTRY", "in")
+NEWS_QUERY = os.environ.get("NEWS_QUERY", "agriculture")
+NEWS_TIMEOUT_S = float(os.environ.get("NEWS_TIMEOUT_S", 5))
+# Seconds between upstream polls (0 disables the thread)
+NEWS_REFRESH_INTERVAL_S = float(os.environ.get("NEWS_REFRESH_INTERVAL_S", 900))
+# Largest page search() will slice
+NEWS_MAX_PER_PAGE = 100
+NEWS_CACHE_PATH = os.environ.get(
+    "NEWS_CACHE_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "news.json")
+)
+
+refreshes = metrics.counter("news_feed.refreshes")
+refresh_errors = metrics.counter("news_feed.refresh_errors")
+
+
+class NewsStore:
+    def __init__(self, path=NEWS_CACHE_PATH):
+        self.path = path
+        self.articles = []
+        self.version = None        # sha1 of the article list, used for ETags
+        self.modified_at = None    # when the article list last changed (Last-Modified)
+        self.checked_at = None     # last successful upstream poll
+        self._lock = threading.Lock()
+        metrics.gauge("news_feed.articles", fn=lambda: len(self.articles))
+        metrics.gauge("news_feed.age_s", fn=lambda: round(time.time() - self.checked_at.timestamp())
+                      if self.checked_at else None)
+
+    def load(self):
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                data = json.load(f)
+            self._set(data["articles"], datetime.fromisoformat(data["modified_at"]),
+                      datetime.fromisoformat(data["checked_at"]))
+            print(f"✓ Loaded {len(self.articles)} cached news articles")
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            print(f"⚠️ Ignoring unreadable news cache {self.path}: {e}")
+
+    def _set(self, articles, modified_at, checked_at):
+        version = hashlib.sha1(json.dumps(articles, sort_keys=True).encode()).hexdigest()
+        with self._lock:
+            self.articles, self.version = articles, version
+            self.modified_at, self.checked_at = modified_at, checked_at
+
+    def _save(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp = f"{self.path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"articles": self.articles, "modified_at": self.modified_at.isoformat(),
+                       "checked_at": self.checked_at.isoformat()}, f)
+        os.replace(tmp, self.path)
+
+    def update(self, articles):
+        now = datetime.now(timezone.utc).replace(microsecond=0)
+        version = hashlib.sha1(json.dumps(articles, sort_keys=True).encode()).hexdigest()
+        # Unchanged feed keeps its Last-Modified so clients keep getting 304s
+        modified_at = self.modified_at if version == self.version else now
+        self._set(articles, modified_at, now)
+        self._save()
+
+    def snapshot(self):
+        with self._lock:
+            return self.articles, self.version, self.modified_at
+
+
+store = NewsStore()
+
+
+def normalize(payload):
+    """NewsAPI response -> [{title, description, link, source, published_at}], deduplicated by link."""
+    seen, articles = set(), []
+    for art in payload.get("articles", []):
+        link = art.get("url")
+        if not art.get("title") or link in seen:
+            continue
+        seen.add(link)
+        articles.append({
+            "title": art.get("title"),
+            "description": art.get("description"),
+            "link": link,
+            "source": (art.get("source") or {}).get("name"),
+            "published_at": art.get("publishedAt"),
+        })
+    return articles
+
+
+def refresh():
+    """Poll upstream once; on any failure the stored articles stay as they are."""
+    try:
+        payload = http_gateway.get_json(NEWS_API_URL, params={
+            "country": NEWS_COUNTRY, "q": NEWS_QUERY, "apiKey": NEWS_API_KEY
+        }, timeout=NEWS_TIMEOUT_S)
+        if payload.get("status") not in (None, "ok"):
+            # e.g. rateLimited / apiKeyInvalid come back as a JSON error body
+            raise http_gateway.UpstreamError(f"{payload.get('code')}: {payload.get('message')}")
+        store.update(normalize(payload))
+        refreshes.inc()
+        return True
+    except Exception as e:
+        refresh_errors.inc()
+        print(f"⚠️ News refresh failed: {e}")
+        return False
+
+
+def search(q=None, page=1, per_page=None):
+    """(articles for the page, total matches, version, modified_at) from the stored feed."""
+    articles, version, modified_at = store.snapshot()
+    terms = q.lower().split() if q else []
+    if terms:
+        articles = [
+            a for a in articles
+            if all(t in f"{a['title'] or ''} {a['description'] or ''}".lower() for t in terms)
+        ]
+    total = len(articles)
+    if per_page is not None:
+        # page=0 or a negative size would otherwise slice from the end of the list
+        page = max(page or 1, 1)
+        per_page = min(max(per_page, 1), NEWS_MAX_PER_PAGE)
+        articles = articles[(page - 1) * per_page:page * per_page]
+    return articles, total, version, modified_at
+
+
+_refresh_thread = None
+
+
+def start_refresh_thread(interval_s=NEWS_REFRESH_INTERVAL_S):
+    global _refresh_thread
+    if interval_s <= 0 or (_refresh_thread is not None and _refresh_thread.is_alive()):
+        return
+
+    def run():
+        # Warm from disk first; only poll straight away if that copy is already due
+        if store.checked_at is not None:
+            due = store.checked_at.timestamp() + interval_s - time.time()
+            if due > 0:
+                time.sleep(due)
+        while True:
+            refresh()
+            time.sleep(interval_s)
+
+    _refresh_thread = threading.Thread(target=run, name="news-refresh", daemon=True)
+    _refresh_thread.start()
+
+
+store.load()
@@ -0,0 +1,160 @@
+# backend/order_history.py
+# Set-based order-history loading: one query for a page of orders, one
+# IN (...) query for all of their items, grouped in memory. Pages are keyset
+# paginated on (created_at, id) so deep pages cost the same as the first one.
+# Orders without a created_at (rows inserted before the column had a default)
+# sort after all dated ones, as NULLs do in DESC order on MySQL and SQLite, and
+# are paged by id alone.
+import base64
+from collections import defaultdict
+from datetime import datetime
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+# Orders per round trip when streaming a full history
+STREAM_PAGE_SIZE = 500
+# Max ids per IN (...) clause
+IN_CHUNK = 1000
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(created_at, order_id):
+    raw = f"{created_at.isoformat() if created_at else ''}|{order_id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(cursor):
+    """Return (created_at or None, order_id) from an opaque page cursor; raises InvalidCursor if it is malformed."""
+    try:
+        created_at, order_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|", 1)
+        return (datetime.fromisoformat(created_at) if created_at else None), order_id
+    except (ValueError, UnicodeDecodeError) as e:
+        raise InvalidCursor(f"malformed cursor: {cursor!r}") from e
+
+
+def page_size(value):
+    if value is None:
+        return None
+    return max(1, min(int(value), MAX_PAGE_SIZE))
+
+
+def _chunks(seq, size):
+    for i in range(0, len(seq), size):
+        yield seq[i:i + size]
+
+
+# ----------------------------------------------------
+# --- MySQL (app.py) ---
+# ----------------------------------------------------
+def load_orders_mysql(conn, buyer_id, limit=None, cursor=None):
+    """
+    Orders for a buyer, newest first, each with its "items" list.
+    Returns (orders, next_cursor); next_cursor is None on the last page.
+    """
+    c = conn.cursor(dictionary=True)
+    sql = "SELECT * FROM orders WHERE buyer_id = %s"
+    params = [buyer_id]
+    after = decode_cursor(cursor) if cursor else None
+    if after and after[0] is None:
+        sql += " AND created_at IS NULL AND id < %s"
+        params.append(after[1])
+    elif after:
+        sql += " AND (created_at < %s OR (created_at = %s AND id < %s) OR created_at IS NULL)"
+        params += [after[0], after[0], after[1]]
+    sql += " ORDER BY created_at DESC, id DESC"
+    if limit:
+        sql += " LIMIT %s"
+        params.append(limit + 1)
+    c.execute(sql, params)
+    orders = c.fetchall()
+
+    next_cursor = None
+    if limit and len(orders) > limit:
+        orders = orders[:limit]
+        last = orders[-1]
+        next_cursor = encode_cursor(last.get("created_at"), last["id"])
+
+    items = defaultdict(list)
+    ids = [o["id"] for o in orders]
+    for chunk in _chunks(ids, IN_CHUNK):
+        placeholders = ", ".join(["%s"] * len(chunk))
+        c.execute(f"""
+            SELECT oi.order_id, oi.id, oi.quantity, oi.price, p.name as product_name, p.id as product_id
+            FROM order_items oi
+            JOIN products p ON oi.product_id = p.id
+            WHERE oi.order_id IN ({placeholders})
+            ORDER BY oi.id
+        """, chunk)
+        for row in c.fetchall():
+            items[row.pop("order_id")].append(row)
+
+    for o in orders:
+        o["items"] = items.get(o["id"], [])
+    c.close()
+    return orders, next_cursor
+
+
+# ----------------------------------------------------
+# --- SQLAlchemy (ecommerce.py) ---
+# ----------------------------------------------------
+def load_orders_sqlalchemy(session, Order, OrderItem, buyer_id=None, limit=None, cursor=None,
+                           since=None, until=None):
+    """
+    Same as load_orders_mysql for the blueprint models; returns ([(order, [items])], next_cursor).
+    since/until optionally restrict created_at to [since, until).
+    """
+    from sqlalchemy import and_, or_
+
+    query = session.query(Order)
+    if buyer_id:
+        query = query.filter(Order.buyer_id == buyer_id)
+    if since is not None:
+        query = query.filter(Order.created_at >= since)
+    if until is not None:
+        query = query.filter(Order.created_at < until)
+    after = decode_cursor(cursor) if cursor else None
+    if after and after[0] is None:
+        query = query.filter(Order.created_at.is_(None), Order.id < after[1])
+    elif after:
+        query = query.filter(or_(
+            Order.created_at < after[0],
+            and_(Order.created_at == after[0], Order.id < after[1]),
+            Order.created_at.is_(None)
+        ))
+    query = query.order_by(Order.created_at.desc(), Order.id.desc())
+    if limit:
+        query = query.limit(limit + 1)
+    orders = query.all()
+
+    next_cursor = None
+    if limit and len(orders) > limit:
+        orders = orders[:limit]
+        next_cursor = encode_cursor(orders[-1].created_at, orders[-1].id)
+
+    items = defaultdict(list)
+    ids = [o.id for o in orders]
+    for chunk in _chunks(ids, IN_CHUNK):
+        for it in session.query(OrderItem).filter(OrderItem.order_id.in_(chunk)).order_by(OrderItem.id):
+            items[it.order_id].append(it)
+
+    return [(o, items.get(o.id, [])) for o in orders], next_cursor
+
+
+def iter_pages(load_page, page_size=STREAM_PAGE_SIZE):
+    """
+    Yield every order across keyset pages; load_page(limit, cursor) -> (orders, next_cursor).
+    Stops if a page's cursor doesn't move past the previous one, so a bad loader can't loop forever.
+    """
+    cursor = None
+    while True:
+        orders, next_cursor = load_page(page_size, cursor)
+        yield from orders
+        if not next_cursor:
+            return
+        if next_cursor == cursor:
+            print(f"⚠️ Order pagination stalled at cursor {cursor}; stopping")
+            return
+        cursor = next_cursor
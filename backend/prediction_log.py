@@ -0,0 +1,240 @@
+# backend/prediction_log.py
+# History of every crop / disease prediction (inputs, outputs, model version,
+# latency) in data/predictions.db.
+#  - record() only appends to a bounded in-memory buffer; the request path
+#    never touches disk. When the buffer is full new records are dropped
+#    (counted in /metrics, warned about at most every 30 s) instead of
+#    slowing requests down.
+#  - one background writer drains the buffer in batches: a single
+#    executemany() per transaction, in WAL mode so readers never block it
+#  - flush() waits for everything queued so far to be written (used at exit)
+#
+# Recent entries:  python prediction_log.py --tail 20 --kind crop
+import argparse
+import atexit
+import collections
+import json
+import os
+import sqlite3
+import threading
+import time
+
+import numpy as np
+
+import metrics
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+PREDICTION_LOG_DB = os.environ.get("PREDICTION_LOG_DB", os.path.join(HERE, "data", "predictions.db"))
+# Records held in memory waiting for the writer; beyond this they're dropped
+PREDICTION_LOG_MAX_PENDING = int(os.environ.get("PREDICTION_LOG_MAX_PENDING", 50000))
+PREDICTION_LOG_BATCH_SIZE = int(os.environ.get("PREDICTION_LOG_BATCH_SIZE", 500))
+# Longest a record waits in memory when traffic is too low to fill a batch
+PREDICTION_LOG_FLUSH_INTERVAL_S = float(os.environ.get("PREDICTION_LOG_FLUSH_INTERVAL_S", 1.0))
+WRITE_RETRIES = 3
+DROP_WARNING_INTERVAL_S = 30
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS prediction_log (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    created_at REAL NOT NULL,
+    kind TEXT NOT NULL,
+    model_version TEXT,
+    latency_ms REAL,
+    inputs TEXT,
+    outputs TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_prediction_log_kind_created ON prediction_log (kind, created_at);
+"""
+INSERT = ("INSERT INTO prediction_log (created_at, kind, model_version, latency_ms, inputs, outputs) "
+          "VALUES (?, ?, ?, ?, ?, ?)")
+
+BATCH_SIZE_BUCKETS = (1, 10, 50, 100, 250, 500, 1000, 5000)
+
+
+def _jsonable(value):
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if isinstance(value, bytes):
+        return value.hex()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+def connect(path=PREDICTION_LOG_DB):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    conn = sqlite3.connect(path, timeout=10, check_same_thread=False)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")  # durable at checkpoints; a crash loses at most the last batches
+    conn.executescript(SCHEMA)
+    return conn
+
+
+class PredictionLog:
+    def __init__(self, path=PREDICTION_LOG_DB, max_pending=PREDICTION_LOG_MAX_PENDING,
+                 batch_size=PREDICTION_LOG_BATCH_SIZE, flush_interval_s=PREDICTION_LOG_FLUSH_INTERVAL_S,
+                 name="prediction_log"):
+        self.path = path
+        self.max_pending = max(1, int(max_pending))
+        self.batch_size = max(1, int(batch_size))
+        self.flush_interval_s = flush_interval_s
+        self.name = name
+        self._pending = collections.deque()
+        self._cond = threading.Condition()
+        self._writing = 0
+        self._flushing = 0
+        self._thread = None
+        self._last_drop_warning = 0.0
+
+        self.enqueued = metrics.counter(f"{name}.enqueued")
+        self.dropped = metrics.counter(f"{name}.dropped")
+        self.written = metrics.counter(f"{name}.written")
+        self.write_errors = metrics.counter(f"{name}.write_errors")
+        self.batch_size_hist = metrics.histogram(f"{name}.batch_size", BATCH_SIZE_BUCKETS)
+        self.write_ms = metrics.histogram(f"{name}.write_ms")
+        metrics.gauge(f"{name}.pending", fn=lambda: len(self._pending))
+
+    def _ensure_writer(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._cond:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+                self._thread.start()
+
+    # --- Request side ---
+    def record(self, kind, inputs, outputs, model_version=None, latency_ms=None):
+        """Queue one prediction. Returns False if it was dropped because the buffer is full."""
+        return self.record_many(kind, [(inputs, outputs)], model_version, latency_ms) == 1
+
+    def record_many(self, kind, rows, model_version=None, latency_ms=None):
+        """Queue (inputs, outputs) pairs sharing one kind/version/latency; returns how many were kept."""
+        now = time.time()
+        model_version = None if model_version is None else str(model_version)
+        with self._cond:
+            room = self.max_pending - len(self._pending)
+            kept = rows[:max(0, room)]
+            self._pending.extend((now, kind, model_version, latency_ms, inputs, outputs) for inputs, outputs in kept)
+            if len(self._pending) >= self.batch_size:
+                self._cond.notify_all()
+        self.enqueued.inc(len(kept))
+        if len(kept) < len(rows):
+            self._drop(len(rows) - len(kept))
+        self._ensure_writer()
+        return len(kept)
+
+    def _drop(self, n):
+        self.dropped.inc(n)
+        now = time.monotonic()
+        if now - self._last_drop_warning > DROP_WARNING_INTERVAL_S:
+            self._last_drop_warning = now
+            print(f"⚠️ Prediction log buffer full ({self.max_pending} pending); "
+                  f"dropping records ({self.dropped.value} so far)")
+
+    def flush(self, timeout=None):
+        """Block until everything queued before this call is written. False on timeout."""
+        if self._thread is None:
+            return True
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            self._flushing += 1
+            self._cond.notify_all()
+            try:
+                while self._pending or self._writing:
+                    remaining = None if deadline is None else deadline - time.monotonic()
+                    if remaining is not None and remaining <= 0:
+                        return False
+                    self._cond.wait(remaining)
+            finally:
+                self._flushing -= 1
+        return True
+
+    # --- Writer thread ---
+    def _take_batch(self):
+        with self._cond:
+            self._cond.wait_for(lambda: len(self._pending) >= self.batch_size or self._flushing,
+                                self.flush_interval_s)
+            n = min(len(self._pending), self.batch_size)
+            batch = [self._pending.popleft() for _ in range(n)]
+            self._writing = n
+            return batch
+
+    def _write(self, conn, batch):
+        rows = [
+            (ts, kind, version, latency_ms,
+             json.dumps(inputs, default=_jsonable), json.dumps(outputs, default=_jsonable))
+            for ts, kind, version, latency_ms, inputs, outputs in batch
+        ]
+        for attempt in range(WRITE_RETRIES):
+            try:
+                started = time.perf_counter()
+                with conn:
+                    conn.executemany(INSERT, rows)
+                self.write_ms.observe((time.perf_counter() - started) * 1000)
+                self.batch_size_hist.observe(len(rows))
+                self.written.inc(len(rows))
+                return
+            except sqlite3.OperationalError as e:
+                # Usually "database is locked" from another worker's checkpoint; back off and retry
+                error = e
+                time.sleep(0.05 * 2 ** attempt)
+        self.write_errors.inc()
+        self.dropped.inc(len(rows))
+        print(f"✗ Prediction log write failed, {len(rows)} records lost: {error}")
+
+    def _run(self):
+        conn = None
+        while True:
+            batch = self._take_batch()
+            try:
+                if batch:
+                    if conn is None:
+                        conn = connect(self.path)
+                    self._write(conn, batch)
+            except Exception as e:
+                self.write_errors.inc()
+                self.dropped.inc(len(batch))
+                print(f"✗ Prediction log writer error, {len(batch)} records lost: {e}")
+                conn = None
+            finally:
+                with self._cond:
+                    self._writing = 0
+                    self._cond.notify_all()
+
+
+# --- Default instance ---
+_log = PredictionLog()
+record = _log.record
+record_many = _log.record_many
+flush = _log.flush
+atexit.register(flush, 5)
+
+
+def recent(limit=50, kind=None, path=PREDICTION_LOG_DB):
+    """Newest logged predictions first, with inputs/outputs decoded."""
+    conn = connect(path)
+    try:
+        sql = "SELECT created_at, kind, model_version, latency_ms, inputs, outputs FROM prediction_log"
+        params = []
+        if kind:
+            sql += " WHERE kind = ?"
+            params.append(kind)
+        sql += " ORDER BY id DESC LIMIT ?"
+        params.append(limit)
+        return [
+            {"created_at": ts, "kind": k, "model_version": v, "latency_ms": ms,
+             "inputs": json.loads(i), "outputs": json.loads(o)}
+            for ts, k, v, ms, i, o in conn.execute(sql, params)
+        ]
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Show recent logged predictions")
+    parser.add_argument("--tail", type=int, default=20)
+    parser.add_argument("--kind", default=None, help="crop, crop_batch, crop_advice or disease")
+    parser.add_argument("--db", default=PREDICTION_LOG_DB)
+    args = parser.parse_args()
+    for entry in reversed(recent(args.tail, args.kind, args.db)):
+        print(json.dumps(entry))
@@ -0,0 +1,316 @@
+# backend/product_search.py
+# Product search for the e-commerce blueprint.
+#  - Ranked full-text search: an SQLite FTS5 index over product title and
+#    description in ecom.db, kept in sync by SQLAlchemy mapper events on Product.
+#  - Autosuggest: an in-memory prefix index (a trie flattened into a sorted
+#    vocabulary + posting arrays, so it stays compact for hundreds of thousands
+#    of SKUs). When a write in any process bumps the index generation, a
+#    replacement is built in a background thread and swapped in; requests
+#    keep using the previous index meanwhile.
+#  - Typo tolerance for romanized Hindi/Marathi: every word is also indexed
+#    under a phonetic key, so "khaad"/"khad" or "beej"/"bij" match each other.
+import bisect
+import os
+import re
+import threading
+import time
+from array import array
+
+from sqlalchemy import event, inspect, text
+
+import metrics
+
+SEARCH_GENERATION_CHECK_S = float(os.environ.get("SEARCH_GENERATION_CHECK_S", 2))
+# Cap on products collected for one prefix before ranking (keeps "a" cheap)
+SUGGEST_MAX_CANDIDATES = 5000
+
+_PHONETIC_RULES = (
+    ("aa", "a"), ("ee", "i"), ("ii", "i"), ("oo", "u"), ("uu", "u"), ("ou", "u"),
+    ("ph", "f"), ("sh", "s"), ("kh", "k"), ("gh", "g"), ("th", "t"), ("dh", "d"),
+    ("bh", "b"), ("ch", "c"), ("jh", "j"), ("w", "v"), ("z", "j"), ("q", "k"),
+)
+
+search_ms = metrics.histogram("product_search.search_ms")
+suggest_ms = metrics.histogram("product_search.suggest_ms")
+index_rebuilds = metrics.counter("product_search.index_rebuilds")
+
+_enabled = False
+
+
+def words(value):
+    # Split on anything that isn't a letter/digit but keep Devanagari vowel signs attached
+    return [w for w in re.split(r"[\s\-_/,.;:()\[\]{}\"'+&|!?*]+", (value or "").lower()) if w]
+
+
+def phonetic(word):
+    """Collapse common romanization variants; non-ASCII (e.g. Devanagari) words are returned as-is."""
+    if not word.isascii():
+        return word
+    w = re.sub(r"[^a-z0-9]", "", word.lower())
+    for a, b in _PHONETIC_RULES:
+        w = w.replace(a, b)
+    w = re.sub(r"(.)\1+", r"\1", w)
+    # Trailing schwa: "khada" ~ "khad"
+    if len(w) > 3 and w.endswith("a"):
+        w = w[:-1]
+    return w
+
+
+def phonetic_text(*values):
+    keys = []
+    for value in values:
+        for w in words(value):
+            p = phonetic(w)
+            if p != w:
+                keys.append(p)
+    return " ".join(keys)
+
+
+def enabled():
+    return _enabled
+
+
+# ----------------------------------------------------
+# --- FTS5 index (ecom.db) ---
+# ----------------------------------------------------
+def _index_product(conn, product_id, title, description):
+    conn.execute(text("DELETE FROM product_search WHERE product_id = :id"), {"id": product_id})
+    conn.execute(text("""
+        INSERT INTO product_search (product_id, title, description, phonetic)
+        VALUES (:id, :title, :description, :phonetic)
+    """), {"id": product_id, "title": title or "", "description": description or "",
+           "phonetic": phonetic_text(title, description)})
+
+
+def _bump_generation(conn):
+    conn.execute(text("UPDATE search_meta SET generation = generation + 1"))
+
+
+def init_search(db, Product):
+    """Create the FTS table (SQLite only), backfill it if out of step, and hook Product writes."""
+    global _enabled
+    if db.engine.dialect.name != "sqlite":
+        return
+    try:
+        with db.engine.begin() as conn:
+            conn.execute(text("""
+                CREATE VIRTUAL TABLE IF NOT EXISTS product_search USING fts5(
+                    product_id UNINDEXED, title, description, phonetic,
+                    tokenize = 'unicode61 remove_diacritics 2'
+                )
+            """))
+            conn.execute(text("CREATE TABLE IF NOT EXISTS search_meta (generation INTEGER NOT NULL)"))
+            if conn.execute(text("SELECT COUNT(*) FROM search_meta")).scalar() == 0:
+                conn.execute(text("INSERT INTO search_meta (generation) VALUES (0)"))
+            indexed = conn.execute(text("SELECT COUNT(*) FROM product_search")).scalar()
+            total = conn.execute(text(f"SELECT COUNT(*) FROM {Product.__tablename__}")).scalar()
+            if indexed != total:
+                rebuild(conn, Product)
+    except Exception as e:
+        # FTS5 missing from this SQLite build: fall back to LIKE queries
+        print(f"⚠️ Product search index unavailable: {e}")
+        return
+
+    if not _enabled:
+        @event.listens_for(Product, "after_insert")
+        def _on_insert(mapper, connection, target):
+            _index_product(connection, target.id, target.title, target.description)
+            _bump_generation(connection)
+
+        @event.listens_for(Product, "after_update")
+        def _on_update(mapper, connection, target):
+            state = inspect(target)
+            # Stock/price updates don't touch the index
+            if state.attrs.title.history.has_changes() or state.attrs.description.history.has_changes():
+                _index_product(connection, target.id, target.title, target.description)
+                _bump_generation(connection)
+
+        @event.listens_for(Product, "after_delete")
+        def _on_delete(mapper, connection, target):
+            connection.execute(text("DELETE FROM product_search WHERE product_id = :id"), {"id": target.id})
+            _bump_generation(connection)
+
+    _enabled = True
+
+
+def rebuild(conn, Product):
+    table = Product.__tablename__
+    conn.execute(text("DELETE FROM product_search"))
+    rows = conn.execute(text(f"SELECT id, title, description FROM {table}")).fetchall()
+    if rows:
+        conn.execute(text("""
+            INSERT INTO product_search (product_id, title, description, phonetic)
+            VALUES (:id, :title, :description, :phonetic)
+        """), [{"id": r[0], "title": r[1] or "", "description": r[2] or "",
+                "phonetic": phonetic_text(r[1], r[2])} for r in rows])
+    _bump_generation(conn)
+    print(f"✓ Product search index rebuilt ({len(rows)} products)")
+
+
+def _match_expression(q):
+    """
+    FTS5 query: every token must match title/description (prefix) or its phonetic key.
+    Only keys that differ from their word are indexed, so the query's key is matched
+    against title/description as well ("beej" -> "bij" finds "Bij packet").
+    """
+    clauses = []
+    for w in words(q):
+        token = w.replace('"', "")
+        if not token:
+            continue
+        alternatives = [f'{{title description}} : "{token}"*']
+        p = phonetic(token)
+        if p:
+            alternatives.append(f'phonetic : "{p}"*')
+        if p and p != token:
+            alternatives.append(f'{{title description}} : "{p}"*')
+        clauses.append("(" + " OR ".join(alternatives) + ")")
+    return " AND ".join(clauses)
+
+
+def search(session, q, page, per_page):
+    """Ranked product ids for a page of results plus the total number of matches (one query unless past the end)."""
+    match = _match_expression(q)
+    if not match:
+        return [], 0
+    started = time.perf_counter()
+    rows = session.execute(text("""
+        SELECT product_id, COUNT(*) OVER () AS total
+        FROM (
+            SELECT product_id, bm25(product_search, 0.0, 10.0, 1.0, 2.0) AS score
+            FROM product_search
+            WHERE product_search MATCH :match
+        )
+        ORDER BY score
+        LIMIT :limit OFFSET :offset
+    """), {"match": match, "limit": per_page, "offset": (page - 1) * per_page}).fetchall()
+    if rows:
+        total = rows[0][1]
+    elif page > 1:
+        # Past the last page the window count has no row to ride on
+        total = session.execute(text("SELECT COUNT(*) FROM product_search WHERE product_search MATCH :match"),
+                                {"match": match}).scalar()
+    else:
+        total = 0
+    search_ms.observe((time.perf_counter() - started) * 1000)
+    return [r[0] for r in rows], total
+
+
+# ----------------------------------------------------
+# --- In-memory prefix index for autosuggest ---
+# ----------------------------------------------------
+class PrefixIndex:
+    def __init__(self, rows):
+        self.ids = []
+        self.titles = []
+        postings = {}
+        for i, (product_id, title) in enumerate(rows):
+            self.ids.append(product_id)
+            self.titles.append(title)
+            for w in set(words(title)):
+                for key in {w, phonetic(w)}:
+                    if key:
+                        postings.setdefault(key, array("i")).append(i)
+        self.vocab = sorted(postings)
+        self.postings = [postings[k] for k in self.vocab]
+
+    def _prefix(self, prefix):
+        out = set()
+        lo = bisect.bisect_left(self.vocab, prefix)
+        for j in range(lo, len(self.vocab)):
+            if not self.vocab[j].startswith(prefix):
+                break
+            out.update(self.postings[j])
+            if len(out) >= SUGGEST_MAX_CANDIDATES:
+                break
+        return out
+
+    def _exact(self, word):
+        j = bisect.bisect_left(self.vocab, word)
+        return set(self.postings[j]) if j < len(self.vocab) and self.vocab[j] == word else set()
+
+    def suggest(self, q, limit=10):
+        tokens = words(q)
+        if not tokens:
+            return []
+        *head, last = tokens
+        candidates = self._prefix(last) | self._prefix(phonetic(last))
+        for w in head:
+            candidates &= self._exact(w) | self._exact(phonetic(w))
+            if not candidates:
+                return []
+        q_lower = q.strip().lower()
+        ranked = sorted(
+            candidates,
+            key=lambda i: (not self.titles[i].lower().startswith(q_lower), len(self.titles[i]), self.titles[i])
+        )
+        return [{"id": self.ids[i], "title": self.titles[i]} for i in ranked[:limit]]
+
+
+_prefix_index = None
+_prefix_generation = None
+_prefix_checked_at = 0.0
+_prefix_rebuilding = False
+_prefix_lock = threading.Lock()
+
+
+def _build_prefix_index(bind, table):
+    with bind.connect() as conn:
+        rows = conn.execute(text(f"SELECT id, title FROM {table}")).fetchall()
+    index_rebuilds.inc()
+    return PrefixIndex(rows)
+
+
+def _rebuild_in_background(bind, table, generation):
+    def run():
+        global _prefix_index, _prefix_generation, _prefix_rebuilding
+        try:
+            index = _build_prefix_index(bind, table)
+            with _prefix_lock:
+                _prefix_index, _prefix_generation = index, generation
+        except Exception as e:
+            print(f"⚠️ Autosuggest index rebuild failed: {e}")
+        finally:
+            with _prefix_lock:
+                _prefix_rebuilding = False
+
+    threading.Thread(target=run, name="prefix-index-rebuild", daemon=True).start()
+
+
+def _current_prefix_index(session, Product):
+    """
+    The prefix index, checking the generation at most every SEARCH_GENERATION_CHECK_S.
+    Only the first build blocks; later ones run in the background while the old index serves.
+    """
+    global _prefix_index, _prefix_generation, _prefix_checked_at, _prefix_rebuilding
+    now = time.monotonic()
+    if _prefix_index is not None and now - _prefix_checked_at < SEARCH_GENERATION_CHECK_S:
+        return _prefix_index
+    bind, table = session.get_bind(), Product.__tablename__
+    with _prefix_lock:
+        if _prefix_index is None:
+            _prefix_generation = session.execute(text("SELECT generation FROM search_meta")).scalar()
+            _prefix_index = _build_prefix_index(bind, table)
+            _prefix_checked_at = now
+            return _prefix_index
+        if now - _prefix_checked_at < SEARCH_GENERATION_CHECK_S:
+            return _prefix_index
+        _prefix_checked_at = now
+        index, built_generation = _prefix_index, _prefix_generation
+
+    generation = session.execute(text("SELECT generation FROM search_meta")).scalar()
+    if generation != built_generation:
+        with _prefix_lock:
+            start = not _prefix_rebuilding
+            _prefix_rebuilding = True
+        if start:
+            # Generation is read before the rows, so writes racing the rebuild trigger another one
+            _rebuild_in_background(bind, table, generation)
+    return index
+
+
+def suggest(session, Product, q, limit=10):
+    started = time.perf_counter()
+    result = _current_prefix_index(session, Product).suggest(q, limit)
+    suggest_ms.observe((time.perf_counter() - started) * 1000)
+    return result
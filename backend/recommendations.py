@@ -0,0 +1,277 @@
+# backend/recommendations.py
+# "Frequently bought together" from real order history.
+#
+# Item-item co-occurrence counts live in co_purchase (one row per product pair
+# and direction), and a precomputed top-N neighbour list per product lives in
+# product_neighbors, so the product page reads its recommendations with one
+# primary-key range lookup.
+#  - Full build: order x product incidence matrix (SciPy sparse), C = X^T X.
+#  - Incremental: orders created after (watermark - RECS_LATE_WINDOW_S) that
+#    aren't in recommendation_folded yet are folded into co_purchase, and only
+#    the products they touch are re-ranked. created_at is set at flush, not at
+#    commit, so an order can become visible after a newer one was folded; the
+#    trailing window re-scans for such late arrivals and the folded-id table
+#    keeps every order from being counted twice.
+#
+# Cron / manual:  python recommendations.py [--full]
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+from itertools import permutations
+
+import numpy as np
+from sqlalchemy import text
+
+import catalogue_cache
+import metrics
+
+RECS_TOP_N = int(os.environ.get("RECS_TOP_N", 10))
+# Seconds between incremental updates in the app process (0 disables the thread)
+RECS_REFRESH_INTERVAL_S = float(os.environ.get("RECS_REFRESH_INTERVAL_S", 300))
+RECS_INCREMENTAL_BATCH = int(os.environ.get("RECS_INCREMENTAL_BATCH", 5000))
+# How far behind the newest folded order a late-committing order may appear and still be counted
+RECS_LATE_WINDOW_S = float(os.environ.get("RECS_LATE_WINDOW_S", 600))
+IN_CHUNK = 500
+
+SCHEMA = (
+    """CREATE TABLE IF NOT EXISTS co_purchase (
+        product_id TEXT NOT NULL,
+        other_id TEXT NOT NULL,
+        count INTEGER NOT NULL,
+        PRIMARY KEY (product_id, other_id)
+    )""",
+    """CREATE TABLE IF NOT EXISTS product_neighbors (
+        product_id TEXT NOT NULL,
+        rank INTEGER NOT NULL,
+        neighbor_id TEXT NOT NULL,
+        score INTEGER NOT NULL,
+        PRIMARY KEY (product_id, rank)
+    )""",
+    """CREATE TABLE IF NOT EXISTS recommendation_state (
+        id INTEGER PRIMARY KEY CHECK (id = 1),
+        last_created_at TEXT,
+        last_order_id TEXT
+    )""",
+    """CREATE TABLE IF NOT EXISTS recommendation_folded (
+        order_id TEXT PRIMARY KEY,
+        created_at TEXT
+    )""",
+)
+
+build_ms = metrics.histogram("recommendations.build_ms", (10, 100, 1000, 10000, 60000, 600000))
+orders_folded = metrics.counter("recommendations.orders_folded")
+
+
+def init_tables(conn):
+    for ddl in SCHEMA:
+        conn.execute(text(ddl))
+
+
+def _chunks(seq, size):
+    for i in range(0, len(seq), size):
+        yield seq[i:i + size]
+
+
+def _window_start(watermark):
+    """Oldest created_at the incremental pass re-scans, in the stored text format, or None."""
+    if watermark is None:
+        return None
+    start = datetime.fromisoformat(str(watermark)) - timedelta(seconds=RECS_LATE_WINDOW_S)
+    return start.isoformat(sep=" ", timespec="microseconds")
+
+
+def _set_watermark(conn, Order):
+    """After a full build: newest order as the watermark, orders inside the window marked folded."""
+    table = Order.__tablename__
+    last = conn.execute(text(
+        f'SELECT created_at, id FROM "{table}" ORDER BY created_at DESC, id DESC LIMIT 1'
+    )).fetchone()
+    conn.execute(text("""
+        INSERT INTO recommendation_state (id, last_created_at, last_order_id) VALUES (1, :c, :o)
+        ON CONFLICT(id) DO UPDATE SET last_created_at = excluded.last_created_at, last_order_id = excluded.last_order_id
+    """), {"c": last[0] if last else None, "o": last[1] if last else None})
+    conn.execute(text("DELETE FROM recommendation_folded"))
+    if last is not None:
+        conn.execute(text(f"""
+            INSERT INTO recommendation_folded (order_id, created_at)
+            SELECT id, created_at FROM "{table}" WHERE created_at > :since
+        """), {"since": _window_start(last[0])})
+
+
+def _rerank(conn, product_ids):
+    """Recompute the top-N neighbour rows for these products from co_purchase."""
+    for chunk in _chunks(list(product_ids), IN_CHUNK):
+        params = {f"p{i}": pid for i, pid in enumerate(chunk)}
+        in_list = ", ".join(f":p{i}" for i in range(len(chunk)))
+        conn.execute(text(f"DELETE FROM product_neighbors WHERE product_id IN ({in_list})"), params)
+        conn.execute(text(f"""
+            INSERT INTO product_neighbors (product_id, rank, neighbor_id, score)
+            SELECT product_id, rn, other_id, count FROM (
+                SELECT product_id, other_id, count,
+                       ROW_NUMBER() OVER (PARTITION BY product_id ORDER BY count DESC, other_id) AS rn
+                FROM co_purchase WHERE product_id IN ({in_list})
+            ) WHERE rn <= :top_n
+        """), {**params, "top_n": RECS_TOP_N})
+
+
+def build_full(engine, Order, OrderItem):
+    """Recompute all co-occurrence counts and neighbour lists from every order."""
+    from scipy.sparse import csr_matrix
+
+    started = time.perf_counter()
+    with engine.begin() as conn:
+        init_tables(conn)
+        rows = conn.execute(text(
+            f"SELECT order_id, product_id FROM {OrderItem.__tablename__} WHERE product_id IS NOT NULL"
+        )).fetchall()
+
+        order_index, product_index = {}, {}
+        oi = np.fromiter((order_index.setdefault(r[0], len(order_index)) for r in rows), dtype=np.int64, count=len(rows))
+        pj = np.fromiter((product_index.setdefault(r[1], len(product_index)) for r in rows), dtype=np.int64, count=len(rows))
+        products = np.array(list(product_index), dtype=object)
+
+        X = csr_matrix((np.ones(len(rows), dtype=np.int32), (oi, pj)), shape=(len(order_index), len(product_index)))
+        X.data[:] = 1  # an order counts once per product, however many lines it has
+        C = (X.T @ X).tocsr()
+        C.setdiag(0)
+        C.eliminate_zeros()
+
+        pairs, neighbors = [], []
+        for j in range(C.shape[0]):
+            start, end = C.indptr[j], C.indptr[j + 1]
+            if start == end:
+                continue
+            cols, counts = C.indices[start:end], C.data[start:end]
+            pairs.extend({"a": products[j], "b": products[c], "n": int(n)} for c, n in zip(cols, counts))
+            order = np.lexsort((products[cols], -counts))[:RECS_TOP_N]
+            neighbors.extend(
+                {"a": products[j], "r": rank + 1, "b": products[cols[k]], "n": int(counts[k])}
+                for rank, k in enumerate(order)
+            )
+
+        conn.execute(text("DELETE FROM co_purchase"))
+        conn.execute(text("DELETE FROM product_neighbors"))
+        if pairs:
+            conn.execute(text("INSERT INTO co_purchase (product_id, other_id, count) VALUES (:a, :b, :n)"), pairs)
+        if neighbors:
+            conn.execute(text(
+                "INSERT INTO product_neighbors (product_id, rank, neighbor_id, score) VALUES (:a, :r, :b, :n)"
+            ), neighbors)
+        _set_watermark(conn, Order)
+    catalogue_cache.invalidate_products(product_index)
+    build_ms.observe((time.perf_counter() - started) * 1000)
+    print(f"✓ Co-purchase model built from {len(order_index)} orders, {len(product_index)} products")
+
+
+def update_incremental(engine, Order, OrderItem):
+    """Fold orders newer than the watermark into the counts. Returns the number of orders processed."""
+    started = time.perf_counter()
+    processed = 0
+    with engine.begin() as conn:
+        init_tables(conn)
+        state = conn.execute(text("SELECT last_created_at, last_order_id FROM recommendation_state WHERE id = 1")).fetchone()
+        if state is None:
+            # Never built: do the full pass instead
+            processed = None
+    if processed is None:
+        build_full(engine, Order, OrderItem)
+        return 0
+
+    while True:
+        with engine.begin() as conn:
+            state = conn.execute(text("SELECT last_created_at, last_order_id FROM recommendation_state WHERE id = 1")).fetchone()
+            orders = conn.execute(text(f"""
+                SELECT o.id, o.created_at FROM "{Order.__tablename__}" o
+                WHERE (:since IS NULL OR o.created_at > :since)
+                  AND NOT EXISTS (SELECT 1 FROM recommendation_folded f WHERE f.order_id = o.id)
+                ORDER BY o.created_at, o.id LIMIT :limit
+            """), {"since": _window_start(state[0]), "limit": RECS_INCREMENTAL_BATCH}).fetchall()
+            if not orders:
+                break
+
+            basket = {}
+            for chunk in _chunks([o[0] for o in orders], IN_CHUNK):
+                params = {f"o{i}": oid for i, oid in enumerate(chunk)}
+                in_list = ", ".join(f":o{i}" for i in range(len(chunk)))
+                for order_id, product_id in conn.execute(text(
+                    f"SELECT order_id, product_id FROM {OrderItem.__tablename__} "
+                    f"WHERE order_id IN ({in_list}) AND product_id IS NOT NULL"
+                ), params):
+                    basket.setdefault(order_id, set()).add(product_id)
+
+            counts = Counter()
+            for products in basket.values():
+                counts.update(permutations(sorted(products), 2))
+            if counts:
+                conn.execute(text("""
+                    INSERT INTO co_purchase (product_id, other_id, count) VALUES (:a, :b, :n)
+                    ON CONFLICT(product_id, other_id) DO UPDATE SET count = count + excluded.count
+                """), [{"a": a, "b": b, "n": n} for (a, b), n in counts.items()])
+                affected = {a for a, _ in counts}
+                _rerank(conn, affected)
+                # Cached product pages embed the old neighbour list
+                catalogue_cache.invalidate_products(affected)
+
+            conn.execute(text("INSERT INTO recommendation_folded (order_id, created_at) VALUES (:o, :c)"),
+                         [{"o": oid, "c": created_at} for oid, created_at in orders])
+            last = orders[-1]
+            if state[0] is None or str(last[1]) > str(state[0]):
+                conn.execute(text(
+                    "UPDATE recommendation_state SET last_created_at = :c, last_order_id = :o WHERE id = 1"
+                ), {"c": last[1], "o": last[0]})
+                # Orders older than the window are never re-scanned, so their ids can go
+                conn.execute(text("DELETE FROM recommendation_folded WHERE created_at <= :since"),
+                             {"since": _window_start(last[1])})
+            processed += len(orders)
+        if len(orders) < RECS_INCREMENTAL_BATCH:
+            break
+
+    orders_folded.inc(processed)
+    build_ms.observe((time.perf_counter() - started) * 1000)
+    return processed
+
+
+def neighbors(session, Product, product_id, limit=3):
+    """Precomputed co-purchase neighbours (in rank order) as Product rows; tables come from init_tables."""
+    ids = [r[0] for r in session.execute(text(
+        "SELECT neighbor_id FROM product_neighbors WHERE product_id = :p ORDER BY rank LIMIT :n"
+    ), {"p": product_id, "n": limit})]
+    if not ids:
+        return []
+    by_id = {p.id: p for p in session.query(Product).filter(Product.id.in_(ids))}
+    return [by_id[i] for i in ids if i in by_id]
+
+
+_refresh_thread = None
+
+
+def start_refresh_thread(app, db, Order, OrderItem, interval_s=RECS_REFRESH_INTERVAL_S):
+    global _refresh_thread
+    if interval_s <= 0 or (_refresh_thread is not None and _refresh_thread.is_alive()):
+        return
+
+    def run():
+        while True:
+            try:
+                with app.app_context():
+                    update_incremental(db.engine, Order, OrderItem)
+            except Exception as e:
+                print(f"⚠️ Co-purchase refresh failed: {e}")
+            time.sleep(interval_s)
+
+    _refresh_thread = threading.Thread(target=run, name="recs-refresh", daemon=True)
+    _refresh_thread.start()
+
+
+if __name__ == "__main__":
+    from app import app
+    from ecommerce import db, Order, OrderItem
+
+    with app.app_context():
+        if "--full" in sys.argv:
+            build_full(db.engine, Order, OrderItem)
+        else:
+            print(f"✓ Folded {update_incremental(db.engine, Order, OrderItem)} new orders")
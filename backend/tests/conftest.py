@@ -0,0 +1,115 @@
+# backend/tests/conftest.py
+# Run from backend/:  python -m pytest -q
+# The backend is a flat set of modules rather than a package, so put it on sys.path.
+# Every store a module opens at import time (ecom.db, predictions.db, market.db,
+# news.json, invoices, model files) is pointed at a scratch directory first, so
+# the suite never touches backend/data or the checked-in model pickles.
+import os
+import sys
+import tempfile
+
+import numpy as np
+import pytest
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND)
+
+SCRATCH = tempfile.mkdtemp(prefix="agri-zip-tests-")
+MODEL_DIR = os.path.join(SCRATCH, "models")
+os.makedirs(MODEL_DIR, exist_ok=True)
+for _name, _value in {
+    "ECOM_DATABASE_URI": "sqlite:///" + os.path.join(SCRATCH, "ecom.db"),
+    "PREDICTION_LOG_DB": os.path.join(SCRATCH, "predictions.db"),
+    "MARKET_DB_PATH": os.path.join(SCRATCH, "market.db"),
+    "NEWS_CACHE_PATH": os.path.join(SCRATCH, "news.json"),
+    "INVOICE_DIR": os.path.join(SCRATCH, "invoices"),
+    "MODEL_DIR": MODEL_DIR,
+    "MODEL_RELOAD_CHECK_S": "0",
+    "NEWS_REFRESH_INTERVAL_S": "0",
+    "RECS_REFRESH_INTERVAL_S": "0",
+    "INVENTORY_SWEEP_INTERVAL_S": "0",
+    "MARKET_API_KEY": "",
+}.items():
+    os.environ.setdefault(_name, _value)
+
+CROP_FEATURES = ["N", "P", "K", "temperature", "humidity", "ph", "rainfall"]
+CROPS = ["chickpea", "cotton", "jute", "maize", "mango", "rice"]
+
+
+def lab_rows(rng, n_per_crop=40):
+    """Synthetic soil tests, one cluster per crop, rounded to lab precision like crop_dataset.csv."""
+    rows, labels = [], []
+    for c, crop in enumerate(CROPS):
+        centre = np.array([20 + 25 * c, 15 + 10 * c, 20 + 15 * c, 18 + 2.5 * c, 40 + 8 * c, 5.5 + 0.3 * c, 60 + 30 * c])
+        spread = np.array([5, 4, 5, 1.5, 4, 0.2, 10])
+        X = centre + rng.normal(0, 1, (n_per_crop, 7)) * spread
+        rows.append(np.round(X / [1, 1, 1, 0.1, 0.1, 0.1, 1]) * [1, 1, 1, 0.1, 0.1, 0.1, 1])
+        labels += [crop] * n_per_crop
+    return np.vstack(rows), np.array(labels)
+
+
+@pytest.fixture(scope="session")
+def crop_dataset():
+    import pandas as pd
+
+    X, y = lab_rows(np.random.default_rng(7))
+    path = os.path.join(SCRATCH, "crop_dataset.csv")
+    df = pd.DataFrame(np.round(X, 1), columns=CROP_FEATURES)
+    df["label"] = y
+    df.to_csv(path, index=False)
+    return path, X, y
+
+
+@pytest.fixture(scope="session")
+def crop_files(crop_dataset):
+    """A small crop model bundle (as train_crop_model.py writes it) plus its lookup table, in MODEL_DIR."""
+    import joblib
+    from sklearn.ensemble import RandomForestClassifier
+    from sklearn.preprocessing import LabelEncoder
+
+    import crop_lookup
+
+    path, X, y = crop_dataset
+    encoder = LabelEncoder().fit(y)
+    model = RandomForestClassifier(n_estimators=20, random_state=0).fit(X, encoder.transform(y))
+    bundle_path = os.path.join(MODEL_DIR, "crop_model_bundle.joblib")
+    joblib.dump({"model": model, "encoder": encoder, "features": CROP_FEATURES, "version": "test-1"}, bundle_path)
+    table = crop_lookup.build(model, bundle_path, path, samples_per_row=2)
+    table.save(os.path.join(MODEL_DIR, "crop_lookup.npz"))
+    return model, encoder, table
+
+
+@pytest.fixture(scope="session")
+def app_module(crop_files):
+    import app
+    return app
+
+
+@pytest.fixture
+def client(app_module):
+    return app_module.app.test_client()
+
+
+@pytest.fixture
+def auth_header(app_module):
+    """Authorization header carrying a JWT for the given username."""
+    from flask_jwt_extended import create_access_token
+
+    def make(username):
+        with app_module.app.app_context():
+            return {"Authorization": f"Bearer {create_access_token(identity=username)}"}
+    return make
+
+
+@pytest.fixture
+def new_product(app_module):
+    """Insert a product into the scratch ecom.db; returns its id."""
+    import ecommerce
+
+    def make(title="Test product", price=100.0, stock=10, **fields):
+        with app_module.app.app_context():
+            p = ecommerce.Product(title=title, price=price, stock=stock, **fields)
+            ecommerce.db.session.add(p)
+            ecommerce.db.session.commit()
+            return p.id
+    return make
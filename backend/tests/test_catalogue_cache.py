@@ -0,0 +1,82 @@
+# backend/tests/test_catalogue_cache.py
+import itertools
+
+import pytest
+
+import catalogue_cache
+
+_names = itertools.count()
+
+
+def make_cache(**kwargs):
+    return catalogue_cache.LRUTTLCache(f"test_catalogue_cache_{next(_names)}", **kwargs)
+
+
+def test_least_recently_used_entries_are_evicted_first():
+    cache = make_cache(max_entries=2, ttl=60)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1
+    cache.set("c", 3)
+    assert cache.get("b") is None
+    assert (cache.get("a"), cache.get("c")) == (1, 3)
+    assert (cache.hits.value, cache.misses.value) == (3, 1)
+
+
+def test_entries_expire_after_the_ttl(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(catalogue_cache.time, "monotonic", lambda: now[0])
+    cache = make_cache(ttl=60)
+    cache.set("a", 1)
+    now[0] += 59
+    assert cache.get("a") == 1
+    now[0] += 2
+    assert cache.get("a") is None
+
+
+def test_get_or_build_caches_only_real_values():
+    cache = make_cache()
+    calls = []
+    assert cache.get_or_build("k", lambda: calls.append(1)) is None
+    assert cache.get_or_build("k", lambda: calls.append(1) or "v") == "v"
+    assert cache.get_or_build("k", lambda: calls.append(1) or "other") == "v"
+    assert len(calls) == 2
+
+
+def test_product_page_is_served_with_an_etag_and_304(client, new_product):
+    pid = new_product(title="Cached seed", stock=3)
+    first = client.get(f"/api/products/{pid}")
+    assert first.status_code == 200 and first.headers["ETag"]
+    again = client.get(f"/api/products/{pid}", headers={"If-None-Match": first.headers["ETag"]})
+    assert again.status_code == 304
+    assert client.get("/api/products/no-such-product").status_code == 404
+    assert ("product", "no-such-product") not in catalogue_cache.responses._data
+
+
+def test_product_edits_invalidate_on_commit_not_at_flush(app_module, client, new_product):
+    import ecommerce
+
+    pid = new_product(title="Old title", stock=3)
+    etag = client.get(f"/api/products/{pid}").headers["ETag"]
+    with app_module.app.app_context():
+        p = ecommerce.db.session.get(ecommerce.Product, pid)
+        p.title = "New title"
+        ecommerce.db.session.flush()
+        # Not committed yet: other readers must keep getting (and caching) the committed row
+        assert ("product", pid) in catalogue_cache.responses._data
+        ecommerce.db.session.rollback()
+    assert client.get(f"/api/products/{pid}", headers={"If-None-Match": etag}).status_code == 304
+
+    with app_module.app.app_context():
+        ecommerce.db.session.get(ecommerce.Product, pid).title = "New title"
+        ecommerce.db.session.commit()
+    res = client.get(f"/api/products/{pid}", headers={"If-None-Match": etag})
+    assert res.status_code == 200
+    assert res.get_json()["title"] == "New title"
+
+
+def test_checkout_drops_the_cached_stock(client, new_product):
+    pid = new_product(stock=5)
+    assert client.get(f"/api/products/{pid}").get_json()["stock"] == 5
+    client.post("/api/checkout", json={"items": [{"product_id": pid, "qty": 2}]})
+    assert client.get(f"/api/products/{pid}").get_json()["stock"] == 3
@@ -0,0 +1,89 @@
+# backend/tests/test_checkout.py
+import threading
+
+import pytest
+
+import checkout_engine
+from checkout_engine import CheckoutError
+
+
+@pytest.mark.parametrize("value, expected", [(2, 2), ("3", 3), (4.0, 4), (" 5 ", 5)])
+def test_whole_positive_quantities_are_accepted(value, expected):
+    assert checkout_engine.parse_quantity(value) == expected
+
+
+@pytest.mark.parametrize("value", [2.7, "2.7", "two", None, True, 0, -1, [1], {}])
+def test_other_quantities_are_rejected(value):
+    with pytest.raises(CheckoutError) as e:
+        checkout_engine.parse_quantity(value)
+    assert e.value.code == "invalid_quantity"
+
+
+def test_parse_lines_reads_the_given_quantity_key():
+    items = [{"product_id": "a", "quantity": 2}, {"product_id": "b", "quantity": "1"}]
+    assert checkout_engine.parse_lines(items, "quantity") == [("a", 2), ("b", 1)]
+    with pytest.raises(CheckoutError, match="invalid_quantity"):
+        checkout_engine.parse_lines(items)  # no "qty" key
+    with pytest.raises(CheckoutError, match="invalid_quantity"):
+        checkout_engine.parse_lines([{"qty": 1}])
+    with pytest.raises(CheckoutError, match="empty_cart"):
+        checkout_engine.parse_lines([])
+
+
+def test_requested_quantities_merge_repeated_products():
+    assert dict(checkout_engine.requested_quantities([("a", 1), ("b", 2), ("a", 3)])) == {"a": 4, "b": 2}
+
+
+def stock(client, product_id):
+    return client.get(f"/api/products/{product_id}/stock").get_json()
+
+
+def checkout(client, items, buyer_id="alice"):
+    return client.post("/api/checkout", json={"buyer_id": buyer_id, "items": items})
+
+
+def test_checkout_prices_the_cart_and_takes_stock(client, new_product):
+    a = new_product(price=100.0, stock=5)
+    b = new_product(price=2.5, stock=5)
+    res = checkout(client, [{"product_id": a, "qty": 2}, {"product_id": b, "qty": 4}, {"product_id": a, "qty": 1}])
+    assert res.status_code == 201
+    assert res.get_json()["order"]["total"] == 310.0
+    assert stock(client, a)["stock"] == 2
+    assert stock(client, b)["stock"] == 1
+
+
+@pytest.mark.parametrize("qty", [2.7, "abc", 0, -2, None])
+def test_bad_quantities_are_a_400(client, new_product, qty):
+    a = new_product(stock=5)
+    res = checkout(client, [{"product_id": a, "qty": qty}])
+    assert res.status_code == 400
+    assert res.get_json() == {"error": "invalid_quantity"}
+    assert stock(client, a)["stock"] == 5
+
+
+def test_out_of_stock_changes_nothing(client, new_product):
+    a = new_product(stock=5)
+    b = new_product(stock=1)
+    res = checkout(client, [{"product_id": a, "qty": 1}, {"product_id": b, "qty": 2}])
+    assert res.status_code == 400
+    assert res.get_json() == {"error": "out_of_stock"}
+    assert stock(client, a)["stock"] == 5
+    assert stock(client, b)["stock"] == 1
+    assert checkout(client, [{"product_id": "no-such-product", "qty": 1}]).status_code == 400
+
+
+def test_concurrent_checkouts_never_oversell(app_module, new_product):
+    a = new_product(stock=5)
+    results = []
+
+    def buy():
+        client = app_module.app.test_client()
+        results.append(checkout(client, [{"product_id": a, "qty": 1}]).status_code)
+
+    threads = [threading.Thread(target=buy) for _ in range(12)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join(30)
+    assert sorted(results) == [201] * 5 + [400] * 7
+    assert stock(app_module.app.test_client(), a)["stock"] == 0
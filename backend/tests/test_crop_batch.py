@@ -0,0 +1,67 @@
+# backend/tests/test_crop_batch.py
+import json
+
+from conftest import CROPS
+
+ROW = {"N": 45, "P": 25, "K": 35, "temperature": 20.5, "humidity": 48.0, "ph": 5.8, "rainfall": 90}
+
+
+def ndjson(res):
+    return [json.loads(line) for line in res.get_data(as_text=True).splitlines()]
+
+
+def test_json_rows_are_answered_in_order(client):
+    res = client.post("/api/predict-crop/batch", json={"rows": [ROW, list(ROW.values()), {"N": 1}, [1, 2]]})
+    assert res.status_code == 200
+    assert res.mimetype == "application/x-ndjson"
+    out = ndjson(res)
+    assert [r["index"] for r in out] == [0, 1, 2, 3]
+    assert out[0]["suggested_crop"] in CROPS
+    # A dict and the same values as a list get the same answer
+    assert out[0]["recommendations"] == out[1]["recommendations"]
+    assert out[2]["error"].startswith("Invalid row")
+    assert out[3]["error"].startswith("Invalid row")
+
+
+def test_ndjson_body_is_read_line_by_line(client):
+    body = "\n".join([json.dumps(ROW), "not json", json.dumps(list(ROW.values()))]) + "\n"
+    res = client.post("/api/predict-crop/batch", data=body, content_type="application/x-ndjson")
+    out = ndjson(res)
+    assert [r["index"] for r in out] == [0, 1, 2]
+    assert "error" in out[1]
+    assert out[0]["suggested_crop"] == out[2]["suggested_crop"]
+
+
+def test_chunk_boundaries_keep_input_order(client, app_module, monkeypatch):
+    monkeypatch.setattr(app_module, "CROP_BATCH_CHUNK_ROWS", 3)
+    rows = [dict(ROW, N=ROW["N"] + i) if i % 4 else {"N": i} for i in range(10)]
+    out = ndjson(client.post("/api/predict-crop/batch", json={"rows": rows}))
+    assert [r["index"] for r in out] == list(range(10))
+    assert ["error" in r for r in out] == [i % 4 == 0 for i in range(10)]
+
+
+def test_top_k_is_clamped_before_streaming(client):
+    for top_k, expected in [(0, 1), (-3, 1), (2, 2), (100, len(CROPS))]:
+        res = client.post(f"/api/predict-crop/batch?top_k={top_k}", json={"rows": [ROW]})
+        assert res.status_code == 200
+        (row,) = ndjson(res)
+        assert len(row["recommendations"]) == expected
+
+
+def test_body_must_be_an_object_with_a_rows_list(client):
+    for body in ([ROW], {"rows": 5}, {"rows": {"N": 1}}):
+        res = client.post("/api/predict-crop/batch", json=body)
+        assert res.status_code == 400
+    res = client.post("/api/predict-crop/batch", data="{", content_type="application/json")
+    assert res.status_code == 400
+
+
+def test_lab_rounded_batch_rows_are_served_from_the_lookup_table(client, crop_dataset):
+    # The batch path builds float32 features; decimal temperature/humidity/pH must still hit
+    _, X, _ = crop_dataset
+    rows = X[::40].tolist()
+    before = client.get("/metrics?prefix=crop_lookup").get_json()
+    out = ndjson(client.post("/api/predict-crop/batch", json={"rows": rows}))
+    after = client.get("/metrics?prefix=crop_lookup").get_json()
+    assert len(out) == len(rows)
+    assert after["crop_lookup.hits"]["value"] - before.get("crop_lookup.hits", {}).get("value", 0) == len(rows)
@@ -0,0 +1,68 @@
+# backend/tests/test_crop_lookup.py
+import numpy as np
+import pytest
+
+import crop_lookup
+
+ON_GRID = [[90, 42, 43, 20.8, 82.0, 6.5, 203], [10, 0, 300, 0.1, 99.9, 13.9, 1]]
+
+
+@pytest.mark.parametrize("dtype", [np.float64, np.float32])
+def test_lab_rounded_rows_are_on_grid_in_either_precision(crop_files, dtype):
+    _, _, table = crop_files
+    keys64, valid64 = table.quantize(np.asarray(ON_GRID, dtype=np.float64), on_grid=True)
+    keys, valid = table.quantize(np.asarray(ON_GRID, dtype=dtype), on_grid=True)
+    assert valid.all()
+    assert (keys == keys64).all()
+
+
+@pytest.mark.parametrize("dtype", [np.float64, np.float32])
+def test_finer_inputs_are_off_grid(crop_files, dtype):
+    _, _, table = crop_files
+    X = np.asarray([[90, 42, 43, 20.85, 82.0, 6.5, 203], [90.5, 42, 43, 20.8, 82.0, 6.5, 203]], dtype=dtype)
+    keys, valid = table.quantize(X, on_grid=True)
+    assert not valid.any()
+    assert (keys == -1).all()
+    # ...but still fall in a cell for building the table
+    assert table.quantize(X)[1].all()
+
+
+def test_out_of_range_rows_are_invalid(crop_files):
+    _, _, table = crop_files
+    _, valid = table.quantize(np.asarray([[-1, 0, 0, 20, 50, 7, 100], [0, 0, 0, 20, 50, 7, 401]]))
+    assert not valid.any()
+
+
+@pytest.mark.parametrize("dtype", [np.float64, np.float32])
+def test_training_rows_hit_the_table_with_the_models_answer(crop_files, crop_dataset, dtype):
+    model, _, table = crop_files
+    _, X, _ = crop_dataset
+    X = X[::25].astype(dtype)
+    hit, idx, prob = table.lookup(X)
+    assert hit.all()
+    expected = np.argsort(model.predict_proba(X), axis=1)[:, ::-1][:, 0]
+    assert (idx[:, 0] == expected).all()
+    assert np.all(np.diff(prob, axis=1) <= 0)
+
+
+def test_on_grid_misses_are_remembered(crop_files):
+    _, _, table = crop_files
+    X = np.asarray([[199, 199, 299, 59.9, 0.1, 0.1, 399]], dtype=np.float32)
+    hit, _, _ = table.lookup(X)
+    assert not hit.any()
+    idx = np.arange(crop_lookup.TOP_K)[None, :]
+    prob = np.linspace(0.5, 0.1, crop_lookup.TOP_K)[None, :]
+    table.remember(X, idx, prob)
+    hit, got_idx, _ = table.lookup(X)
+    assert hit.all()
+    assert (got_idx == idx).all()
+
+
+def test_nearest_returns_the_closest_training_rows(crop_files, crop_dataset):
+    _, _, table = crop_files
+    _, X, y = crop_dataset
+    fields = table.similar_fields(X[3], k=3)
+    assert len(fields) == 3
+    assert fields[0]["distance"] == 0
+    assert fields[0]["crop"] == y[3]
+    assert [f["distance"] for f in fields] == sorted(f["distance"] for f in fields)
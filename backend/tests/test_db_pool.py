@@ -0,0 +1,80 @@
+# backend/tests/test_db_pool.py
+import sqlite3
+import threading
+import time
+
+import pytest
+from flask import Flask, g, jsonify
+
+from db_pool import ConnectionPool, PoolTimeout
+
+
+def make_pool(tmp_path, **kwargs):
+    path = str(tmp_path / "pool.db")
+    return ConnectionPool(lambda: sqlite3.connect(path, check_same_thread=False), name="test_db_pool", **kwargs)
+
+
+def test_checkout_times_out_when_pool_is_exhausted(tmp_path):
+    pool = make_pool(tmp_path, size=1, timeout=0.05)
+    held = pool.connection()
+    started = time.monotonic()
+    with pytest.raises(PoolTimeout):
+        pool.connection()
+    assert time.monotonic() - started >= 0.05
+
+    held.close()
+    with pool.connection() as conn:
+        cur = conn.cursor()
+        cur.execute("SELECT 1")
+        assert cur.fetchone() == (1,)
+
+
+def test_waiting_checkout_gets_released_connection(tmp_path):
+    pool = make_pool(tmp_path, size=1, timeout=2)
+    held = pool.connection()
+    threading.Timer(0.05, held.close).start()
+    with pool.connection() as conn:
+        assert not conn.closed
+
+
+def test_release_rolls_back_open_transaction(tmp_path):
+    pool = make_pool(tmp_path, size=1)
+    with pool.connection() as conn:
+        conn.execute("CREATE TABLE t (x INTEGER)")
+        conn.commit()
+        conn.execute("INSERT INTO t VALUES (1)")
+    with pool.connection() as conn:
+        assert conn.execute("SELECT COUNT(*) FROM t").fetchone() == (0,)
+
+
+def test_pool_timeout_maps_to_503(tmp_path):
+    # Same wiring as app.py: connections are checked out per request and
+    # PoolTimeout is turned into a 503 by an error handler
+    pool = make_pool(tmp_path, size=1, timeout=0.05)
+    app = Flask(__name__)
+
+    @app.errorhandler(PoolTimeout)
+    def db_pool_exhausted(e):
+        return jsonify({"error": "Database busy, please retry"}), 503
+
+    @app.teardown_appcontext
+    def release_db(exc):
+        for conn in g.pop("_db_conns", []):
+            conn.close()
+
+    @app.route("/ping")
+    def ping():
+        conn = pool.connection()
+        g.setdefault("_db_conns", []).append(conn)
+        return jsonify({"ok": conn.execute("SELECT 1").fetchone()[0]})
+
+    client = app.test_client()
+    assert client.get("/ping").status_code == 200
+
+    held = pool.connection()
+    res = client.get("/ping")
+    assert res.status_code == 503
+    assert res.get_json() == {"error": "Database busy, please retry"}
+
+    held.close()
+    assert client.get("/ping").status_code == 200
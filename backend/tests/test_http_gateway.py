@@ -0,0 +1,133 @@
+# backend/tests/test_http_gateway.py
+import time
+
+import pytest
+
+import fake_upstream
+from http_gateway import CircuitBreaker, CircuitOpen, HttpGateway, UpstreamError
+
+
+def wait_for(predicate, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.01)
+    return predicate()
+
+
+# --- CircuitBreaker state machine ---
+def test_breaker_opens_after_consecutive_failures():
+    breaker = CircuitBreaker("test-open", failures=3, cooldown_s=60)
+    for _ in range(2):
+        assert breaker.before_call() is False
+        breaker.record_failure()
+    # A success resets the streak
+    breaker.record_success()
+    for _ in range(3):
+        assert breaker.before_call() is False
+        breaker.record_failure()
+    with pytest.raises(CircuitOpen):
+        breaker.before_call()
+
+
+def test_half_open_allows_a_single_trial():
+    breaker = CircuitBreaker("test-trial", failures=1, cooldown_s=0.05)
+    breaker.record_failure()
+    with pytest.raises(CircuitOpen):
+        breaker.before_call()
+    time.sleep(0.06)
+    assert breaker.before_call() is True
+    # Only one trial at a time
+    with pytest.raises(CircuitOpen):
+        breaker.before_call()
+
+
+def test_failed_trial_reopens_for_another_cooldown():
+    breaker = CircuitBreaker("test-reopen", failures=1, cooldown_s=0.05)
+    breaker.record_failure()
+    time.sleep(0.06)
+    assert breaker.before_call() is True
+    breaker.record_failure()
+    with pytest.raises(CircuitOpen):
+        breaker.before_call()
+    time.sleep(0.06)
+    assert breaker.before_call() is True
+
+
+def test_successful_trial_closes_the_breaker():
+    breaker = CircuitBreaker("test-close", failures=1, cooldown_s=0.05)
+    breaker.record_failure()
+    time.sleep(0.06)
+    assert breaker.before_call() is True
+    breaker.record_success()
+    assert breaker.opened_at is None
+    assert breaker.before_call() is False
+
+
+def test_cancelled_trial_does_not_wedge_the_breaker():
+    breaker = CircuitBreaker("test-cancel", failures=1, cooldown_s=0.05)
+    breaker.record_failure()
+    time.sleep(0.06)
+    assert breaker.before_call() is True
+    # The trial ended without a result: the next caller gets to try
+    breaker.end_trial()
+    assert breaker.before_call() is True
+
+
+# --- Through the gateway, against the fake upstream ---
+@pytest.fixture
+def upstream():
+    behaviour = fake_upstream.Behaviour(latency_ms=0)
+    return behaviour, fake_upstream.start_in_thread(behaviour)
+
+
+@pytest.fixture
+def gateway():
+    gw = HttpGateway(retries=0, timeout_s=2)
+    yield gw
+    gw.close()
+
+
+def test_gateway_opens_breaker_on_upstream_errors(upstream, gateway):
+    behaviour, base = upstream
+    url = base + "/v2/top-headlines"
+    assert gateway.get_json(url)["status"] == "ok"
+
+    breaker = gateway._host("127.0.0.1").breaker
+    breaker.failures = 2
+    behaviour.error_rate = 1.0
+    for _ in range(2):
+        with pytest.raises(UpstreamError):
+            gateway.get_json(url)
+    requests = behaviour.requests
+    with pytest.raises(CircuitOpen):
+        gateway.get_json(url)
+    # Rejected without touching the upstream
+    assert behaviour.requests == requests
+
+    breaker.cooldown_s = 0.05
+    time.sleep(0.06)
+    behaviour.error_rate = 0.0
+    assert gateway.get_json(url)["status"] == "ok"
+    assert breaker.opened_at is None
+
+
+def test_gateway_releases_trial_cancelled_by_deadline(upstream, gateway):
+    behaviour, base = upstream
+    url = base + "/v2/top-headlines"
+    breaker = gateway._host("127.0.0.1").breaker
+    breaker.cooldown_s = 0.05
+    breaker.record_failure()
+    breaker.opened_at = time.monotonic() - 1
+
+    # The trial call hangs past the caller's deadline and is cancelled
+    behaviour.latency_ms = 1000
+    with pytest.raises(UpstreamError, match="deadline"):
+        gateway.run(gateway.fetch_json(url), deadline=0.1)
+    assert wait_for(lambda: not breaker.trial_running)
+
+    # So the next call is let through as a fresh trial and closes the breaker
+    behaviour.latency_ms = 0
+    assert gateway.get_json(url)["status"] == "ok"
+    assert breaker.opened_at is None
@@ -0,0 +1,62 @@
+# backend/tests/test_image_preprocess.py
+import io
+
+import numpy as np
+import pytest
+from PIL import Image
+
+import image_preprocess
+from image_preprocess import ImageTooLarge, InvalidImage
+
+
+def encoded(size=(640, 480), fmt="JPEG", mode="RGB", color=(200, 100, 50)):
+    buf = io.BytesIO()
+    Image.new(mode, size, color if mode == "RGB" else 128).save(buf, fmt)
+    buf.seek(0)
+    return buf
+
+
+def test_photos_are_scaled_into_float32_pixels():
+    img = image_preprocess.load_image(encoded((1600, 1200)))
+    assert img.shape == (224, 224, 3) and img.dtype == np.float32
+    assert np.allclose(img[112, 112], np.array([200, 100, 50]) / 255, atol=0.02)
+
+
+def test_other_formats_and_modes_are_converted_to_rgb():
+    img = image_preprocess.load_image(encoded((300, 300), "PNG", "L"))
+    assert img.shape == (224, 224, 3)
+    assert np.allclose(img, 128 / 255)
+
+
+def test_load_fills_a_given_buffer():
+    batch = np.zeros((2, 224, 224, 3), dtype=np.float32)
+    result = image_preprocess.load_image(encoded(), out=batch[1])
+    assert np.shares_memory(result, batch)
+    assert batch[1].max() > 0 and batch[0].max() == 0
+
+
+def test_size_limits_are_checked_before_decoding():
+    with pytest.raises(ImageTooLarge):
+        image_preprocess.check_upload_size(11, limit=10)
+    image_preprocess.check_upload_size(None, limit=10)
+    with pytest.raises(ImageTooLarge):
+        image_preprocess.load_image(encoded(), max_bytes=100)
+    with pytest.raises(ImageTooLarge, match="pixel limit"):
+        image_preprocess.load_image(encoded((1000, 1000), "PNG"), max_pixels=999_999)
+
+
+@pytest.mark.parametrize("data", [
+    b"not an image at all",
+    encoded((800, 600)).getvalue()[:2000],  # header intact, scan data cut off
+])
+def test_unreadable_uploads_are_invalid_images(data):
+    with pytest.raises(InvalidImage):
+        image_preprocess.load_image(io.BytesIO(data))
+
+
+def test_detect_disease_rejects_corrupt_uploads_with_400(client, auth_header):
+    data = {"image": (io.BytesIO(encoded().getvalue()[:2000]), "leaf.jpg")}
+    res = client.post("/detect-disease", data=data, headers=auth_header("farmer"),
+                      content_type="multipart/form-data")
+    assert res.status_code == 400
+    assert "truncated or corrupt" in res.get_json()["error"]
@@ -0,0 +1,132 @@
+# backend/tests/test_inventory.py
+import threading
+from datetime import datetime, timedelta
+
+import pytest
+
+import inventory
+
+
+@pytest.fixture
+def alice(auth_header):
+    return auth_header("alice")
+
+
+@pytest.fixture
+def mallory(auth_header):
+    return auth_header("mallory")
+
+
+def stock(client, product_id):
+    return client.get(f"/api/products/{product_id}/stock").get_json()
+
+
+def reserve(client, headers, items, cart_id=None):
+    return client.post("/api/cart/reservations", headers=headers, json={"cart_id": cart_id, "items": items})
+
+
+def test_reservations_need_a_signed_in_buyer(client, new_product):
+    a = new_product(stock=3)
+    assert reserve(client, {}, [{"product_id": a, "qty": 1}]).status_code == 401
+    assert client.delete("/api/cart/reservations/some-cart").status_code == 401
+
+
+def test_reserving_holds_units_until_checkout(client, new_product, alice):
+    a = new_product(stock=3)
+    res = reserve(client, alice, [{"product_id": a, "qty": 2}])
+    assert res.status_code == 201
+    cart_id = res.get_json()["cart_id"]
+    assert stock(client, a)["available"] == 1
+
+    # Units held by the cart aren't for sale to anyone else
+    res = client.post("/api/checkout", json={"buyer_id": "bob", "items": [{"product_id": a, "qty": 2}]})
+    assert res.get_json() == {"error": "out_of_stock"}
+
+    res = client.post("/api/checkout", headers=alice, json={"cart_id": cart_id, "items": [{"product_id": a, "qty": 2}]})
+    assert res.status_code == 201
+    assert stock(client, a) | {"version": None} == {
+        "product_id": a, "stock": 1, "reserved": 0, "available": 1, "version": None}
+
+
+def test_re_reserving_a_cart_replaces_its_holds(client, new_product, alice):
+    a = new_product(stock=5)
+    cart_id = reserve(client, alice, [{"product_id": a, "qty": 4}]).get_json()["cart_id"]
+    assert reserve(client, alice, [{"product_id": a, "qty": 1}], cart_id).status_code == 201
+    assert stock(client, a)["reserved"] == 1
+
+
+def test_only_the_buyer_who_reserved_can_claim_or_release_holds(client, new_product, alice, mallory):
+    a = new_product(stock=2)
+    cart_id = reserve(client, alice, [{"product_id": a, "qty": 2}]).get_json()["cart_id"]
+
+    # A cart id plus someone else's buyer_id in the body is not enough
+    res = client.post("/api/checkout", json={"cart_id": cart_id, "buyer_id": "alice",
+                                             "items": [{"product_id": a, "qty": 2}]})
+    assert res.status_code == 401
+    res = client.post("/api/checkout", headers=mallory, json={"cart_id": cart_id, "items": [{"product_id": a, "qty": 2}]})
+    assert res.get_json() == {"error": "out_of_stock"}
+    assert client.delete(f"/api/cart/reservations/{cart_id}", headers=mallory).get_json() == {"released": 0}
+    assert stock(client, a)["reserved"] == 2
+
+    assert client.delete(f"/api/cart/reservations/{cart_id}", headers=alice).get_json() == {"released": 2}
+    assert stock(client, a)["reserved"] == 0
+
+
+def test_expired_holds_are_swept(app_module, client, new_product, alice):
+    import ecommerce
+
+    a = new_product(stock=4)
+    reserve(client, alice, [{"product_id": a, "qty": 3}])
+    with app_module.app.app_context():
+        released = inventory.sweep_expired(ecommerce.db.session, ecommerce.Product, ecommerce.StockHold,
+                                           now=datetime.utcnow() + timedelta(seconds=inventory.INVENTORY_HOLD_TTL_S + 1))
+    assert released >= 3
+    assert stock(client, a)["available"] == 4
+
+
+def test_concurrent_reservations_never_overbook(app_module, new_product, auth_header):
+    a = new_product(stock=4)
+    results = []
+
+    def hold(i):
+        client = app_module.app.test_client()
+        results.append(reserve(client, auth_header(f"buyer{i}"), [{"product_id": a, "qty": 1}]).status_code)
+
+    threads = [threading.Thread(target=hold, args=(i,)) for i in range(10)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join(30)
+    assert sorted(results) == [201] * 4 + [400] * 6
+    assert stock(app_module.app.test_client(), a)["reserved"] == 4
+
+
+# --- Stock edits ---
+def put_stock(client, product_id, body, headers=None):
+    return client.put(f"/api/products/{product_id}/stock", json=body, headers=headers or {})
+
+
+def test_stock_edits_need_admin_or_the_seller(client, new_product, auth_header, alice):
+    a = new_product(stock=5, seller_id="seller1")
+    assert put_stock(client, a, {"delta": 5}).status_code == 401
+    assert put_stock(client, a, {"delta": 5}, alice).status_code == 403
+    assert put_stock(client, a, {"delta": 5}, auth_header("seller1")).status_code == 200
+    assert put_stock(client, a, {"delta": 5}, auth_header("admin")).get_json()["stock"] == 15
+    assert put_stock(client, "no-such-product", {"delta": 1}, auth_header("admin")).status_code == 404
+
+
+def test_absolute_stock_edits_are_compare_and_swap(client, new_product, auth_header, alice):
+    admin = auth_header("admin")
+    a = new_product(stock=5)
+    version = stock(client, a)["version"]
+    res = put_stock(client, a, {"stock": 8, "version": version}, admin)
+    assert res.status_code == 200
+    assert res.get_json()["stock"] == 8
+    # Someone else's edit moved the version on
+    assert put_stock(client, a, {"stock": 9, "version": version}, admin).status_code == 409
+
+    reserve(client, alice, [{"product_id": a, "qty": 3}])
+    version = stock(client, a)["version"]
+    res = put_stock(client, a, {"stock": 2, "version": version}, admin)
+    assert res.get_json() == {"error": "below_reserved"}
+    assert put_stock(client, a, {"stock": "x", "version": version}, admin).status_code == 400
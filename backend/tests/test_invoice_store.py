@@ -0,0 +1,80 @@
+# backend/tests/test_invoice_store.py
+import io
+import os
+import uuid
+import zipfile
+
+import pytest
+
+import invoice_store
+
+pytestmark = pytest.mark.skipif(not invoice_store.AVAILABLE, reason="reportlab not installed")
+
+
+def invoice(status="Ordered", order_id=None):
+    return {"order_id": order_id or str(uuid.uuid4()), "buyer_id": "farmer1", "status": status,
+            "payment_method": "cod", "created_at": "2024-03-01 10:00", "total": 250.0,
+            "items": [{"title": "Urea 45kg", "qty": 1, "price": 250.0}]}
+
+
+def test_identical_content_renders_identical_bytes():
+    data = invoice()
+    assert invoice_store.render_pdf(data) == invoice_store.render_pdf(dict(data))
+    assert invoice_store.digest(data) != invoice_store.digest(invoice("Shipped", data["order_id"]))
+
+
+def test_invoices_render_once_and_are_then_served_from_disk():
+    data = invoice()
+    path, key = invoice_store.ensure(data)
+    assert os.path.exists(path) and key == invoice_store.digest(data)
+    hits = invoice_store.cache_hits.value
+    assert invoice_store.ensure(data) == (path, key)
+    assert invoice_store.cache_hits.value == hits + 1
+
+
+def test_concurrent_requests_share_one_render():
+    data = invoice()
+    key, first = invoice_store.schedule(data)
+    again = invoice_store.schedule(data)
+    assert again[1] is None or again[1] is first
+    first.result(10)
+
+
+def test_a_new_version_replaces_the_superseded_pdf():
+    data = invoice()
+    old_path, _ = invoice_store.ensure(data)
+    new_path, new_key = invoice_store.ensure(invoice("Shipped", data["order_id"]))
+    assert os.path.exists(new_path) and not os.path.exists(old_path)
+    with open(os.path.join(invoice_store.INVOICE_DIR, "by-order", data["order_id"])) as f:
+        assert f.read() == new_key
+
+
+def test_export_skips_invoices_that_fail_to_render(monkeypatch):
+    good = [invoice() for _ in range(3)]
+    bad = invoice()
+    render = invoice_store.render_pdf
+
+    def flaky_render(data):
+        if data["order_id"] == bad["order_id"]:
+            raise ValueError("broken font")
+        return render(data)
+
+    monkeypatch.setattr(invoice_store, "render_pdf", flaky_render)
+    archive = b"".join(invoice_store.stream_zip([good[0], bad, *good[1:]], window=2))
+    with zipfile.ZipFile(io.BytesIO(archive)) as zf:
+        names = zf.namelist()
+        assert names == [f"invoice_{d['order_id']}.pdf" for d in good] + ["ERRORS.txt"]
+        assert zf.read(names[0]).startswith(b"%PDF")
+        assert bad["order_id"] in zf.read("ERRORS.txt").decode()
+
+
+def test_invoice_download_is_conditional_on_the_digest(client, new_product):
+    pid = new_product(stock=5)
+    order_id = client.post("/api/checkout", json={"items": [{"product_id": pid, "qty": 1}]}).get_json()["order"]["id"]
+    res = client.get(f"/api/invoice/{order_id}")
+    assert res.status_code == 200 and res.data.startswith(b"%PDF")
+    etag = res.headers["ETag"]
+    assert client.get(f"/api/invoice/{order_id}", headers={"If-None-Match": etag}).status_code == 304
+    client.put(f"/api/orders/{order_id}/status", json={"status": "Shipped"})
+    assert client.get(f"/api/invoice/{order_id}", headers={"If-None-Match": etag}).status_code == 200
+    assert client.get("/api/invoice/no-such-order").status_code == 404
@@ -0,0 +1,64 @@
+# backend/tests/test_market_analytics.py
+from datetime import date
+import pandas as pd
+
+import market_analytics
+
+
+def frame(rows):
+    df = pd.DataFrame(rows, columns=["state", "market", "arrival_date", "min_price", "max_price", "modal_price"])
+    df["arrival_date"] = pd.to_datetime(df["arrival_date"])
+    return df
+
+
+ROWS = [
+    ("Maharashtra", "Pune", "2024-03-01", 1900, 2100, 2000),
+    ("Maharashtra", "Nashik", "2024-03-01", 1800, 2300, 2200),
+    ("Maharashtra", "Pune", "2024-03-02", 2000, 2200, 2100),
+    # 03-03 has no arrivals
+    ("Punjab", "Ludhiana", "2024-03-04", 1700, 2000, 1900),
+]
+
+
+def test_compute_aggregates_per_market_and_state():
+    result = market_analytics.compute(frame(ROWS))
+    assert result["records"] == 4
+    pune = next(m for m in result["per_market"] if m["market"] == "Pune")
+    assert pune == {"market": "Pune", "modal_mean": 2050.0, "modal_median": 2050.0, "min_price": 1900,
+                    "max_price": 2200, "records": 2, "latest_date": "02/03/2024"}
+    assert [s["state"] for s in result["per_state"]] == ["Maharashtra", "Punjab"]
+    assert result["percentiles"]["p50"] == 2050.0
+
+
+def test_daily_series_fills_missing_days_and_rolls_over_calendar_days():
+    daily = market_analytics.compute(frame(ROWS))["daily"]
+    assert [d["date"] for d in daily] == ["01/03/2024", "02/03/2024", "03/03/2024", "04/03/2024"]
+    assert daily[0]["modal"] == 2100.0  # mean of both markets that day
+    assert daily[2]["modal"] is None
+    assert daily[2]["rolling_7d"] == 2100.0
+    assert daily[3]["rolling_7d"] == round((2100 + 2100 + 1900) / 3, 2)
+
+
+def test_no_records_gives_an_empty_result():
+    assert market_analytics.compute(frame([])) == {
+        "records": 0, "per_market": [], "per_state": [], "daily": [], "percentiles": {}}
+
+
+def test_results_are_cached_until_the_pair_is_resynced(monkeypatch):
+    version, loads = ["v1"], []
+    monkeypatch.setattr(market_analytics, "_cache", market_analytics.OrderedDict())
+    monkeypatch.setattr(market_analytics, "sync_version", lambda commodity, state: version[0])
+    monkeypatch.setattr(market_analytics, "load_frame", lambda *args: loads.append(args) or frame(ROWS))
+
+    since = date(2024, 3, 1)
+    first = market_analytics.analytics("Wheat", "Maharashtra", "month", since)
+    assert market_analytics.analytics("Wheat", "Maharashtra", "month", since) is first
+    assert len(loads) == 1
+    version[0] = "v2"
+    market_analytics.analytics("Wheat", "Maharashtra", "month", since)
+    assert len(loads) == 2
+
+
+def test_analytics_endpoint_rejects_unknown_pairs(client):
+    res = client.get("/market-price/analytics", query_string={"crop": "Wheet", "state": "Maharashtra"})
+    assert res.status_code == 400
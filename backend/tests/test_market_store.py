@@ -0,0 +1,135 @@
+# backend/tests/test_market_store.py
+import time
+from datetime import date, timedelta
+
+import pytest
+
+import fake_upstream
+import market_store
+
+
+@pytest.fixture(scope="module")
+def upstream():
+    behaviour = fake_upstream.Behaviour(latency_ms=0)
+    return behaviour, fake_upstream.start_in_thread(behaviour)
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch, upstream):
+    """market_store on a fresh SQLite file, syncing 10-record pages from fake_upstream (90 days of one market)."""
+    behaviour, base = upstream
+    monkeypatch.setattr(market_store, "MARKET_DB_PATH", str(tmp_path / "market.db"))
+    monkeypatch.setattr(market_store, "_initialized", False)
+    monkeypatch.setattr(market_store, "_touched", {})
+    monkeypatch.setattr(market_store, "MARKET_API_URL", base + "/resource/market")
+    monkeypatch.setattr(market_store, "MARKET_PAGE_SIZE", 10)
+    behaviour.requests = 0
+    return behaviour
+
+
+def stored(commodity="Wheat", state="Maharashtra"):
+    conn = market_store.connect()
+    try:
+        return conn.execute("SELECT COUNT(*) FROM market_prices WHERE commodity = ? AND state = ?",
+                            (commodity, state)).fetchone()[0]
+    finally:
+        conn.close()
+
+
+def sync_row(commodity="Wheat", state="Maharashtra"):
+    conn = market_store.connect()
+    try:
+        return dict(conn.execute("SELECT * FROM market_sync WHERE commodity = ? AND state = ?",
+                                 (commodity, state)).fetchone())
+    finally:
+        conn.close()
+
+
+def wait_for(predicate, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.02)
+    return predicate()
+
+
+def test_parse_date_is_iso_or_none():
+    assert market_store.parse_date("05/03/2024") == "2024-03-05"
+    assert market_store.parse_date("2024-03-05") is None
+    assert market_store.parse_date(None) is None
+
+
+@pytest.mark.parametrize("commodity, state, expected", [
+    ("wheat", "maharashtra", ("Wheat", "Maharashtra")),
+    ("  WHEAT ", "Tamil   nadu", ("Wheat", "Tamil Nadu")),
+    ("Onion", "Orissa", ("Onion", "Odisha")),
+    ("onion", "delhi", ("Onion", "NCT of Delhi")),
+])
+def test_pairs_are_normalized(commodity, state, expected):
+    assert market_store.normalize_pair(commodity, state) == expected
+
+
+@pytest.mark.parametrize("commodity, state", [("Wheet", "Maharashtra"), ("Wheat", "Atlantis")])
+def test_unknown_names_are_rejected(commodity, state):
+    with pytest.raises(market_store.UnknownPair):
+        market_store.normalize_pair(commodity, state)
+
+
+def test_full_sync_pages_until_a_short_page(store):
+    assert market_store.sync_pair("Wheat", "Maharashtra", "key") == 90
+    assert store.requests == 10
+    row = sync_row()
+    assert row["newest_date"] == date.today().isoformat()
+    assert row["backfill_offset"] is None
+
+
+def test_incremental_sync_stops_at_the_newest_stored_day(store):
+    market_store.sync_pair("Wheat", "Maharashtra", "key")
+    store.requests = 0
+    market_store.sync_pair("Wheat", "Maharashtra", "key")
+    assert store.requests == 1
+    assert stored() == 90
+
+
+def test_first_request_syncs_one_page_and_backfills_the_rest(store, monkeypatch):
+    requests_before_backfill = []
+    backfill = market_store._backfill_in_background
+
+    def spy(*args):
+        requests_before_backfill.append(store.requests)
+        backfill(*args)
+
+    monkeypatch.setattr(market_store, "_backfill_in_background", spy)
+    market_store.ensure_pair("Onion", "Maharashtra", "key")
+    # The request itself only waited for the newest page
+    assert requests_before_backfill == [market_store.MARKET_REQUEST_PAGES]
+    assert wait_for(lambda: stored("Onion") == 90)
+    assert wait_for(lambda: sync_row("Onion")["backfill_offset"] is None)
+    prices = market_store.query_prices("Onion", "Maharashtra", date.today() - timedelta(days=6))
+    assert len(prices) == 7
+    assert prices[0]["date"] == date.today().strftime("%d/%m/%Y")
+
+
+def test_interrupted_backfill_resumes_where_it_stopped(store):
+    market_store.sync_pair("Rice", "Punjab", "key", max_pages=3)
+    assert stored("Rice", "Punjab") == 30
+    row = sync_row("Rice", "Punjab")
+    assert row["backfill_offset"] == 30
+    store.requests = 0
+    market_store.sync_pair("Rice", "Punjab", "key", max_pages=2)
+    # One page to check for new records, one more of backfill
+    assert store.requests == 2
+    assert stored("Rice", "Punjab") == 40
+    market_store.sync_pair("Rice", "Punjab", "key")
+    assert stored("Rice", "Punjab") == 90
+    assert sync_row("Rice", "Punjab")["backfill_offset"] is None
+
+
+def test_only_recently_requested_pairs_stay_tracked(store, monkeypatch):
+    market_store.sync_pair("Wheat", "Maharashtra", "key")
+    market_store.sync_pair("Onion", "Punjab", "key")
+    market_store.ensure_pair("Wheat", "Maharashtra", "key")
+    assert market_store.tracked_pairs() == [("Wheat", "Maharashtra")]
+    monkeypatch.setattr(market_store, "MARKET_PAIR_IDLE_S", -1)
+    assert market_store.tracked_pairs() == []
@@ -0,0 +1,86 @@
+# backend/tests/test_news_feed.py
+import pytest
+
+import news_feed
+
+
+def upstream_article(title, url, description=None, source="Krishi Jagran"):
+    return {"title": title, "url": url, "description": description, "source": {"name": source},
+            "publishedAt": "2024-03-01T06:00:00Z"}
+
+
+PAYLOAD = {"status": "ok", "articles": [
+    upstream_article("Monsoon arrives early in Kerala", "https://news/1", "Good news for kharif sowing"),
+    upstream_article("Wheat procurement begins", "https://news/2", "MSP raised for rabi wheat"),
+    upstream_article("Wheat procurement begins", "https://news/2"),  # syndicated duplicate
+    upstream_article(None, "https://news/3"),
+    upstream_article("Onion prices fall", "https://news/4"),
+]}
+
+
+@pytest.fixture
+def feed(tmp_path, monkeypatch):
+    """news_feed with a fresh store on disk and a scripted upstream."""
+    responses = [PAYLOAD]
+    monkeypatch.setattr(news_feed, "store", news_feed.NewsStore(str(tmp_path / "news.json")))
+
+    def get_json(url, params=None, timeout=None):
+        response = responses.pop(0) if len(responses) > 1 else responses[0]
+        if isinstance(response, Exception):
+            raise response
+        return response
+
+    monkeypatch.setattr(news_feed.http_gateway, "get_json", get_json)
+    return responses
+
+
+def test_normalize_drops_untitled_and_duplicate_links():
+    articles = news_feed.normalize(PAYLOAD)
+    assert [a["link"] for a in articles] == ["https://news/1", "https://news/2", "https://news/4"]
+    assert articles[0]["source"] == "Krishi Jagran"
+
+
+def test_failed_refreshes_keep_the_stored_articles(feed):
+    feed[:] = [PAYLOAD, news_feed.http_gateway.UpstreamError("timeout"),
+               {"status": "error", "code": "rateLimited", "message": "Too many requests"}]
+    assert news_feed.refresh()
+    version = news_feed.store.version
+    assert not news_feed.refresh()
+    assert not news_feed.refresh()
+    assert news_feed.store.version == version
+    assert len(news_feed.store.articles) == 3
+
+
+def test_unchanged_feed_keeps_last_modified_and_survives_a_restart(feed):
+    news_feed.refresh()
+    modified_at = news_feed.store.modified_at
+    news_feed.store.checked_at = None
+    news_feed.refresh()
+    assert news_feed.store.modified_at == modified_at
+    assert news_feed.store.checked_at is not None
+
+    reloaded = news_feed.NewsStore(news_feed.store.path)
+    reloaded.load()
+    assert reloaded.snapshot() == news_feed.store.snapshot()
+
+
+def test_search_matches_every_word_and_pages(feed):
+    news_feed.refresh()
+    articles, total, _, _ = news_feed.search("WHEAT msp")
+    assert total == 1 and articles[0]["link"] == "https://news/2"
+    assert news_feed.search("wheat monsoon")[1] == 0
+    articles, total, _, _ = news_feed.search(None, page=2, per_page=2)
+    assert total == 3 and [a["link"] for a in articles] == ["https://news/4"]
+    # page 0 / negative sizes clamp instead of slicing from the end
+    assert [a["link"] for a in news_feed.search(None, page=0, per_page=-5)[0]] == ["https://news/1"]
+
+
+def test_news_endpoint_serves_the_store_with_conditional_gets(client, feed):
+    news_feed.refresh()
+    res = client.get("/news", query_string={"q": "kharif"})
+    assert res.status_code == 200
+    assert [a["link"] for a in res.get_json()["news"]] == ["https://news/1"]
+    again = client.get("/news", query_string={"q": "kharif"}, headers={"If-None-Match": res.headers["ETag"]})
+    assert again.status_code == 304
+    paged = client.get("/news", query_string={"page": 1, "per_page": 2}).get_json()
+    assert (paged["total"], len(paged["news"]), paged["per_page"]) == (3, 2, 2)
@@ -0,0 +1,102 @@
+# backend/tests/test_order_history.py
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import Column, DateTime, ForeignKey, Integer, String, create_engine
+from sqlalchemy.orm import Session, declarative_base
+
+import order_history
+
+Base = declarative_base()
+
+
+class Order(Base):
+    __tablename__ = "orders"
+    id = Column(String(36), primary_key=True)
+    buyer_id = Column(String(36))
+    created_at = Column(DateTime, nullable=True)
+
+
+class OrderItem(Base):
+    __tablename__ = "order_items"
+    id = Column(Integer, primary_key=True)
+    order_id = Column(String(36), ForeignKey("orders.id"))
+
+
+@pytest.fixture
+def session():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    with Session(engine) as s:
+        base = datetime(2024, 1, 1, 12, 0)
+        # Two orders share a timestamp so the id tie-break is exercised
+        dated = [("o1", base), ("o2", base + timedelta(hours=1)), ("o3", base + timedelta(hours=1)),
+                 ("o4", base + timedelta(hours=2)), ("o5", base + timedelta(hours=3))]
+        for oid, ts in dated:
+            s.add(Order(id=oid, buyer_id="alice", created_at=ts))
+        for oid in ("n1", "n2", "n3"):
+            s.add(Order(id=oid, buyer_id="alice", created_at=None))
+        s.add(Order(id="b1", buyer_id="bob", created_at=base))
+        for i, oid in enumerate(["o1", "o1", "o3", "n2"]):
+            s.add(OrderItem(id=i + 1, order_id=oid))
+        s.commit()
+        yield s
+
+
+EXPECTED = ["o5", "o4", "o3", "o2", "o1", "n3", "n2", "n1"]
+
+
+def load_page(session):
+    def load(limit, cursor):
+        return order_history.load_orders_sqlalchemy(session, Order, OrderItem, buyer_id="alice",
+                                                    limit=limit, cursor=cursor)
+    return load
+
+
+@pytest.mark.parametrize("size", [1, 2, 3, 5, 8, 50])
+def test_keyset_pages_cover_every_order_once_with_nulls_last(session, size):
+    seen = [o.id for o, _ in order_history.iter_pages(load_page(session), page_size=size)]
+    assert seen == EXPECTED
+
+
+def test_page_boundary_on_null_created_at(session):
+    load = load_page(session)
+    first, cursor = load(6, None)
+    assert [o.id for o, _ in first] == EXPECTED[:6]
+    # The cursor points at an undated order, so the next page is paged by id alone
+    assert order_history.decode_cursor(cursor) == (None, "n3")
+    rest, cursor = load(6, cursor)
+    assert [o.id for o, _ in rest] == ["n2", "n1"]
+    assert cursor is None
+
+
+def test_items_are_grouped_per_order(session):
+    page, _ = load_page(session)(50, None)
+    items = {o.id: [it.id for it in its] for o, its in page}
+    assert items["o1"] == [1, 2]
+    assert items["o3"] == [3]
+    assert items["n2"] == [4]
+    assert items["o5"] == []
+
+
+def test_cursor_round_trip():
+    ts = datetime(2024, 5, 6, 7, 8, 9, 123456)
+    assert order_history.decode_cursor(order_history.encode_cursor(ts, "abc")) == (ts, "abc")
+    assert order_history.decode_cursor(order_history.encode_cursor(None, "abc")) == (None, "abc")
+
+
+@pytest.mark.parametrize("cursor", ["not base64!", "bm9waXBl", "MjAyNC0xMy0wMXx4"])
+def test_malformed_cursor_is_rejected(cursor):
+    with pytest.raises(order_history.InvalidCursor):
+        order_history.decode_cursor(cursor)
+
+
+def test_iter_pages_stops_on_stalled_cursor():
+    calls = []
+
+    def load(limit, cursor):
+        calls.append(cursor)
+        return ["x"], "same"
+
+    assert list(order_history.iter_pages(load, page_size=1)) == ["x", "x"]
+    assert calls == [None, "same"]
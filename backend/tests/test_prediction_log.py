@@ -0,0 +1,67 @@
+# backend/tests/test_prediction_log.py
+import itertools
+
+import numpy as np
+import pytest
+
+import prediction_log
+
+_names = itertools.count()
+
+
+@pytest.fixture
+def make_log(tmp_path):
+    """A PredictionLog on its own SQLite file, with its own metric names."""
+    def make(**kwargs):
+        return prediction_log.PredictionLog(path=str(tmp_path / "predictions.db"),
+                                            name=f"test_prediction_log_{next(_names)}", **kwargs)
+    return make
+
+
+def test_records_are_written_in_batches_and_decoded(make_log):
+    log = make_log(batch_size=4, flush_interval_s=60)
+    for i in range(10):
+        assert log.record("crop", {"N": np.int64(i), "row": np.arange(2)}, {"p": np.float32(0.5)}, model_version=3)
+    assert log.flush(5)
+    assert log.written.value == 10
+    rows = prediction_log.recent(20, "crop", log.path)
+    assert len(rows) == 10
+    assert rows[0]["inputs"] == {"N": 9, "row": [0, 1]}
+    assert rows[0]["outputs"] == {"p": 0.5}
+    assert rows[0]["model_version"] == "3"
+    assert prediction_log.recent(20, "disease", log.path) == []
+
+
+def test_a_full_buffer_drops_new_records_instead_of_blocking(make_log):
+    log = make_log(max_pending=3, batch_size=100, flush_interval_s=60)
+    assert log.record_many("crop_batch", [({"i": i}, {}) for i in range(5)]) == 3
+    assert not log.record("crop", {}, {})
+    assert log.dropped.value == 3
+    assert log.flush(5)
+    assert [r["inputs"]["i"] for r in prediction_log.recent(10, path=log.path)] == [2, 1, 0]
+    # Room again once the writer has drained the buffer
+    assert log.record("crop", {}, {})
+
+
+def test_soil_season_advice_is_logged_apart_from_model_predictions(monkeypatch, make_log):
+    import db_utils
+
+    log = make_log(flush_interval_s=60)
+    monkeypatch.setattr(prediction_log, "record", log.record)
+    db_utils.save_prediction({"soil_type": "loamy", "season": "kharif", "temperature": 30, "humidity": 70,
+                              "suggested_crop": "rice", "water_needs": "high", "pest_warning": None})
+    assert log.flush(5)
+    assert prediction_log.recent(10, "crop", log.path) == []
+    [row] = prediction_log.recent(10, "crop_advice", log.path)
+    assert row["outputs"]["suggested_crop"] == "rice"
+
+
+def test_crop_endpoint_logs_its_prediction(client):
+    body = {"N": 20, "P": 15, "K": 20, "temperature": 18.0, "humidity": 40.0, "ph": 5.5, "rainfall": 60}
+    res = client.post("/api/predict-crop", json=body)
+    assert res.status_code == 200
+    assert prediction_log.flush(5)
+    entry = prediction_log.recent(1, "crop")[0]
+    assert entry["inputs"] == {k: float(v) for k, v in body.items()}
+    assert entry["outputs"]["recommendations"][0]["crop"] == res.get_json()["suggested_crop"]
+    assert entry["model_version"] == "test-1"
@@ -0,0 +1,78 @@
+# backend/tests/test_product_search.py
+import time
+import uuid
+
+import pytest
+
+import product_search
+
+
+@pytest.fixture
+def add_products(app_module):
+    import ecommerce
+
+    def add(*titles):
+        tag = uuid.uuid4().hex[:8]
+        with app_module.app.app_context():
+            for title in titles:
+                ecommerce.db.session.add(
+                    ecommerce.Product(title=f"{title} {tag}", price=10.0, stock=5))
+            ecommerce.db.session.commit()
+        return tag
+    return add
+
+
+def titles(res):
+    return sorted(p["title"].rsplit(" ", 1)[0] for p in res.get_json()["products"])
+
+
+def test_phonetic_keys_fold_romanization_variants():
+    assert product_search.phonetic("khaad") == product_search.phonetic("khad") == "kad"
+    assert product_search.phonetic("beej") == product_search.phonetic("bij") == "bij"
+    assert product_search.phonetic("बीज") == "बीज"
+
+
+@pytest.mark.parametrize("query", ["beej", "bij"])
+def test_search_matches_both_spellings(client, add_products, query):
+    tag = add_products("Beej packet", "Bij packet", "Urea sack")
+    res = client.get(f"/api/products?q={query} {tag}")
+    assert res.status_code == 200
+    assert titles(res) == ["Beej packet", "Bij packet"]
+    assert res.get_json()["total"] == 2
+
+
+def test_search_is_ranked_prefix_match_and_requires_every_word(client, add_products):
+    tag = add_products("Neem oil spray", "Neem cake", "Mustard oil")
+    assert titles(client.get(f"/api/products?q=nee {tag}")) == ["Neem cake", "Neem oil spray"]
+    assert titles(client.get(f"/api/products?q=neem oil {tag}")) == ["Neem oil spray"]
+
+
+def test_description_edits_are_reindexed(client, add_products, app_module):
+    import ecommerce
+
+    tag = add_products("Seed drill")
+    assert titles(client.get(f"/api/products?q=zinc {tag}")) == []
+    with app_module.app.app_context():
+        p = ecommerce.Product.query.filter(ecommerce.Product.title.like(f"%{tag}")).one()
+        p.description = "Zinc coated tines"
+        ecommerce.db.session.commit()
+    assert titles(client.get(f"/api/products?q=zinc {tag}")) == ["Seed drill"]
+
+
+def test_total_is_reported_past_the_last_page(client, add_products):
+    tag = add_products("Drip pipe", "Drip emitter", "Drip valve")
+    res = client.get(f"/api/products?q=drip {tag}&page=5&per_page=2").get_json()
+    assert res["products"] == []
+    assert res["total"] == 3
+
+
+def test_autosuggest_matches_phonetic_variants(client, add_products, monkeypatch):
+    monkeypatch.setattr(product_search, "SEARCH_GENERATION_CHECK_S", 0)
+    tag = add_products("Khad mix", "Khaad premium")
+    # The first build is synchronous; later ones swap in from a background thread
+    for _ in range(100):
+        got = client.get(f"/api/search-autosuggest?q={tag} khaa").get_json()["suggestions"]
+        if len(got) == 2:
+            break
+        time.sleep(0.01)
+    assert sorted(s["title"] for s in got) == [f"Khaad premium {tag}", f"Khad mix {tag}"]
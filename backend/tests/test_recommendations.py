@@ -0,0 +1,84 @@
+# backend/tests/test_recommendations.py
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import text
+
+import recommendations
+
+
+@pytest.fixture
+def shop(app_module, client, new_product):
+    """Three products plus helpers to buy baskets of them and read the model back."""
+    import ecommerce
+
+    ids = {name: new_product(title=f"Recs {name}", stock=100) for name in "abc"}
+
+    def buy(*names):
+        res = client.post("/api/checkout", json={"items": [{"product_id": ids[n], "qty": 1} for n in names]})
+        assert res.status_code == 201
+
+    def run(fn):
+        with app_module.app.app_context():
+            return fn(ecommerce.db.engine, ecommerce.Order, ecommerce.OrderItem)
+
+    def neighbors(name):
+        with app_module.app.app_context():
+            return [p.title for p in recommendations.neighbors(ecommerce.db.session, ecommerce.Product, ids[name])]
+
+    def count(x, y):
+        with app_module.app.app_context(), ecommerce.db.engine.connect() as conn:
+            return conn.execute(text("SELECT count FROM co_purchase WHERE product_id = :a AND other_id = :b"),
+                                {"a": ids[x], "b": ids[y]}).scalar()
+
+    return ids, buy, run, neighbors, count
+
+
+def test_full_build_ranks_neighbours_by_co_purchases(client, shop):
+    ids, buy, run, neighbors, count = shop
+    buy("a", "b")
+    buy("a", "b", "b")  # a repeated line still counts the order once
+    buy("a", "c")
+    run(recommendations.build_full)
+    assert count("a", "b") == 2 and count("b", "a") == 2 and count("a", "c") == 1
+    assert neighbors("a") == ["Recs b", "Recs c"]
+    assert neighbors("b") == ["Recs a"]
+    fbt = client.get(f"/api/products/{ids['a']}").get_json()["frequently_bought_together"]
+    assert [p["title"] for p in fbt] == ["Recs b", "Recs c"]
+
+
+def test_incremental_update_folds_each_new_order_once(shop):
+    ids, buy, run, neighbors, count = shop
+    buy("a", "b")
+    buy("a", "b")
+    buy("a", "c")
+    run(recommendations.build_full)
+
+    buy("a", "c")
+    buy("a", "c")
+    assert run(recommendations.update_incremental) == 2
+    assert count("a", "c") == 3
+    assert neighbors("a") == ["Recs c", "Recs b"]
+    assert run(recommendations.update_incremental) == 0
+    assert count("a", "c") == 3
+
+
+def test_late_committed_orders_inside_the_window_are_still_counted(app_module, shop):
+    import ecommerce
+
+    ids, buy, run, neighbors, count = shop
+    buy("b", "c")
+    run(recommendations.build_full)
+    assert count("b", "c") == 1
+
+    # created_at comes from flush time, so a slow transaction can land behind the watermark
+    with app_module.app.app_context():
+        order = ecommerce.Order(buyer_id="late", created_at=datetime.utcnow() - timedelta(seconds=5))
+        ecommerce.db.session.add(order)
+        ecommerce.db.session.flush()
+        ecommerce.db.session.add_all([ecommerce.OrderItem(order_id=order.id, product_id=ids[n]) for n in "bc"])
+        ecommerce.db.session.commit()
+    assert run(recommendations.update_incremental) == 1
+    assert count("b", "c") == 2
+    run(recommendations.update_incremental)
+    assert count("b", "c") == 2
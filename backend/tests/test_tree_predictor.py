@@ -0,0 +1,102 @@
+# backend/tests/test_tree_predictor.py
+import numpy as np
+import pytest
+
+import tree_predictor
+from conftest import CROP_FEATURES
+
+
+@pytest.fixture(scope="module")
+def data(crop_dataset):
+    _, X, y = crop_dataset
+    labels = np.unique(y, return_inverse=True)[1]
+    return X, labels
+
+
+def assert_matches(compiled, model, X):
+    np.testing.assert_allclose(compiled.predict_proba(X), model.predict_proba(X), atol=1e-5)
+
+
+@pytest.mark.parametrize("name", ["RandomForestClassifier", "ExtraTreesClassifier", "HistGradientBoostingClassifier"])
+def test_sklearn_ensembles_compile_to_the_same_probabilities(data, name):
+    import sklearn.ensemble
+
+    X, y = data
+    kwargs = {"max_iter": 20} if name == "HistGradientBoostingClassifier" else {"n_estimators": 15}
+    model = getattr(sklearn.ensemble, name)(random_state=0, **kwargs).fit(X, y)
+    assert_matches(tree_predictor.compile_model(model), model, X)
+
+
+@pytest.mark.parametrize("as_frame", [False, True])
+def test_xgboost_compiles_with_or_without_feature_names(data, as_frame):
+    xgboost = pytest.importorskip("xgboost")
+    import pandas as pd
+
+    X, y = data
+    fit_X = pd.DataFrame(X, columns=CROP_FEATURES) if as_frame else X
+    model = xgboost.XGBClassifier(n_estimators=10, max_depth=3, tree_method="hist").fit(fit_X, y)
+    compiled = tree_predictor.compile_model(model)
+    np.testing.assert_allclose(compiled.predict_proba(X), model.predict_proba(fit_X), atol=1e-5)
+
+
+def test_reference_row_spans_unused_trailing_features(data):
+    xgboost = pytest.importorskip("xgboost")
+
+    X, y = data
+    # The last column is constant, so no split ever uses it
+    X = np.hstack([X, np.ones((len(X), 1))])
+    model = xgboost.XGBClassifier(n_estimators=5, max_depth=2).fit(X, y)
+    compiled = tree_predictor.compile_model(model)
+    assert compiled.feature.max() < X.shape[1] - 1
+    assert_matches(compiled, model, X)
+
+
+def test_missing_values_follow_the_default_direction(data):
+    from sklearn.ensemble import HistGradientBoostingClassifier
+
+    X, y = data
+    X = X.copy()
+    X[::7, 3] = np.nan
+    model = HistGradientBoostingClassifier(max_iter=10, random_state=0).fit(X, y)
+    assert_matches(tree_predictor.compile_model(model), model, X)
+
+
+def test_unsupported_models_raise_tree_compile_error(data):
+    from sklearn.neighbors import KNeighborsClassifier
+
+    X, y = data
+    with pytest.raises(tree_predictor.TreeCompileError):
+        tree_predictor.compile_model(KNeighborsClassifier().fit(X, y))
+
+
+def test_small_batch_predictor_routes_by_size(data):
+    from sklearn.ensemble import RandomForestClassifier
+
+    X, y = data
+    model = RandomForestClassifier(n_estimators=5, random_state=0).fit(X, y)
+    calls = []
+
+    class Spy:
+        classes_ = model.classes_
+
+        def predict_proba(self, X):
+            calls.append(len(X))
+            return model.predict_proba(X)
+
+    predictor = tree_predictor.SmallBatchPredictor(tree_predictor.compile_model(model), Spy(), max_rows=4)
+    predictor.predict_proba(X[:4])
+    assert calls == []
+    predictor.predict_proba(X[:5])
+    assert calls == [5]
+
+
+def test_app_serves_the_model_uncompiled_when_compiling_fails(app_module, crop_files, monkeypatch):
+    model, _, _ = crop_files
+    monkeypatch.setattr(app_module, "CROP_PREDICTOR", "compiled")
+    assert isinstance(app_module._crop_predictor(model), tree_predictor.SmallBatchPredictor)
+
+    def broken(model, reference_X=None):
+        raise ValueError("data did not contain feature names")
+
+    monkeypatch.setattr(tree_predictor, "compile_model", broken)
+    assert app_module._crop_predictor(model) is model
@@ -0,0 +1,99 @@
+# backend/tests/test_weather_cache.py
+import threading
+import time
+
+import pytest
+
+import weather_cache
+from weather_cache import SingleFlight, SWRCache
+
+
+def wait_for(predicate, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.01)
+    return predicate()
+
+
+def test_single_flight_collapses_concurrent_calls():
+    flight = SingleFlight()
+    calls = []
+    release = threading.Event()
+
+    def fetch():
+        calls.append(1)
+        release.wait(2)
+        return "value"
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(flight.do("k", fetch))) for _ in range(20)]
+    for t in threads:
+        t.start()
+    assert wait_for(lambda: len(calls) == 1)
+    time.sleep(0.05)  # give the followers time to join the call
+    release.set()
+    for t in threads:
+        t.join(2)
+    assert len(calls) == 1
+    assert results == ["value"] * 20
+
+
+def test_single_flight_shares_errors_and_forgets_the_call():
+    flight = SingleFlight()
+    with pytest.raises(weather_cache.WeatherUnavailable):
+        flight.do("k", lambda: (_ for _ in ()).throw(weather_cache.WeatherUnavailable("down")))
+    assert flight.do("k", lambda: 42) == 42
+
+
+def test_concurrent_misses_fetch_once():
+    cache = SWRCache("test_weather.miss", ttl=60)
+    calls = []
+
+    def fetch():
+        calls.append(1)
+        time.sleep(0.1)
+        return {"temp": 25}
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cache.get("pune", fetch))) for _ in range(20)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join(2)
+    assert len(calls) == 1
+    assert results == [{"temp": 25}] * 20
+
+
+def test_stale_hits_trigger_one_background_refresh():
+    cache = SWRCache("test_weather.stale", ttl=0.05, stale=60)
+    cache.get("pune", lambda: "old")
+    time.sleep(0.06)
+
+    calls = []
+    release = threading.Event()
+
+    def refresh():
+        calls.append(1)
+        release.wait(2)
+        return "new"
+
+    # Every stale read returns at once with the old value; only one refresh is queued
+    assert [cache.get("pune", refresh) for _ in range(50)] == ["old"] * 50
+    release.set()
+    assert wait_for(lambda: cache.get("pune", refresh) == "new")
+    assert len(calls) == 1
+
+
+def test_stale_value_served_when_refresh_fails():
+    cache = SWRCache("test_weather.error", ttl=0.01, stale=0)
+    cache.get("pune", lambda: "old")
+    time.sleep(0.02)
+
+    def down():
+        raise weather_cache.WeatherUnavailable("upstream down")
+
+    assert cache.get("pune", down) == "old"
+    with pytest.raises(weather_cache.WeatherUnavailable):
+        cache.get("mumbai", down)
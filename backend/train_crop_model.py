@@ -1,18 +1,210 @@
-import pandas as pd
-from sklearn.model_selection import train_test_split
-from sklearn.ensemble import RandomForestClassifier
+# backend/train_crop_model.py
+# Trains the crop recommendation model that app.py actually serves: the 7
+# features of crop_dataset.csv (N, P, K, temperature, humidity, ph, rainfall).
+#  - randomized hyperparameter search per candidate (RandomForest, XGBoost,
+#    LightGBM or, if it isn't installed, sklearn's histogram GBM in the same
+#    style), every (candidate, params) CV run in a process pool across all cores
+#  - benchmark of the tuned candidates: CV / held-out accuracy, train time,
+#    predict_proba latency for one row and for a 10k batch, serialized size
+#  - the winner is refit on all rows and saved with its LabelEncoder as one
+#    versioned bundle: artifacts/crop_model-<version>.joblib, then atomically
+#    copied to crop_model_bundle.joblib, which app.py hot-reloads
+#
+#   python train_crop_model.py --candidates rf,xgb,lgbm --search-iter 20
+import argparse
+import hashlib
+import io
+import json
+import os
+import shutil
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+
 import joblib
+import numpy as np
+import pandas as pd
+from sklearn.ensemble import HistGradientBoostingClassifier, RandomForestClassifier
+from sklearn.model_selection import ParameterSampler, StratifiedKFold, cross_val_score, train_test_split
+from sklearn.preprocessing import LabelEncoder
+
+FEATURES = ["N", "P", "K", "temperature", "humidity", "ph", "rainfall"]
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+# --- Candidates ---
+def _xgb(**params):
+    from xgboost import XGBClassifier
+    return XGBClassifier(n_jobs=1, tree_method="hist", eval_metric="mlogloss", **params)
+
+
+def _lgbm(**params):
+    try:
+        from lightgbm import LGBMClassifier
+        return LGBMClassifier(n_jobs=1, verbose=-1, **params)
+    except ImportError:
+        # Same histogram-based leaf-wise GBM idea, no extra dependency
+        return HistGradientBoostingClassifier(
+            max_iter=params["n_estimators"], learning_rate=params["learning_rate"],
+            max_leaf_nodes=params["num_leaves"], min_samples_leaf=params["min_child_samples"],
+            random_state=params.get("random_state")
+        )
+
+
+CANDIDATES = {
+    "rf": (
+        lambda **p: RandomForestClassifier(n_jobs=1, **p),
+        {"n_estimators": [100, 200, 400], "max_depth": [None, 10, 20, 30],
+         "min_samples_leaf": [1, 2, 4], "max_features": ["sqrt", "log2", None]},
+    ),
+    "xgb": (
+        _xgb,
+        {"n_estimators": [100, 200, 400], "max_depth": [3, 4, 6, 8], "learning_rate": [0.03, 0.1, 0.3],
+         "subsample": [0.7, 0.85, 1.0], "colsample_bytree": [0.7, 0.85, 1.0]},
+    ),
+    "lgbm": (
+        _lgbm,
+        {"n_estimators": [100, 200, 400], "learning_rate": [0.03, 0.1, 0.3],
+         "num_leaves": [15, 31, 63], "min_child_samples": [5, 10, 20]},
+    ),
+}
+
+
+def make_model(name, params, seed):
+    return CANDIDATES[name][0](random_state=seed, **params)
+
+
+def _cv_score(job):
+    # Runs in a worker process; each model is single-threaded so the pool owns the cores
+    name, params, X, y, folds, seed = job
+    started = time.perf_counter()
+    scores = cross_val_score(make_model(name, params, seed), X, y,
+                             cv=StratifiedKFold(folds, shuffle=True, random_state=seed))
+    return name, params, float(scores.mean()), time.perf_counter() - started
+
+
+def search(X, y, names, n_iter, folds, seed, jobs):
+    """Best (params, cv accuracy) per candidate."""
+    work = [
+        (name, params, X, y, folds, seed)
+        for name in names
+        for params in ParameterSampler(CANDIDATES[name][1], n_iter=n_iter, random_state=seed)
+    ]
+    best = {}
+    started = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        for name, params, score, took in pool.map(_cv_score, work):
+            if name not in best or score > best[name][1]:
+                best[name] = (params, score)
+    print(f"✓ Searched {len(work)} configurations ({folds}-fold CV) on {jobs} processes "
+          f"in {time.perf_counter() - started:.1f}s")
+    return best
+
+
+# --- Benchmark ---
+def _median_ms(fn, runs):
+    fn()  # warm-up
+    timings = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - started) * 1000)
+    return float(np.median(timings))
+
+
+def benchmark(name, params, cv_score, X_train, y_train, X_test, y_test, seed, runs):
+    model = make_model(name, params, seed)
+    started = time.perf_counter()
+    model.fit(X_train, y_train)
+    train_s = time.perf_counter() - started
+    batch = np.resize(X_test, (10_000, X_test.shape[1]))
+    buf = io.BytesIO()
+    joblib.dump(model, buf)
+    return {
+        "candidate": name,
+        "estimator": type(model).__name__,
+        "params": params,
+        "cv_accuracy": round(cv_score, 4),
+        "test_accuracy": round(float((model.predict(X_test) == y_test).mean()), 4),
+        "train_s": round(train_s, 3),
+        "row_ms": round(_median_ms(lambda: model.predict_proba(X_test[:1]), runs), 3),
+        "batch_10k_ms": round(_median_ms(lambda: model.predict_proba(batch), max(3, runs // 20)), 1),
+        "size_mb": round(len(buf.getvalue()) / 1e6, 2),
+    }
+
+
+def print_table(results):
+    cols = ["candidate", "estimator", "cv_accuracy", "test_accuracy", "train_s", "row_ms", "batch_10k_ms", "size_mb"]
+    widths = [max(len(c), *(len(str(r[c])) for r in results)) for c in cols]
+    print("  ".join(f"{c:>{w}}" for c, w in zip(cols, widths)))
+    for r in results:
+        print("  ".join(f"{str(r[c]):>{w}}" for c, w in zip(cols, widths)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Train and benchmark the 7-feature crop model")
+    parser.add_argument("--data", default=os.path.join(HERE, "crop_dataset.csv"))
+    parser.add_argument("--candidates", default="rf,xgb,lgbm")
+    parser.add_argument("--search-iter", type=int, default=20, help="Random configurations per candidate")
+    parser.add_argument("--folds", type=int, default=5)
+    parser.add_argument("--jobs", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--test-size", type=float, default=0.2)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--latency-runs", type=int, default=200)
+    parser.add_argument("--select", default=None, help="Candidate to ship (default: best CV accuracy)")
+    parser.add_argument("--artifacts", default=os.path.join(HERE, "artifacts"))
+    parser.add_argument("--bundle", default=os.path.join(HERE, "crop_model_bundle.joblib"))
+    parser.add_argument("--benchmark-only", action="store_true", help="Don't write a bundle")
+    args = parser.parse_args()
+
+    df = pd.read_csv(args.data).dropna()
+    X = df[FEATURES].to_numpy(dtype=np.float64)
+    encoder = LabelEncoder()
+    y = encoder.fit_transform(df["label"])
+    X_train, X_test, y_train, y_test = train_test_split(
+        X, y, test_size=args.test_size, stratify=y, random_state=args.seed
+    )
+    print(f"Loaded {len(df)} rows, {len(encoder.classes_)} crops from {args.data}")
+
+    names = [n.strip() for n in args.candidates.split(",") if n.strip()]
+    best = search(X_train, y_train, names, args.search_iter, args.folds, args.seed, args.jobs)
+    results = [
+        benchmark(name, *best[name], X_train, y_train, X_test, y_test, args.seed, args.latency_runs)
+        for name in names
+    ]
+    print_table(results)
 
-df = pd.read_csv('Crop_recommendation.csv')
+    version = datetime.now(timezone.utc).strftime("%Y%m%d-%H%M%S")
+    os.makedirs(args.artifacts, exist_ok=True)
+    with open(os.path.join(args.artifacts, f"crop_benchmark-{version}.json"), "w") as f:
+        json.dump(results, f, indent=2)
+    if args.benchmark_only:
+        return
 
-# NaN values hatao
-df = df.dropna()
+    chosen = next(r for r in results if r["candidate"] == args.select) if args.select else \
+        max(results, key=lambda r: (r["cv_accuracy"], -r["row_ms"]))
+    model = make_model(chosen["candidate"], chosen["params"], args.seed).fit(X, y)
+    with open(args.data, "rb") as f:
+        data_sha1 = hashlib.sha1(f.read()).hexdigest()
+    bundle = {
+        "model": model,
+        "encoder": encoder,
+        "features": FEATURES,
+        "version": version,
+        "trained_at": datetime.now(timezone.utc).isoformat(),
+        "data_sha1": data_sha1,
+        "metrics": chosen,
+    }
+    versioned = os.path.join(args.artifacts, f"crop_model-{version}.joblib")
+    joblib.dump(bundle, versioned)
+    # Copy then rename, so a serving process never reads a half-written bundle
+    tmp = f"{args.bundle}.tmp"
+    shutil.copyfile(versioned, tmp)
+    os.replace(tmp, args.bundle)
+    print(f"✅ {chosen['estimator']} (cv {chosen['cv_accuracy']}, test {chosen['test_accuracy']}) "
+          f"saved as {versioned} -> {args.bundle}")
+    print("   Rebuild the lookup table for it: python crop_lookup.py")
 
-X = df[['soil', 'temperature', 'humidity']]
-y = df['label']
 
-X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
-model = RandomForestClassifier()
-model.fit(X_train, y_train)
-print("Accuracy:", model.score(X_test, y_test))
-joblib.dump(model, 'crop_model.pkl')
\ No newline at end of file
+if __name__ == "__main__":
+    main()
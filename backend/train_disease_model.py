@@ -1,11 +1,15 @@
+import argparse
+import hashlib
+import json
+import os
+import random
+import time
+
 import tensorflow as tf
-from tensorflow.keras.preprocessing.image import ImageDataGenerator
 from tensorflow.keras.applications import MobileNetV2
 from tensorflow.keras.layers import Dense, GlobalAveragePooling2D
 from tensorflow.keras.models import Model
 import joblib
-from PIL import Image
-import os
 
 # --- GPU Memory Setup ---
 gpus = tf.config.list_physical_devices('GPU')
@@ -19,78 +23,223 @@ if gpus:
     except RuntimeError as e:
         print(e)
 
-# --- Dataset Path ---
-dataset_path = r"D:\dataset"
-
-# --- Parameters ---
-img_size = 224
-batch_size = 16  # Reduced for lower GPU memory
-
-# --- Image Generator with Data Augmentation ---
-train_datagen = ImageDataGenerator(
-    rescale=1./255,
-    validation_split=0.20,
-    rotation_range=20,
-    zoom_range=0.2,
-    horizontal_flip=True
-)
-
-# --- Helper function to convert images to RGB ---
-def preprocess_image(file_path):
-    img = Image.open(file_path)
-    if img.mode != 'RGB':
-        img = img.convert('RGB')
-    return img
-
-# --- Flow From Directory ---
-train_gen = train_datagen.flow_from_directory(
-    dataset_path,
-    target_size=(img_size, img_size),
-    batch_size=batch_size,
-    class_mode='categorical',
-    subset='training'
-)
-
-val_gen = train_datagen.flow_from_directory(
-    dataset_path,
-    target_size=(img_size, img_size),
-    batch_size=batch_size,
-    class_mode='categorical',
-    subset='validation'
-)
-
-# --- Model Setup ---
-base_model = MobileNetV2(
-    input_shape=(img_size, img_size, 3),
-    include_top=False,
-    weights='imagenet'
-)
-base_model.trainable = False
-
-x = base_model.output
-x = GlobalAveragePooling2D()(x)
-output_layer = Dense(train_gen.num_classes, activation='softmax')(x)
-
-model = Model(inputs=base_model.input, outputs=output_layer)
-
-model.compile(
-    optimizer='adam',
-    loss='categorical_crossentropy',
-    metrics=['accuracy']
-)
-
-# --- Training ---
-print("Training started...")
-history = model.fit(
-    train_gen,
-    validation_data=val_gen,
-    epochs=10
-)
-
-# --- Save Model & Labels ---
-model.save("disease_cnn_model.h5")
-joblib.dump(train_gen.class_indices, "labels.pkl")
-
-print("✅ Model saved as disease_cnn_model.h5")
-print("✅ Labels saved as labels.pkl")
-print("Training completed.")
+AUTOTUNE = tf.data.AUTOTUNE
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Train the MobileNetV2 disease classifier")
+    parser.add_argument("--dataset", default=os.environ.get("DISEASE_DATASET", r"D:\dataset"),
+                        help="Class-per-folder image directory")
+    parser.add_argument("--img-size", type=int, default=224)
+    parser.add_argument("--batch-size", type=int, default=16)
+    parser.add_argument("--epochs", type=int, default=10)
+    parser.add_argument("--val-split", type=float, default=0.20)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--deterministic", action="store_true",
+                        help="Bit-reproducible runs (enables TF op determinism; slower)")
+    parser.add_argument("--cache-dir", default=os.path.join("data", "disease_tfrecords"),
+                        help="Where resized images are cached as TFRecord shards")
+    parser.add_argument("--no-cache", action="store_true", help="Decode from the source images every epoch")
+    parser.add_argument("--shards", type=int, default=16)
+    parser.add_argument("--weights", default="imagenet", help="MobileNetV2 weights ('imagenet' or 'none')")
+    parser.add_argument("--output", default="disease_cnn_model.h5")
+    parser.add_argument("--labels", default="labels.pkl")
+    parser.add_argument("--no-tflite", action="store_true", help="Skip the TFLite export")
+    parser.add_argument("--no-int8", action="store_true", help="Skip the int8 TFLite export")
+    parser.add_argument("--calibration-samples", type=int, default=200,
+                        help="Images used to calibrate int8 activation ranges")
+    return parser.parse_args()
+
+
+# --- File Listing / Split ---
+def list_images(dataset_path):
+    """Sorted class names (same order flow_from_directory used) and (path, class index) pairs."""
+    classes = sorted(d for d in os.listdir(dataset_path) if os.path.isdir(os.path.join(dataset_path, d)))
+    files = []
+    for i, c in enumerate(classes):
+        folder = os.path.join(dataset_path, c)
+        files += [(os.path.join(folder, f), i) for f in sorted(os.listdir(folder))
+                  if f.lower().endswith(IMAGE_EXTENSIONS)]
+    return classes, files
+
+
+def split(files, val_split, seed):
+    """Seeded, stratified train/validation split."""
+    rng = random.Random(seed)
+    train, val = [], []
+    for label in sorted({y for _, y in files}):
+        group = [f for f in files if f[1] == label]
+        rng.shuffle(group)
+        n_val = int(round(len(group) * val_split))
+        val += group[:n_val]
+        train += group[n_val:]
+    return train, val
+
+
+# --- Decode / TFRecord Cache ---
+def decode_resize(path, label, img_size):
+    img = tf.io.decode_image(tf.io.read_file(path), channels=3, expand_animations=False)
+    img = tf.image.resize(img, (img_size, img_size))
+    return tf.cast(tf.round(img), tf.uint8), label
+
+
+def source_dataset(files, img_size):
+    paths, labels = zip(*files)
+    ds = tf.data.Dataset.from_tensor_slices((list(paths), list(labels)))
+    return ds.map(lambda p, y: decode_resize(p, y, img_size), num_parallel_calls=AUTOTUNE, deterministic=True)
+
+
+def _serialize(img, label):
+    example = tf.train.Example(features=tf.train.Features(feature={
+        "image": tf.train.Feature(bytes_list=tf.train.BytesList(value=[img.numpy().tobytes()])),
+        "label": tf.train.Feature(int64_list=tf.train.Int64List(value=[int(label)])),
+    }))
+    return example.SerializeToString()
+
+
+def cached_dataset(files, img_size, cache_dir, name, n_shards):
+    """
+    Resized uint8 images in TFRecord shards, written once per (file list, size).
+    Later epochs and later runs read raw pixels back with no JPEG decode or resize.
+    """
+    key = hashlib.sha1(json.dumps([img_size, files]).encode()).hexdigest()[:12]
+    folder = os.path.join(cache_dir, f"{name}-{img_size}-{key}")
+    shards = [os.path.join(folder, f"{i:03d}.tfrecord") for i in range(n_shards)]
+    done = os.path.join(folder, "COMPLETE")
+
+    if not os.path.exists(done):
+        os.makedirs(folder, exist_ok=True)
+        started = time.perf_counter()
+        writers = [tf.io.TFRecordWriter(s) for s in shards]
+        for i, (img, label) in enumerate(source_dataset(files, img_size).prefetch(AUTOTUNE)):
+            writers[i % n_shards].write(_serialize(img, label))
+        for w in writers:
+            w.close()
+        open(done, "w").close()
+        print(f"✅ Cached {len(files)} {name} images to {folder} in {time.perf_counter() - started:.1f}s")
+
+    spec = {"image": tf.io.FixedLenFeature([], tf.string), "label": tf.io.FixedLenFeature([], tf.int64)}
+
+    def parse(record):
+        ex = tf.io.parse_single_example(record, spec)
+        img = tf.reshape(tf.io.decode_raw(ex["image"], tf.uint8), (img_size, img_size, 3))
+        return img, tf.cast(ex["label"], tf.int32)
+
+    return tf.data.TFRecordDataset(shards, num_parallel_reads=AUTOTUNE).map(parse, num_parallel_calls=AUTOTUNE)
+
+
+def augmenter(seed):
+    # Same augmentations as the old ImageDataGenerator (rotation 20°, zoom 0.2, horizontal flip)
+    return tf.keras.Sequential([
+        tf.keras.layers.RandomFlip("horizontal", seed=seed),
+        tf.keras.layers.RandomRotation(20 / 360, seed=seed),
+        tf.keras.layers.RandomZoom(0.2, seed=seed),
+    ])
+
+
+def build_pipeline(ds, n_classes, batch_size, seed, augment=None, shuffle_buffer=None):
+    if shuffle_buffer:
+        ds = ds.shuffle(shuffle_buffer, seed=seed, reshuffle_each_iteration=True)
+    ds = ds.batch(batch_size, num_parallel_calls=AUTOTUNE)
+
+    def prepare(img, label):
+        x = tf.cast(img, tf.float32) / 255.0
+        if augment is not None:
+            x = augment(x, training=True)
+        return x, tf.one_hot(label, n_classes)
+
+    return ds.map(prepare, num_parallel_calls=AUTOTUNE).prefetch(AUTOTUNE)
+
+
+class Throughput(tf.keras.callbacks.Callback):
+    """Prints training images/sec per epoch (input pipeline + forward/backward)."""
+
+    def __init__(self, n_images):
+        super().__init__()
+        self.n_images = n_images
+
+    def on_epoch_begin(self, epoch, logs=None):
+        self.started = time.perf_counter()
+
+    def on_train_batch_end(self, batch, logs=None):
+        self.train_end = time.perf_counter()
+
+    def on_epoch_end(self, epoch, logs=None):
+        train_s = self.train_end - self.started
+        print(f"⏱ Epoch {epoch + 1}: {self.n_images / train_s:.1f} images/sec "
+              f"({train_s:.1f}s train, {time.perf_counter() - self.started:.1f}s incl. validation)")
+
+
+def main():
+    args = parse_args()
+    tf.keras.utils.set_random_seed(args.seed)
+    if args.deterministic:
+        tf.config.experimental.enable_op_determinism()
+
+    classes, files = list_images(args.dataset)
+    train_files, val_files = split(files, args.val_split, args.seed)
+    print(f"Found {len(files)} images in {len(classes)} classes ({len(train_files)} train / {len(val_files)} val)")
+
+    if args.no_cache:
+        train_ds, val_ds = source_dataset(train_files, args.img_size), source_dataset(val_files, args.img_size)
+    else:
+        train_ds = cached_dataset(train_files, args.img_size, args.cache_dir, "train", args.shards)
+        val_ds = cached_dataset(val_files, args.img_size, args.cache_dir, "val", max(1, args.shards // 4))
+
+    options = tf.data.Options()
+    options.deterministic = args.deterministic
+    train_ds = build_pipeline(train_ds, len(classes), args.batch_size, args.seed, augmenter(args.seed),
+                              shuffle_buffer=min(len(train_files), 10000)).with_options(options)
+    val_ds = build_pipeline(val_ds, len(classes), args.batch_size, args.seed)
+
+    # --- Model Setup ---
+    base_model = MobileNetV2(
+        input_shape=(args.img_size, args.img_size, 3),
+        include_top=False,
+        weights=None if args.weights == "none" else args.weights
+    )
+    base_model.trainable = False
+
+    x = base_model.output
+    x = GlobalAveragePooling2D()(x)
+    output_layer = Dense(len(classes), activation='softmax')(x)
+
+    model = Model(inputs=base_model.input, outputs=output_layer)
+
+    model.compile(
+        optimizer='adam',
+        loss='categorical_crossentropy',
+        metrics=['accuracy']
+    )
+
+    # --- Training ---
+    print("Training started...")
+    model.fit(
+        train_ds,
+        validation_data=val_ds,
+        epochs=args.epochs,
+        callbacks=[Throughput(len(train_files))]
+    )
+
+    # --- Save Model & Labels ---
+    model.save(args.output)
+    joblib.dump({c: i for i, c in enumerate(classes)}, args.labels)
+
+    print(f"✅ Model saved as {args.output}")
+    print(f"✅ Labels saved as {args.labels}")
+
+    # --- TFLite Export (CPU serving, DISEASE_RUNTIME=tflite) ---
+    if not args.no_tflite:
+        from disease_runtime import export_tflite, calibration_images
+        stem = os.path.splitext(args.output)[0]
+        export_tflite(model, f"{stem}.tflite")
+        if not args.no_int8:
+            export_tflite(model, f"{stem}_int8.tflite",
+                          representative=calibration_images(args.dataset, args.calibration_samples, args.seed,
+                                                           size=(args.img_size, args.img_size)))
+    print("Training completed.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,243 @@
+# backend/tree_predictor.py
+# Compiles a fitted tree ensemble into flat NumPy arrays (feature, threshold,
+# left/right child, leaf value) and predicts by walking every row down every
+# tree at once, one vectorized step per tree level. No per-call input
+# validation, thread-pool dispatch or DMatrix construction, so a single row
+# costs ~0.1 ms instead of ~1-30 ms. Large batches are still faster through
+# the model's native predictor; SmallBatchPredictor routes between the two.
+#
+# Supported: sklearn RandomForest / ExtraTrees / DecisionTree classifiers,
+# XGBoost multi:softprob, sklearn HistGradientBoostingClassifier (multiclass).
+# Leaves point at themselves, so traversal needs no leaf test; every split is
+# normalized to "x < threshold" in the dtype the original model compares in.
+#
+# Check + benchmark against the real model:  python bench_tree_predictor.py
+import json
+
+import numpy as np
+
+# Rows per traversal chunk are sized so (rows x trees) node indices stay cache-sized
+CHUNK_NODES = 65_536
+
+
+class TreeCompileError(Exception):
+    pass
+
+
+class _Builder:
+    def __init__(self):
+        self.feature, self.threshold, self.left, self.right, self.default_left = [], [], [], [], []
+        self.roots, self.depths, self.leaf_values = [], [], []
+        self.offset = 0
+
+    def add_tree(self, feature, threshold, left, right, default_left, leaf_value, is_leaf, depth):
+        n = len(feature)
+        idx = np.arange(n) + self.offset
+        left = np.where(is_leaf, idx, np.asarray(left) + self.offset)
+        right = np.where(is_leaf, idx, np.asarray(right) + self.offset)
+        self.feature.append(np.where(is_leaf, 0, feature).astype(np.int32))
+        self.threshold.append(np.asarray(threshold, dtype=np.float64))
+        self.left.append(left.astype(np.int32))
+        self.right.append(right.astype(np.int32))
+        self.default_left.append(np.asarray(default_left, dtype=bool))
+        self.leaf_values.append(np.asarray(leaf_value, dtype=np.float64))
+        self.roots.append(self.offset)
+        self.depths.append(depth)
+        self.offset += n
+
+
+class CompiledTrees:
+    """predict_proba() over flat node arrays; drop-in for the crop model on the serving path."""
+
+    def __init__(self, builder, n_classes, kind, input_float32, tree_class=None, classes=None):
+        self.feature = np.concatenate(builder.feature)
+        self.threshold = np.concatenate(builder.threshold)
+        # children[2 * node] is the left child, children[2 * node + 1] the right one
+        self.children = np.stack([np.concatenate(builder.left), np.concatenate(builder.right)], axis=1).ravel()
+        self.default_left = np.concatenate(builder.default_left)
+        self.leaf_value = np.concatenate(builder.leaf_values)
+        self.roots = np.asarray(builder.roots, dtype=np.int32)
+        self.max_depth = max(builder.depths)
+        self.n_classes = n_classes
+        self.kind = kind  # "average" (forest of class distributions) or "softmax" (boosted margins)
+        self.input_float32 = input_float32
+        self.classes_ = classes
+        self.offset = np.zeros(n_classes)
+        if tree_class is not None:
+            # (trees, classes) one-hot: per-tree leaf values -> per-class margins in one matmul
+            self.tree_class = np.zeros((len(self.roots), n_classes))
+            self.tree_class[np.arange(len(self.roots)), tree_class] = 1.0
+
+    @property
+    def n_nodes(self):
+        return len(self.feature)
+
+    def _leaves(self, X):
+        n, n_features = X.shape
+        flat_X = X.ravel()
+        row_offset = (np.arange(n, dtype=np.int32) * n_features)[:, None]
+        has_nan = np.isnan(X).any()
+        node = np.tile(self.roots, (n, 1))
+        for _ in range(self.max_depth):
+            x = flat_X.take(self.feature.take(node) + row_offset)
+            go_right = x >= self.threshold.take(node)
+            if has_nan:
+                go_right |= np.isnan(x) & ~self.default_left.take(node)
+            node += node
+            node += go_right
+            node = self.children.take(node)
+        return node
+
+    def raw(self, X):
+        X = np.asarray(X, dtype=np.float64)
+        if self.input_float32:
+            X = X.astype(np.float32).astype(np.float64)
+        chunk = max(1, CHUNK_NODES // len(self.roots))
+        out = np.empty((len(X), self.n_classes))
+        for start in range(0, len(X), chunk):
+            leaves = self._leaves(X[start:start + chunk])
+            if self.kind == "average":
+                out[start:start + chunk] = self.leaf_value.take(leaves, axis=0).sum(axis=1)
+            else:
+                out[start:start + chunk] = self.leaf_value.take(leaves) @ self.tree_class
+        return out
+
+    def predict_proba(self, X):
+        raw = self.raw(X)
+        if self.kind == "average":
+            return raw / len(self.roots)
+        raw += self.offset
+        raw -= raw.max(axis=1, keepdims=True)
+        np.exp(raw, out=raw)
+        raw /= raw.sum(axis=1, keepdims=True)
+        return raw
+
+    def predict(self, X):
+        idx = self.predict_proba(X).argmax(axis=1)
+        return self.classes_[idx] if self.classes_ is not None else idx
+
+
+class SmallBatchPredictor:
+    """
+    Compiled trees up to max_rows rows, where the original model's per-call
+    overhead dominates; the model's own (native, multi-threaded) predict_proba
+    above that, where raw traversal throughput matters more.
+    """
+
+    def __init__(self, compiled, model, max_rows):
+        self.compiled = compiled
+        self.model = model
+        self.max_rows = max_rows
+        self.classes_ = getattr(model, "classes_", compiled.classes_)
+
+    def predict_proba(self, X):
+        if len(X) <= self.max_rows:
+            return self.compiled.predict_proba(X)
+        return self.model.predict_proba(X)
+
+
+def _float32_lt_threshold(thr):
+    """sklearn trees test float32(x) <= thr (float64); the same split as float32 x < t'."""
+    t = thr.astype(np.float32)
+    t = np.where(t.astype(np.float64) > thr, np.nextafter(t, np.float32(-np.inf)), t)
+    return np.nextafter(t, np.float32(np.inf)).astype(np.float64)
+
+
+def _depth(left, right, is_leaf, root=0):
+    depth, frontier = 0, [root]
+    while frontier:
+        frontier = [c for n in frontier if not is_leaf[n] for c in (left[n], right[n])]
+        depth += 1 if frontier else 0
+    return depth
+
+
+def _compile_sklearn_forest(model):
+    estimators = getattr(model, "estimators_", [model])
+    b = _Builder()
+    for est in estimators:
+        t = est.tree_
+        is_leaf = t.children_left == -1
+        value = t.value[:, 0, :]
+        value = value / np.maximum(value.sum(axis=1, keepdims=True), 1e-300)
+        default_left = getattr(t, "missing_go_to_left", np.ones(t.node_count, dtype=np.uint8)).astype(bool)
+        b.add_tree(t.feature, _float32_lt_threshold(t.threshold), t.children_left, t.children_right,
+                   default_left, value, is_leaf, t.max_depth)
+    return CompiledTrees(b, len(model.classes_), "average", input_float32=True, classes=model.classes_)
+
+
+def _compile_xgboost(model):
+    booster = model.get_booster() if hasattr(model, "get_booster") else model
+    dump = json.loads(booster.save_raw("json").decode())
+    learner = dump["learner"]
+    objective = learner["objective"]["name"]
+    if objective not in ("multi:softprob", "multi:softmax"):
+        raise TreeCompileError(f"Unsupported XGBoost objective {objective}")
+    gbm = learner["gradient_booster"]
+    if gbm.get("name") != "gbtree":
+        raise TreeCompileError(f"Unsupported XGBoost booster {gbm.get('name')}")
+    n_classes = int(learner["learner_model_param"]["num_class"])
+    b = _Builder()
+    for tree in gbm["model"]["trees"]:
+        left = np.asarray(tree["left_children"])
+        right = np.asarray(tree["right_children"])
+        is_leaf = left == -1
+        cond = np.asarray(tree["split_conditions"], dtype=np.float32).astype(np.float64)
+        # Leaves keep their value in split_conditions
+        b.add_tree(tree["split_indices"], cond, left, right, tree["default_left"],
+                   np.where(is_leaf, cond, 0.0), is_leaf, _depth(left, right, is_leaf))
+    compiled = CompiledTrees(b, n_classes, "softmax", input_float32=True,
+                             tree_class=np.asarray(gbm["model"]["tree_info"]),
+                             classes=getattr(model, "classes_", None))
+
+    def margin(X):
+        from xgboost import DMatrix
+        # A model fitted on a DataFrame rejects unnamed input, so name the columns as it expects
+        return booster.predict(DMatrix(X, feature_names=booster.feature_names), output_margin=True)
+
+    return compiled, margin
+
+
+def _compile_hist_gb(model):
+    if model.n_trees_per_iteration_ < 2:
+        raise TreeCompileError("Binary HistGradientBoosting isn't supported")
+    b = _Builder()
+    tree_class = []
+    for iteration in model._predictors:
+        for k, predictor in enumerate(iteration):
+            nodes = predictor.nodes
+            if nodes["is_categorical"].any():
+                raise TreeCompileError("Categorical splits aren't supported")
+            is_leaf = nodes["is_leaf"].astype(bool)
+            thr = np.nextafter(nodes["num_threshold"], np.inf)  # x <= t  ==  x < nextafter(t)
+            b.add_tree(nodes["feature_idx"], thr, nodes["left"], nodes["right"], nodes["missing_go_to_left"],
+                       np.where(is_leaf, nodes["value"], 0.0), is_leaf, int(nodes["depth"].max()))
+            tree_class.append(k)
+    compiled = CompiledTrees(b, model.n_trees_per_iteration_, "softmax", input_float32=False,
+                             tree_class=np.asarray(tree_class), classes=model.classes_)
+    return compiled, model.decision_function
+
+
+def compile_model(model, reference_X=None):
+    """
+    Flatten a fitted ensemble. Boosted models need one reference row (any valid
+    input) to recover their base margin exactly from the original model.
+    """
+    name = type(model).__name__
+    if name in ("RandomForestClassifier", "ExtraTreesClassifier", "DecisionTreeClassifier"):
+        return _compile_sklearn_forest(model)
+    if name in ("XGBClassifier", "Booster"):
+        compiled, margin = _compile_xgboost(model)
+    elif name == "HistGradientBoostingClassifier":
+        compiled, margin = _compile_hist_gb(model)
+    else:
+        raise TreeCompileError(f"Don't know how to compile {name}")
+
+    if reference_X is None:
+        # As wide as the model's input, which may exceed the highest feature any split uses
+        n_features = getattr(model, "n_features_in_", None)
+        if n_features is None and hasattr(model, "num_features"):
+            n_features = model.num_features()
+        reference_X = np.zeros((1, n_features or compiled.feature.max() + 1))
+    reference_X = np.asarray(reference_X, dtype=np.float64)[:1]
+    compiled.offset = (np.asarray(margin(reference_X), dtype=np.float64) - compiled.raw(reference_X))[0]
+    return compiled
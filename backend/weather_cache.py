@@ -0,0 +1,211 @@
+# backend/weather_cache.py
+# Cached OpenWeatherMap access shared by /weather-forecast and weather_api.get_weather.
+#  - geocoding (city -> lat/lon) is memoized for the life of the process;
+#    unknown cities are remembered for WEATHER_GEOCODE_MISS_TTL_S only
+#  - forecasts / current weather are cached per key with a TTL, then served
+#    stale for a grace window while one background refresh runs
+#  - concurrent identical lookups collapse into a single upstream call
+#  - all calls go through the shared http_gateway (pooling, timeouts, retries,
+#    circuit breaker)
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import http_gateway
+import metrics
+
+OPENWEATHER_BASE_URL = os.environ.get("OPENWEATHER_BASE_URL", "https://api.openweathermap.org")
+WEATHER_TIMEOUT_S = float(os.environ.get("WEATHER_TIMEOUT_S", 5))
+WEATHER_FORECAST_TTL_S = float(os.environ.get("WEATHER_FORECAST_TTL_S", 600))
+WEATHER_CURRENT_TTL_S = float(os.environ.get("WEATHER_CURRENT_TTL_S", 300))
+# How long past the TTL a stale value may still be served while refreshing
+WEATHER_STALE_S = float(os.environ.get("WEATHER_STALE_S", 3600))
+WEATHER_CACHE_MAX_ENTRIES = int(os.environ.get("WEATHER_CACHE_MAX_ENTRIES", 10000))
+WEATHER_GEOCODE_MISS_TTL_S = float(os.environ.get("WEATHER_GEOCODE_MISS_TTL_S", 3600))
+
+
+class WeatherUnavailable(Exception):
+    pass
+
+
+_refresher = ThreadPoolExecutor(max_workers=4, thread_name_prefix="weather-refresh")
+
+
+class SingleFlight:
+    """Run fn once per key at a time; concurrent callers for the same key share its result."""
+
+    class _Call:
+        def __init__(self):
+            self.done = threading.Event()
+            self.result = None
+            self.error = None
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def do(self, key, fn):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = self._Call()
+        if not leader:
+            call.done.wait()
+        else:
+            try:
+                call.result = fn()
+            except Exception as e:
+                call.error = e
+            finally:
+                with self._lock:
+                    self._calls.pop(key, None)
+                call.done.set()
+        if call.error is not None:
+            raise call.error
+        return call.result
+
+
+class SWRCache:
+    """TTL cache with stale-while-revalidate (and stale-if-error) semantics."""
+
+    def __init__(self, name, ttl, stale=WEATHER_STALE_S, max_entries=WEATHER_CACHE_MAX_ENTRIES):
+        self.ttl = ttl
+        self.stale = stale
+        self.max_entries = max_entries
+        self._data = OrderedDict()  # key -> (value, fetched_at)
+        self._lock = threading.Lock()
+        self._refreshing = set()  # keys with a background refresh queued or running
+        self._flight = SingleFlight()
+        self.hits = metrics.counter(f"{name}.hits")
+        self.stale_hits = metrics.counter(f"{name}.stale_hits")
+        self.misses = metrics.counter(f"{name}.misses")
+
+    def _store(self, key, value):
+        with self._lock:
+            self._data[key] = (value, time.monotonic())
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def _fetch(self, key, fetch):
+        def run():
+            value = fetch()
+            self._store(key, value)
+            return value
+        return self._flight.do(key, run)
+
+    def _refresh_in_background(self, key, fetch):
+        with self._lock:
+            if key in self._refreshing:
+                return
+            self._refreshing.add(key)
+
+        def run():
+            try:
+                with self._lock:
+                    entry = self._data.get(key)
+                # A foreground miss may have refreshed it while this was queued
+                if entry is None or time.monotonic() - entry[1] >= self.ttl:
+                    self._fetch(key, fetch)
+            except Exception as e:
+                print(f"⚠️ Background weather refresh failed for {key}: {e}")
+            finally:
+                with self._lock:
+                    self._refreshing.discard(key)
+        _refresher.submit(run)
+
+    def get(self, key, fetch):
+        with self._lock:
+            entry = self._data.get(key)
+        if entry is not None:
+            value, fetched_at = entry
+            age = time.monotonic() - fetched_at
+            if age < self.ttl:
+                self.hits.inc()
+                return value
+            if age < self.ttl + self.stale:
+                self.stale_hits.inc()
+                self._refresh_in_background(key, fetch)
+                return value
+        self.misses.inc()
+        try:
+            return self._fetch(key, fetch)
+        except Exception:
+            if entry is not None:
+                # Upstream down: an old answer beats an error
+                return entry[0]
+            raise
+
+
+_geocode_cache = OrderedDict()  # key -> (coords or None, fetched_at)
+_geocode_lock = threading.Lock()
+_geocode_flight = SingleFlight()
+_forecasts = SWRCache("weather_cache.forecast", WEATHER_FORECAST_TTL_S)
+_current = SWRCache("weather_cache.current", WEATHER_CURRENT_TTL_S)
+upstream_calls = metrics.counter("weather_cache.upstream_calls")
+upstream_ms = metrics.histogram("weather_cache.upstream_ms")
+
+
+def _get_json(path, params):
+    upstream_calls.inc()
+    started = time.perf_counter()
+    try:
+        return http_gateway.get_json(OPENWEATHER_BASE_URL + path, params=params, timeout=WEATHER_TIMEOUT_S)
+    except http_gateway.UpstreamError as e:
+        raise WeatherUnavailable(str(e))
+    finally:
+        upstream_ms.observe((time.perf_counter() - started) * 1000)
+
+
+def geocode(city, api_key):
+    """(lat, lon) for a city name, or None if OpenWeatherMap doesn't know it."""
+    key = " ".join(city.lower().split())
+    with _geocode_lock:
+        entry = _geocode_cache.get(key)
+        if entry is not None and (entry[0] is not None or time.monotonic() - entry[1] < WEATHER_GEOCODE_MISS_TTL_S):
+            _geocode_cache.move_to_end(key)
+            return entry[0]
+
+    def lookup():
+        res = _get_json("/geo/1.0/direct", {"q": city, "limit": 1, "appid": api_key})
+        if not isinstance(res, list):
+            # Error payload (bad key, quota...): don't memoize
+            raise WeatherUnavailable(f"Geocoding failed: {res}")
+        return (res[0]["lat"], res[0]["lon"]) if res else None
+
+    coords = _geocode_flight.do(key, lookup)
+    with _geocode_lock:
+        _geocode_cache[key] = (coords, time.monotonic())
+        _geocode_cache.move_to_end(key)
+        while len(_geocode_cache) > WEATHER_CACHE_MAX_ENTRIES:
+            _geocode_cache.popitem(last=False)
+    return coords
+
+
+def forecast(lat, lon, api_key):
+    """5-day / 3-hour forecast payload for a location (cached per ~1 km grid cell)."""
+    key = (round(lat, 2), round(lon, 2))
+
+    def fetch():
+        res = _get_json("/data/2.5/forecast", {"lat": lat, "lon": lon, "units": "metric", "appid": api_key})
+        if "list" not in res:
+            raise WeatherUnavailable("Forecast not available")
+        return res
+
+    return _forecasts.get(key, fetch)
+
+
+def current(city, api_key):
+    """Current-weather payload for a city name."""
+    key = " ".join(city.lower().split())
+
+    def fetch():
+        res = _get_json("/data/2.5/weather", {"q": city, "units": "metric", "appid": api_key})
+        if "main" not in res:
+            raise WeatherUnavailable(f"Weather not available: {res.get('message', res)}")
+        return res
+
+    return _current.get(key, fetch)